@@ -0,0 +1,79 @@
+'''
+Memory held by the AST of a 100k-statement program: the node objects
+built by Parser against the ASTArena built by ArenaParser.
+
+Run from the repository root:
+    python -m benchmarks.bench_ast_memory
+'''
+import gc
+import tracemalloc
+
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.arenas import ArenaParser
+from pascal.interpreters import Interpreter
+from benchmarks.bench_engines import STATEMENTS, make_program
+
+STATEMENT_COUNT = 100000
+
+
+def retained(build):
+    '''
+    Returns what build() returns and the bytes still allocated for it.
+    '''
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def count_nodes(node):
+    '''
+    Counts distinct nodes; the Type node of a declaration such as
+    'a, b : INTEGER' is shared by its VarDecls.
+    '''
+    seen = set()
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        for field in ('block', 'compound_statement', 'left', 'right', 'expr',
+                      'var_node', 'type_node'):
+            child = getattr(node, field, None)
+            if child is not None and not isinstance(child, str):
+                stack.append(child)
+        stack.extend(getattr(node, 'children', ()))
+        stack.extend(getattr(node, 'declarations', ()))
+    return len(seen)
+
+
+def main():
+    per_repeat = STATEMENTS.count(';')
+    text = make_program(STATEMENT_COUNT // per_repeat)
+
+    tree, tree_size = retained(lambda: Parser(Lexer(text)).parse())
+    arena_tree, arena_size = retained(lambda: ArenaParser(Lexer(text)).parse())
+
+    nodes = count_nodes(tree)
+    assert nodes == len(arena_tree.arena)
+
+    def run(root):
+        interpreter = Interpreter(None)
+        interpreter.visit(root)
+        return interpreter.GLOBAL_SCOPE
+    assert run(tree) == run(arena_tree)
+
+    print(f'{nodes} nodes')
+    print(f'{"representation":<16} {"MB":>8} {"bytes/node":>11}')
+    for name, size in (('node objects', tree_size), ('arena', arena_size)):
+        print(f'{name:<16} {size / 1e6:>8.2f} {size / nodes:>11.1f}')
+    print(f'arena uses {tree_size / arena_size:.1f}x less memory')
+
+
+if __name__ == '__main__':
+    main()
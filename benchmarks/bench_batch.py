@@ -0,0 +1,46 @@
+'''
+Batch mode throughput (pascal.runners.run_batch) as the number of worker
+processes grows, over a directory of generated input.txt-style programs.
+With enough programs per chunk, throughput should grow close to linearly
+up to the number of cores.
+
+Run from the repository root:
+    python -m benchmarks.bench_batch
+'''
+import os
+import tempfile
+import time
+
+from pascal.runners import find_programs, run_batch
+from benchmarks.bench_engines import make_program
+
+PROGRAMS = 2000
+
+
+def write_programs(directory, count, repeat=20):
+    text = make_program(repeat)
+    for i in range(count):
+        with open(os.path.join(directory, f'p{i}.pas'), 'w') as f:
+            f.write(text)
+
+
+def main():
+    cores = os.cpu_count() or 1
+    counts = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+    with tempfile.TemporaryDirectory() as directory:
+        write_programs(directory, PROGRAMS)
+        print(f'{PROGRAMS} programs, {cores} cores')
+        print(f'{"workers":>8} {"seconds":>8} {"programs/s":>11} {"speedup":>8}')
+        single = None
+        for workers in counts:
+            start = time.perf_counter()
+            results = list(run_batch(find_programs([directory]), workers=workers))
+            elapsed = time.perf_counter() - start
+            assert len(results) == PROGRAMS and all(result['ok'] for result in results)
+            single = single or elapsed
+            print(f'{workers:>8} {elapsed:>8.2f} {PROGRAMS / elapsed:>11.0f}'
+                  f' {single / elapsed:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
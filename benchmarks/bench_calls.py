@@ -0,0 +1,173 @@
+'''
+Procedure calls: SlotInterpreter, with resolved (depth, slot) addresses
+and pooled frames, against the straightforward alternative of a fresh
+dict per activation and names looked up along the chain of enclosing
+scopes at run time (ChainInterpreter below).
+
+The program's body is nothing but calls to nested procedures with
+parameters, locals and reads of outer variables.
+
+Run from the repository root:
+    python -m benchmarks.bench_calls
+'''
+import time
+
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.interpreters import Interpreter
+from pascal.resolvers import SlotInterpreter, SlotResolver
+
+PROCEDURES = '''
+PROCEDURE Outer(n : INTEGER);
+VAR
+   t : INTEGER;
+
+   PROCEDURE Inner(m : INTEGER; f : REAL);
+   VAR
+      u : REAL;
+   BEGIN
+      u := m * f;
+      acc := acc + u;
+      t := t + m
+   END;
+
+BEGIN
+   t := n;
+   Inner(n, 0.5);
+   Inner(t, 1.5);
+   count := count + t
+END;
+
+PROCEDURE Leaf(a, b : INTEGER);
+BEGIN
+   count := count + a * b
+END;
+'''
+
+CALLS = '''
+   Outer(3);
+   Leaf(acc DIV 7, 2);
+   Outer(5);
+'''
+
+
+def make_program(repeat):
+    '''
+    Builds a program whose body makes 7 * `repeat` procedure calls.
+    '''
+    body = ''.join(CALLS for _ in range(repeat))
+    return (
+        'PROGRAM Calls;\n'
+        'VAR\n'
+        '   count : INTEGER;\n'
+        '   acc   : REAL;\n'
+        f'{PROCEDURES}'
+        'BEGIN\n'
+        '   count := 0;\n'
+        '   acc := 0.0;\n'
+        f'{body}'
+        '   count := count\n'
+        'END.\n'
+    )
+
+
+class Environment:
+    def __init__(self, variables, parent):
+        self.variables = variables
+        self.procedures = {}
+        self.parent = parent
+
+
+class ChainInterpreter(Interpreter):
+    '''
+    Procedure calls without static resolution: every activation gets a
+    new dict, and each variable access walks the enclosing environments
+    until it finds the name.
+    '''
+    def __init__(self, parser):
+        super().__init__(parser)
+        self.env = Environment(self.GLOBAL_SCOPE, None)
+
+    def lookup(self, name):
+        env = self.env
+        while name not in env.variables:
+            env = env.parent
+        return env
+
+    def visit_VarDecl(self, node):
+        if self.env.parent is not None:
+            self.env.variables[node.var_node.value] = None
+
+    def visit_ProcedureDecl(self, node):
+        self.env.procedures[node.name] = (node, self.env)
+
+    def visit_ProcedureCall(self, node):
+        env = self.env
+        while node.proc_name not in env.procedures:
+            env = env.parent
+        decl, defined_in = env.procedures[node.proc_name]
+        variables = {}
+        for param, arg in zip(decl.params, node.actual_params):
+            variables[param.var_node.value] = self.visit(arg)
+        caller = self.env
+        self.env = Environment(variables, defined_in)
+        try:
+            self.visit(decl.block)
+        finally:
+            self.env = caller
+
+    def visit_Assign(self, node):
+        name = node.left.value
+        env = self.env
+        while env.parent is not None and name not in env.variables:
+            env = env.parent
+        env.variables[name] = self.visit(node.right)
+
+    def visit_Var(self, node):
+        val = self.lookup(node.value).variables.get(node.value)
+        if val is None:
+            raise NameError(repr(node.value))
+        return val
+
+
+def run_chain(tree):
+    interpreter = ChainInterpreter(None)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def run_slots(resolved):
+    tree, resolver = resolved
+    interpreter = SlotInterpreter(None, resolver)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def best_of(fn, arg, rounds=5):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f'{"calls":>8} {"chain (s)":>10} {"slots (s)":>10} {"calls/s chain":>14}'
+          f' {"calls/s slots":>14} {"speedup":>8}')
+    for repeat in (100, 1000, 10000):
+        tree = Parser(Lexer(make_program(repeat))).parse()
+        resolver = SlotResolver()
+        resolver.resolve(tree)
+        resolved = (tree, resolver)
+        assert run_chain(tree) == run_slots(resolved)
+
+        calls = 7 * repeat
+        chain_time = best_of(run_chain, tree)
+        slots_time = best_of(run_slots, resolved)
+        print(f'{calls:>8} {chain_time:>10.4f} {slots_time:>10.4f} {calls / chain_time:>14.0f}'
+              f' {calls / slots_time:>14.0f} {chain_time / slots_time:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
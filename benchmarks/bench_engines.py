@@ -0,0 +1,123 @@
+'''
+Compares the AST tree-walker against the self-specializing tree-walker,
+the statically typed tree-walker, the slot-resolved tree-walker and the
+bytecode VM on
+inputs/input.txt-style programs. The program is parsed and compiled
+once and then executed repeatedly, which is how we run scripts in
+production.
+
+Run from the repository root:
+    python -m benchmarks.bench_engines
+'''
+import time
+
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.interpreters import Interpreter, SpecializingInterpreter
+from pascal.resolvers import SlotInterpreter, SlotResolver
+from pascal.bytecode import Compiler, VirtualMachine
+from pascal.typecheckers import TypeChecker, TypedInterpreter
+
+STATEMENTS = '''
+      number := 2;
+      a := number;
+      b := 10 * a + 10 * number DIV 4;
+      c := a - - b;
+      x := 11;
+      y := 20 / 7 + 3.14 * (x - c) / (b + 1);
+'''
+
+
+def make_program(repeat):
+    '''
+    Builds an input.txt-style program with the body repeated `repeat` times.
+    '''
+    body = ''.join(STATEMENTS for _ in range(repeat))
+    return (
+        'PROGRAM Bench;\n'
+        'VAR\n'
+        '   number     : INTEGER;\n'
+        '   a, b, c, x : INTEGER;\n'
+        '   y          : REAL;\n'
+        'BEGIN\n'
+        f'{body}'
+        '   x := x\n'
+        'END.\n'
+    )
+
+
+def parse(text):
+    return Parser(Lexer(text)).parse()
+
+
+def run_tree(tree):
+    interpreter = Interpreter(None)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def run_specializing(tree):
+    interpreter = SpecializingInterpreter(None)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def run_typed(checked):
+    tree, checker = checked
+    interpreter = TypedInterpreter(None, checker)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def run_slots(resolved):
+    tree, resolver = resolved
+    interpreter = SlotInterpreter(None, resolver)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def run_vm(code):
+    vm = VirtualMachine(code)
+    vm.run()
+    return vm.GLOBAL_SCOPE
+
+
+def best_of(fn, arg, runs, rounds=5):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(runs):
+            fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f'{"repeat":>8} {"runs":>6} {"tree (s)":>10} {"spec (s)":>10} {"typed (s)":>10}'
+          f' {"slots (s)":>10} {"vm (s)":>10} {"spec x":>7} {"typed x":>7} {"slots x":>7} {"vm x":>7}')
+    for repeat, runs in ((1, 2000), (10, 200), (100, 20), (1000, 2)):
+        tree = parse(make_program(repeat))
+        code = Compiler(None).compile_tree(tree)
+        resolver = SlotResolver()
+        resolver.resolve(tree)
+        resolved = (tree, resolver)
+        # the typed engine rewrites the nodes it runs, so it gets a tree of its own
+        typed_tree = parse(make_program(repeat))
+        checker = TypeChecker()
+        checker.check(typed_tree)
+        checked = (typed_tree, checker)
+        assert (run_tree(tree) == run_specializing(tree) == run_typed(checked)
+                == run_slots(resolved) == run_vm(code))
+
+        tree_time = best_of(run_tree, tree, runs)
+        spec_time = best_of(run_specializing, tree, runs)
+        typed_time = best_of(run_typed, checked, runs)
+        slots_time = best_of(run_slots, resolved, runs)
+        vm_time = best_of(run_vm, code, runs)
+        print(f'{repeat:>8} {runs:>6} {tree_time:>10.4f} {spec_time:>10.4f} {typed_time:>10.4f}'
+              f' {slots_time:>10.4f} {vm_time:>10.4f} {tree_time / spec_time:>6.2f}x'
+              f' {tree_time / typed_time:>6.2f}x {tree_time / slots_time:>6.2f}x'
+              f' {tree_time / vm_time:>6.2f}x')
+
+if __name__ == '__main__':
+    main()
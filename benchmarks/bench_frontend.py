@@ -0,0 +1,111 @@
+'''
+Front-end time on generated programs, before and after fusing semantic
+analysis into one walk and dispatching visits through per-class tables.
+
+    dispatch   the same visitors with name-based dispatch (building
+               'visit_' + class name and getattr on every node, as
+               NodeVisitor used to) and with the dispatch tables
+    analysis   SlotResolver and TypeChecker as two walks, with name-based
+               dispatch, against one SemanticAnalyzer walk
+    front end  lexing and parsing plus analysis, both ways
+
+Run from the repository root:
+    python -m benchmarks.bench_frontend [--statements 1000 10000 100000]
+'''
+import argparse
+import time
+
+from benchmarks.generator import generate_program
+from pascal.interpreters import Interpreter, SymbolTableBuilder
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.resolvers import SemanticAnalyzer, SlotResolver
+from pascal.typecheckers import TypeChecker
+
+
+class ByName:
+    '''
+    The old NodeVisitor.visit, to mix in ahead of a visitor.
+    '''
+    def visit(self, node):
+        method_name = 'visit_' + type(node).__name__
+        visitor = getattr(self, method_name, self.generic_visit)
+        return visitor(node)
+
+
+class NamedSymbolTableBuilder(ByName, SymbolTableBuilder):
+    pass
+
+
+class NamedInterpreter(ByName, Interpreter):
+    pass
+
+
+class NamedSlotResolver(ByName, SlotResolver):
+    pass
+
+
+class NamedTypeChecker(ByName, TypeChecker):
+    pass
+
+
+def best_of(fn, rounds=5):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def parse(text):
+    return Parser(Lexer(text)).parse()
+
+
+def separate(tree):
+    NamedSlotResolver().resolve(tree)
+    NamedTypeChecker().check(tree)
+
+
+def fused(tree):
+    SemanticAnalyzer().resolve(tree)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='time the front end before and after fusing analysis')
+    argparser.add_argument('--statements', type=int, nargs='+', default=[1000, 10000, 100000])
+    argparser.add_argument('--rounds', type=int, default=5)
+    args = argparser.parse_args()
+
+    print(f'{"statements":>10} {"stage":<22} {"before (s)":>11} {"after (s)":>10} {"speedup":>8}')
+    for statements in args.statements:
+        # procedures are resolved and checked, but only SlotInterpreter runs them
+        text = generate_program(1, variables=30, statements=statements, depth=4, nesting=3,
+                                procedures=4, calls=statements // 20)
+        plain = generate_program(1, variables=30, statements=statements, depth=4, nesting=3)
+        tree = parse(text)
+        plain_tree = parse(plain)
+        parse_time = best_of(lambda: parse(text), args.rounds)
+
+        stages = (
+            ('symbols (dispatch)', lambda: NamedSymbolTableBuilder().visit(tree),
+                                   lambda: SymbolTableBuilder().visit(tree)),
+            ('interpreter (dispatch)', lambda: NamedInterpreter(None).visit(plain_tree),
+                                       lambda: Interpreter(None).visit(plain_tree)),
+            ('analysis', lambda: separate(tree), lambda: fused(tree)),
+        )
+        for name, before, after in stages:
+            before_time = best_of(before, args.rounds)
+            after_time = best_of(after, args.rounds)
+            if name == 'analysis':
+                analysis = (before_time, after_time)
+            print(f'{statements:>10,} {name:<22} {before_time:>11.4f} {after_time:>10.4f}'
+                  f' {before_time / after_time:>7.2f}x')
+        before_time = parse_time + analysis[0]
+        after_time = parse_time + analysis[1]
+        print(f'{statements:>10,} {"front end":<22} {before_time:>11.4f} {after_time:>10.4f}'
+              f' {before_time / after_time:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
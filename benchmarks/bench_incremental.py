@@ -0,0 +1,75 @@
+'''
+Cost of keeping a tree up to date while a program is typed into, with
+pascal.documents.Document against scanning and parsing the whole text
+again on every keystroke. A statement is typed one character at a time
+into the middle of a large generated program (see benchmarks/generator.py),
+then a number is changed; after each edit the trees are checked to be
+the same.
+
+Run from the repository root:
+    python -m benchmarks.bench_incremental [--statements 20000]
+'''
+import argparse
+import time
+
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.serializers import dumps
+from pascal.documents import Document
+from benchmarks.generator import generate_program
+
+STATEMENT = ' v1 := (v0 + 12) * v2;\n'
+
+
+def edits(text):
+    '''
+    Yields (offset, deleted, inserted) keystrokes.
+    '''
+    middle = text.index(';\n', text.index('BEGIN\n   v0 :=') + len(text) // 3) + 2
+    for i, char in enumerate(STATEMENT):
+        yield middle + i, 0, char
+    number = text.index(' := 4', len(text) // 2) + 4
+    yield number, 1, '7'
+    yield number, 1, '48'
+    yield number, 2, '4'
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='time incremental parsing of edits')
+    argparser.add_argument('--statements', type=int, default=20000)
+    args = argparser.parse_args()
+
+    text = generate_program(12, variables=50, statements=args.statements, depth=4,
+                            nesting=3, procedures=20)
+    document = Document(text)
+    full_time = incremental_time = 0.0
+    count = 0
+    for offset, deleted, inserted in edits(text):
+        text = text[:offset] + inserted + text[offset + deleted:]
+
+        start = time.perf_counter()
+        try:
+            expected = Parser(Lexer(text)).parse()
+        except Exception:
+            expected = None
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            tree = document.edit(offset, deleted, inserted)
+        except Exception:
+            tree = None
+        incremental_time += time.perf_counter() - start
+
+        assert (tree is None) == (expected is None)
+        assert tree is None or dumps(tree) == dumps(expected)
+        count += 1
+
+    print(f'{len(text):,} characters, {count} edits')
+    print(f'{"full parse":>12} {full_time * 1000 / count:>9.3f} ms/edit')
+    print(f'{"incremental":>12} {incremental_time * 1000 / count:>9.3f} ms/edit'
+          f'  {full_time / incremental_time:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+'''
+Time of visualizer.layouts.tidy_layout on generated trees of growing
+size, up to a million nodes, in three shapes: random (each node hangs
+off a uniformly chosen earlier node, so the tree is shallow and bushy),
+deep (each node hangs off one of the last few, so depth grows with
+size) and the ASTs of generated programs. Time per node should stay
+flat.
+
+width is the drawing's width in node distances; leaves is what giving
+every leaf a column of its own would take.
+
+Run from the repository root:
+    python -m benchmarks.bench_layout [--nodes 1000 10000 100000 1000000]
+'''
+import argparse
+import random
+import time
+
+from benchmarks.generator import generate_program
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from visualizer.exporters import walk
+from visualizer.layouts import tidy_layout
+
+
+def random_tree(nodes, seed):
+    rng = random.Random(seed)
+    return [-1] + [rng.randrange(i) for i in range(1, nodes)]
+
+
+def deep_tree(nodes, seed):
+    rng = random.Random(seed)
+    return [-1] + [rng.randrange(max(0, i - 3), i) for i in range(1, nodes)]
+
+
+def ast_tree(nodes, seed):
+    # about 12 nodes per generated statement
+    text = generate_program(seed, variables=50, statements=max(1, nodes // 12), depth=4, nesting=3)
+    return [parent for node, parent in walk(Parser(Lexer(text)).parse())]
+
+
+SHAPES = {'random': random_tree, 'deep': deep_tree, 'ast': ast_tree}
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='time the tidy tree layout')
+    argparser.add_argument('--nodes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    argparser.add_argument('--seed', type=int, default=1)
+    args = argparser.parse_args()
+
+    print(f'{"shape":>6} {"nodes":>10} {"depth":>8} {"seconds":>8} {"ns/node":>8} {"width":>10} {"leaves":>10}')
+    for shape, build in SHAPES.items():
+        for nodes in args.nodes:
+            parents = build(nodes, args.seed)
+            start = time.perf_counter()
+            xs, depths = tidy_layout(parents)
+            elapsed = time.perf_counter() - start
+            leaves = len(parents) - len(set(parents[1:]))
+            print(f'{shape:>6} {len(parents):>10,} {max(depths):>8,} {elapsed:>8.3f} '
+                  f'{elapsed / len(parents) * 1e9:>8.0f} {max(xs):>10,.0f} {leaves:>10,}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+'''
+Lexer throughput on generated programs of a few megabytes, for every way
+the front end scans, against the original per-character scanner
+(CharLexer):
+
+    per token  Lexer.get_next_token(), as StreamLexer and Document edits
+               scan
+    offsets    Lexer.reader(offsets=True), one finditer() pass keeping
+               token offsets, as TokenBuffer, PositionParser and
+               Document scan
+    reader     Lexer.reader(), as Parser(Lexer(text)) scans, through
+               tokenize()
+
+Run from the repository root:
+    python -m benchmarks.bench_lexer
+'''
+import time
+
+from pascal.constants import EOF
+from pascal.lexers import CharLexer, Lexer
+from benchmarks.bench_engines import make_program
+
+
+def scan(text):
+    '''
+    Returns the number of tokens in text, scanned token by token.
+    '''
+    lexer = Lexer(text)
+    count = 1
+    while lexer.get_next_token().type != EOF:
+        count += 1
+    return count
+
+
+def scan_chars(text):
+    lexer = CharLexer(text)
+    count = 1
+    while lexer.get_next_token().type != EOF:
+        count += 1
+    return count
+
+
+def scan_offsets(text):
+    return len(Lexer(text).reader(offsets=True).tokens)
+
+
+def scan_reader(text):
+    return len(Lexer(text).reader().tokens)
+
+
+def best_of(scanner, text, rounds=3):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        count = scanner(text)
+        best = min(best, time.perf_counter() - start)
+    return best, count
+
+
+def main():
+    print(f'{"size (MB)":>10} {"tokens":>10} {"CharLexer MB/s":>15} {"per token":>10}'
+          f' {"offsets":>8} {"reader":>8}')
+    for repeat in (5000, 20000, 40000):
+        text = make_program(repeat)
+        megabytes = len(text) / 1e6
+        char_time, char_count = best_of(scan_chars, text, rounds=1)
+        speedups = []
+        for scanner in (scan, scan_offsets, scan_reader):
+            seconds, count = best_of(scanner, text)
+            assert count == char_count
+            speedups.append(char_time / seconds)
+        print(f'{megabytes:>10.2f} {char_count:>10} {megabytes / char_time:>15.2f}'
+              f' {speedups[0]:>9.2f}x {speedups[1]:>7.2f}x {speedups[2]:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''
+The hand-written recursive-descent Parser against TableParser, the
+LL(1) parser generated from grammars/grammar.lark, on generated programs
+(see benchmarks/generator.py). Both parse the same TokenBuffer, so only
+parsing is timed, and their trees are checked to be the same. Then the
+expression nesting each one can handle.
+
+Run from the repository root:
+    python -m benchmarks.bench_parsers
+'''
+import sys
+import time
+
+from pascal.buffers import TokenBuffer
+from pascal.grammars import TableParser, load_grammar
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.serializers import dumps
+from benchmarks.generator import generate_program
+
+SIZES = (100, 1000, 10000)
+ROUNDS = 5
+
+
+def best_of(fn, rounds=ROUNDS):
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def nested(depth):
+    return f'PROGRAM p; VAR a : INTEGER; BEGIN a := {"(" * depth}1{")" * depth} END.'
+
+
+def deepest(parser_class):
+    depth = 1
+    while depth < 10 ** 6:
+        try:
+            parser_class(Lexer(nested(depth * 2))).parse()
+        except RecursionError:
+            return f'{depth:,}'
+        depth *= 2
+    return f'over {depth:,}'
+
+
+def main():
+    start = time.perf_counter()
+    load_grammar()
+    print(f'tables built in {(time.perf_counter() - start) * 1000:.1f} ms')
+    print(f'{"statements":>10} {"tokens":>9} {"Parser":>11} {"TableParser":>12} {"ratio":>6}')
+    for statements in SIZES:
+        text = generate_program(7, variables=20, statements=statements, depth=4, nesting=3, procedures=4)
+        buffer = TokenBuffer(Lexer(text))
+        hand_time, hand_tree = best_of(lambda: Parser(buffer).parse())
+        table_time, table_tree = best_of(lambda: TableParser(buffer).parse())
+        assert dumps(hand_tree) == dumps(table_tree)
+        print(f'{statements:>10,} {len(buffer):>9,} {len(buffer) / hand_time:>9,.0f}/s'
+              f' {len(buffer) / table_time:>10,.0f}/s {hand_time / table_time:>5.2f}x')
+
+    print(f'deepest parenthesized expression (recursion limit {sys.getrecursionlimit()}):')
+    print(f'  Parser       {deepest(Parser)}')
+    print(f'  TableParser  {deepest(TableParser)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+'''
+Many programs run concurrently in one event loop by the Scheduler in
+pascal/schedulers.py, for a few slice budgets, against running the same
+programs one after the other on the VM:
+
+    total      time to run all of them
+    slice      the longest a single slice held the event loop
+    round      the longest another coroutine, one that only yields,
+               waited for its turn: a slice of every running program
+               goes before it, which is what --concurrency bounds
+    first/last when the first and the last of the identical programs
+               finished; with fair scheduling they finish together
+
+Run from the repository root:
+    python -m benchmarks.bench_scheduler [--programs 1000] [--budgets 1000 10000 100000]
+'''
+import argparse
+import asyncio
+import time
+
+from benchmarks.generator import generate_program
+from pascal.bytecode import VirtualMachine
+from pascal.schedulers import Scheduler, compile_text
+
+
+def longest_slice(code, budget):
+    vm = VirtualMachine(code)
+    longest = 0.0
+    done = False
+    while not done:
+        start = time.perf_counter()
+        done = vm.run(budget)
+        longest = max(longest, time.perf_counter() - start)
+    return longest
+
+
+async def scheduled(code, programs, budget, concurrency):
+    gaps = []
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    beat = asyncio.ensure_future(heartbeat())
+    start = time.perf_counter()
+    scheduler = Scheduler(budget, concurrency=concurrency)
+    finished = [time.perf_counter() - start async for _ in scheduler.run_all([code] * programs)]
+    total = time.perf_counter() - start
+    beat.cancel()
+    return total, max(gaps), finished[0], finished[-1]
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='time many programs sharing one event loop')
+    argparser.add_argument('--programs', type=int, default=1000)
+    argparser.add_argument('--statements', type=int, default=1000)
+    argparser.add_argument('--budgets', type=int, nargs='+', default=[1000, 10000, 100000])
+    argparser.add_argument('--concurrency', type=int, default=None,
+                           help='programs running at once (default: all of them)')
+    args = argparser.parse_args()
+
+    code = compile_text(generate_program(1, variables=30, statements=args.statements, depth=4))
+    start = time.perf_counter()
+    for _ in range(args.programs):
+        VirtualMachine(code).run()
+    sequential = time.perf_counter() - start
+    print(f'{args.programs} programs of {len(code.instructions):,} instruction words, '
+          f'{sequential:.3f} s one after the other')
+
+    print(f'{"budget":>8} {"total (s)":>10} {"overhead":>9} {"slice (ms)":>11} {"round (ms)":>11} '
+          f'{"first (s)":>10} {"last (s)":>9}')
+    for budget in args.budgets:
+        total, gap, first, last = asyncio.run(scheduled(code, args.programs, budget, args.concurrency))
+        print(f'{budget:>8,} {total:>10.3f} {total / sequential - 1:>8.1%} '
+              f'{longest_slice(code, budget) * 1000:>11.2f} {gap * 1000:>11.2f} '
+              f'{first:>10.3f} {last:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
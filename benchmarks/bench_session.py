@@ -0,0 +1,68 @@
+'''
+Time per line of an interactive Session as it grows, against replaying
+the whole session as one program for every new line, which is what
+keeping state would take with a fresh Lexer, Parser and Interpreter per
+line. Every line declares one more variable and assigns it from the one
+before, so the symbol table and storage grow with the session.
+
+Session time per line should stay flat; replay time grows with the
+number of lines before it.
+
+Run from the repository root:
+    python -m benchmarks.bench_session [--lines 100 1000 10000 100000]
+'''
+import argparse
+import time
+
+from pascal.runners import run
+from pascal.sessions import Session
+
+
+def line(i):
+    if i == 0:
+        return 'VAR v0 : INTEGER; v0 := 1'
+    return f'VAR v{i} : INTEGER; v{i} := (v{i - 1} + {i}) DIV 2 * 3 - {i}'
+
+
+def replay(lines):
+    declarations = ' '.join(text.split(';')[0][4:] + ';' for text in lines)
+    statements = '; '.join(text.split(';')[1] for text in lines)
+    return run(f'PROGRAM session; VAR {declarations} BEGIN {statements} END.', 'slots')
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='time session lines against replaying the session')
+    argparser.add_argument('--lines', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    argparser.add_argument('--sample', type=int, default=200,
+                           help='lines timed at each size (replay times at most 5)')
+    args = argparser.parse_args()
+
+    print(f'{"lines":>8} {"session us/line":>16} {"replay us/line":>15}')
+    session = Session()
+    lines = []
+    for size in sorted(args.lines):
+        while len(lines) < size:
+            lines.append(line(len(lines)))
+            session.run(lines[-1])
+
+        # the timed lines are simply the next ones of the session
+        timed = [line(i) for i in range(len(lines), len(lines) + args.sample)]
+        start = time.perf_counter()
+        for text in timed:
+            session.run(text)
+        session_time = (time.perf_counter() - start) / args.sample
+
+        samples = min(5, args.sample)
+        start = time.perf_counter()
+        for i in range(samples):
+            replay(lines + timed[:i + 1])
+        replay_time = (time.perf_counter() - start) / samples
+        lines.extend(timed)
+
+        print(f'{size:>8,} {session_time * 1e6:>16.1f} {replay_time * 1e6:>15,.0f}')
+
+    assert session.GLOBAL_SCOPE['v10'] == replay(lines[:11])['v10']
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+Many runs of programs that share a long prefix of statements and differ
+only in their last few: each program run from the top, against running
+the prefix once, taking a Snapshot, and resuming every program from it,
+in this process and in forked workers. Also the size of the snapshot
+file and how long it takes to write and read back.
+
+Run from the repository root:
+    python -m benchmarks.bench_snapshots [--prefix 10000] [--variants 100]
+'''
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.generator import generate_program
+from pascal.interpreters import Interpreter
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.snapshots import checkpoint, dump, load, run_continuations, run_forked
+
+
+def parse(text):
+    return Parser(Lexer(text)).parse()
+
+
+def variant(head, i, tail):
+    statements = ''.join(f';\n   v{j % 10} := v{(i + j) % 10} + {i}' for j in range(tail))
+    return parse(f'{head}{statements}\nEND.')
+
+
+def run_all(trees):
+    scopes = []
+    for tree in trees:
+        interpreter = Interpreter(None)
+        interpreter.visit(tree)
+        scopes.append(interpreter.GLOBAL_SCOPE)
+    return scopes
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='time runs from a snapshot against runs from the top')
+    argparser.add_argument('--prefix', type=int, default=10000, help='statements shared by every program')
+    argparser.add_argument('--variants', type=int, default=100)
+    argparser.add_argument('--tail', type=int, default=5, help='statements after the shared prefix')
+    argparser.add_argument('--variables', type=int, default=50)
+    argparser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = argparser.parse_args()
+
+    text = generate_program(1, variables=args.variables, statements=args.prefix, depth=4, nesting=1)
+    head = text[:text.rindex('END.')].rstrip()
+    trees = [variant(head, i, args.tail) for i in range(args.variants)]
+    position = len(parse(text).block.compound_statement.children)
+
+    start = time.perf_counter()
+    expected = run_all(trees)
+    full = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot = checkpoint(trees[0], position)
+    prefix = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = list(run_continuations(snapshot, trees))
+    in_process = time.perf_counter() - start
+    assert [result['scope'] for result in results] == expected
+
+    start = time.perf_counter()
+    results = list(run_forked(snapshot, trees, args.workers))
+    forked = time.perf_counter() - start
+    assert [result['scope'] for result in results] == expected
+
+    print(f'{args.variants} programs of {args.prefix:,} shared + {args.tail} own statements')
+    print(f'{"from the top":<28} {full:>9.3f} s')
+    print(f'{"prefix once, to snapshot":<28} {prefix:>9.3f} s')
+    print(f'{"resumed in process":<28} {in_process:>9.3f} s  {full / (prefix + in_process):>6.1f}x')
+    print(f'{f"resumed in {args.workers} forked workers":<28} {forked:>9.3f} s  '
+          f'{full / (prefix + forked):>6.1f}x')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'prefix.passnp')
+        start = time.perf_counter()
+        dump(snapshot, path)
+        written = time.perf_counter() - start
+        start = time.perf_counter()
+        assert load(path) == snapshot
+        read = time.perf_counter() - start
+        print(f'snapshot file: {os.path.getsize(path):,} bytes for {len(snapshot.scope)} variables, '
+              f'written in {written * 1e6:.0f} us, read in {read * 1e6:.0f} us')
+
+
+if __name__ == '__main__':
+    main()
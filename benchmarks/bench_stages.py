@@ -0,0 +1,182 @@
+'''
+Times each stage of the front end and the interpreter separately, on
+generated programs of several sizes (see benchmarks/generator.py), and
+compares throughput against a stored baseline:
+
+    lexer        source text into a TokenBuffer          MB/s
+    parser       TokenBuffer into a tree                 tokens/s
+    symbols      SymbolTableBuilder over the tree         nodes/s
+    interpreter  Interpreter over the tree               nodes/s
+
+Raw throughput depends on the machine, so a fixed pure-Python reference
+loop is timed right before every round, and each stage is also reported
+per reference loop: the work it gets done in the time the reference loop
+takes. Only that normalized number is stored in the baseline and
+compared, so the committed baseline holds on other machines too. A stage
+more than --tolerance below the baseline is reported as a regression and
+the exit status is 1. Run with --save-baseline to record a new baseline
+after an intended change.
+
+Run from the repository root:
+    python -m benchmarks.bench_stages [--save-baseline] [--sizes small medium]
+'''
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.buffers import TokenBuffer
+from pascal.interpreters import Interpreter, SymbolTableBuilder
+from pascal.optimizers import count_nodes
+from benchmarks.generator import generate_program
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+'''
+Program shapes, by name. Every size uses the same seed, so the programs
+(and therefore the numbers) are comparable between runs.
+'''
+SIZES = {
+    'small': dict(variables=10, statements=100, depth=3, nesting=2, procedures=1),
+    'medium': dict(variables=20, statements=2000, depth=3, nesting=3, procedures=5),
+    'large': dict(variables=50, statements=20000, depth=4, nesting=3, procedures=20),
+}
+SEED = 12
+
+STAGES = ('lexer', 'parser', 'symbols', 'interpreter')
+UNITS = {'lexer': 'MB/s', 'parser': 'tokens/s', 'symbols': 'nodes/s', 'interpreter': 'nodes/s'}
+
+
+def reference_loop():
+    # a fixed mix of string slicing and dict lookups, like the stages do,
+    # to scale out the speed of the machine
+    table = {}
+    text = 'begin a := b + 1 end. ' * 16
+    for i in range(20000):
+        word = text[i % 300:i % 300 + 5]
+        table[word] = table.get(word, 0) + 1
+    return len(table)
+
+
+def best_of(fn, rounds):
+    '''
+    Returns the best time of fn over rounds, the best time of fn in
+    reference loops (the reference loop is timed right before every round,
+    so both see the machine in the same state) and fn's result.
+    '''
+    # like timeit, keep collector pauses out of the numbers
+    best = relative = float('inf')
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            reference_loop()
+            middle = time.perf_counter()
+            result = fn()
+            end = time.perf_counter()
+            best = min(best, end - middle)
+            relative = min(relative, (end - middle) / (middle - start))
+    finally:
+        gc.enable()
+    return best, relative, result
+
+
+def run_interpreter(tree):
+    interpreter = Interpreter(None)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def measure(text, rounds):
+    '''
+    Returns the throughput of each stage on text, per second and per
+    reference loop.
+    '''
+    lex_time, lex_relative, buffer = best_of(lambda: TokenBuffer(Lexer(text)), rounds)
+    parse_time, parse_relative, tree = best_of(lambda: Parser(buffer).parse(), rounds)
+    symbols_time, symbols_relative, _ = best_of(lambda: SymbolTableBuilder().visit(tree), rounds)
+    interpret_time, interpret_relative, _ = best_of(lambda: run_interpreter(tree), rounds)
+    nodes = count_nodes(tree)
+    work = {'lexer': len(text) / 1e6, 'parser': len(buffer), 'symbols': nodes, 'interpreter': nodes}
+    times = {'lexer': lex_time, 'parser': parse_time, 'symbols': symbols_time,
+             'interpreter': interpret_time}
+    relative = {'lexer': lex_relative, 'parser': parse_relative, 'symbols': symbols_relative,
+                'interpreter': interpret_relative}
+    return (
+        {stage: work[stage] / times[stage] for stage in STAGES},
+        {stage: work[stage] / relative[stage] for stage in STAGES},
+    )
+
+
+def load_baseline(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(path, normalized):
+    baseline = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'normalized': normalized,
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+        f.write('\n')
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description='time each stage against a baseline')
+    argparser.add_argument('--sizes', nargs='+', choices=SIZES, default=list(SIZES))
+    argparser.add_argument('--rounds', type=int, default=5)
+    argparser.add_argument('--baseline', default=BASELINE)
+    argparser.add_argument('--save-baseline', action='store_true',
+                           help='store these results as the new baseline instead of comparing')
+    argparser.add_argument('--tolerance', type=float, default=0.35,
+                           help='fraction of baseline throughput a stage may lose (default: 0.35)')
+    args = argparser.parse_args(argv)
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    if baseline is not None and 'normalized' not in baseline:
+        print(f'{args.baseline} holds raw timings, run with --save-baseline to record a normalized one')
+        baseline = None
+    if baseline is not None and baseline['python'] != platform.python_version():
+        print(f'note: baseline was recorded on Python {baseline["python"]}')
+
+    normalized = {}
+    regressions = 0
+    print(f'{"size":>7} {"stage":>12} {"throughput":>14} {"unit":>9} {"per loop":>10}'
+          f' {"baseline":>10} {"ratio":>7}')
+    for size in args.sizes:
+        text = generate_program(SEED, **SIZES[size])
+        throughput, normalized[size] = measure(text, args.rounds)
+        for stage in STAGES:
+            value = normalized[size][stage]
+            line = (f'{size:>7} {stage:>12} {throughput[stage]:>14,.2f} {UNITS[stage]:>9}'
+                    f' {value:>10,.4g}')
+            reference = baseline and baseline['normalized'].get(size, {}).get(stage)
+            if reference:
+                ratio = value / reference
+                line += f' {reference:>10,.4g} {ratio:>6.2f}x'
+                if ratio < 1 - args.tolerance:
+                    line += '  REGRESSION'
+                    regressions += 1
+            print(line)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, normalized)
+        print(f'baseline written to {args.baseline}')
+    elif baseline is None:
+        print(f'no baseline at {args.baseline}, run with --save-baseline to record one')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+'''
+Peak memory of running a program with the whole tree built first
+(pascal.runners.run_file) against streaming it one statement at a time
+(pascal.runners.run_stream), on generated programs of growing size. The
+streamed peak should stay flat while the other grows with the program.
+
+Memory is measured with tracemalloc, so it counts Python allocations
+only: pages of the memory-mapped file belong to the OS page cache.
+
+Run from the repository root:
+    python -m benchmarks.bench_streaming [--statements 10000 100000]
+'''
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from pascal.runners import run_file, run_stream
+from benchmarks.generator import generate_program
+
+
+def peak(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = fn(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, peak_bytes, elapsed
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='compare peak memory of streaming and whole-tree runs')
+    argparser.add_argument('--statements', type=int, nargs='+', default=[10000, 50000, 200000])
+    args = argparser.parse_args()
+
+    print(f'{"statements":>10} {"file MB":>8} {"whole MB":>9} {"stream MB":>10} {"whole s":>8} {"stream s":>9}')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'program.pas')
+        for statements in args.statements:
+            with open(path, 'w') as f:
+                f.write(generate_program(5, variables=20, statements=statements, depth=3, nesting=2))
+            whole, whole_peak, whole_time = peak(run_file, path)
+            streamed, stream_peak, stream_time = peak(run_stream, path)
+            assert whole == streamed
+            print(f'{statements:>10,} {os.path.getsize(path) / 1e6:>8.1f} {whole_peak / 1e6:>9.1f}'
+                  f' {stream_peak / 1e6:>10.1f} {whole_time:>8.2f} {stream_time:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+'''
+Cost of recording assignments: Interpreter against TracingInterpreter on
+generated programs, with a small and a large ring buffer, and the size
+of the buffers, which is all the memory a trace ever takes besides the
+values it keeps alive. The target is under 10% overhead.
+
+Run from the repository root:
+    python -m benchmarks.bench_trace [--statements 1000 10000 100000]
+'''
+import argparse
+import sys
+import time
+
+from benchmarks.generator import generate_program
+from pascal.interpreters import Interpreter
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.tracers import TraceRecorder, TracingInterpreter
+
+
+def timed(interpreter, tree):
+    start = time.perf_counter()
+    interpreter.visit(tree)
+    return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='time Interpreter with and without tracing')
+    argparser.add_argument('--statements', type=int, nargs='+', default=[1000, 10000, 100000])
+    argparser.add_argument('--capacities', type=int, nargs='+', default=[256, 65536])
+    argparser.add_argument('--rounds', type=int, default=9)
+    args = argparser.parse_args()
+
+    print(f'{"statements":>10} {"capacity":>9} {"plain (s)":>10} {"traced (s)":>11} '
+          f'{"overhead":>9} {"trace KiB":>10}')
+    for statements in args.statements:
+        text = generate_program(1, variables=30, statements=statements, depth=4, nesting=3)
+        tree = Parser(Lexer(text)).parse()
+        recorders = [TraceRecorder(capacity) for capacity in args.capacities]
+        # rounds alternate between plain and traced runs, so that drift in
+        # the machine's speed hits both alike
+        plain = float('inf')
+        traced = [float('inf')] * len(recorders)
+        for _ in range(args.rounds):
+            plain = min(plain, timed(Interpreter(None), tree))
+            for i, recorder in enumerate(recorders):
+                traced[i] = min(traced[i], timed(TracingInterpreter(None, recorder), tree))
+        for recorder, seconds in zip(recorders, traced):
+            size = sys.getsizeof(recorder.statements) + sys.getsizeof(recorder.values)
+            print(f'{statements:>10,} {recorder.capacity:>9,} {plain:>10.4f} {seconds:>11.4f} '
+                  f'{seconds / plain - 1:>8.1%} {size / 1024:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+'''
+One program evaluated for many inputs: an Interpreter per input against
+a single VectorInterpreter run over NumPy columns (pascal/vectorizers.py).
+The program is inputs/input.txt with number bound to 0, 1, 2, ...
+
+Run from the repository root:
+    python -m benchmarks.bench_vectorized [--inputs 100000]
+'''
+import argparse
+import time
+
+import numpy as np
+
+from pascal.interpreters import Interpreter
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+from pascal.vectorizers import evaluate
+
+PROGRAM = 'inputs/input.txt'
+
+'''
+Inputs run one at a time; the per-input loop is slow enough that a
+sample gives its rate.
+'''
+LOOP_INPUTS = 10000
+
+
+class BoundInterpreter(Interpreter):
+    '''
+    Interpreter with number fixed to one value, the way VectorInterpreter
+    treats a bound variable.
+    '''
+    def __init__(self, number):
+        super().__init__(None)
+        self.number = number
+
+    def visit_Assign(self, node):
+        if node.left.value == 'number':
+            self.GLOBAL_SCOPE['number'] = self.number
+        else:
+            super().visit_Assign(node)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='time vectorized evaluation over many inputs')
+    argparser.add_argument('--inputs', type=int, default=100000)
+    args = argparser.parse_args()
+
+    with open(PROGRAM, 'r') as f:
+        tree = Parser(Lexer(f.read())).parse()
+    loop_inputs = min(args.inputs, LOOP_INPUTS)
+
+    start = time.perf_counter()
+    rows = []
+    for number in range(loop_inputs):
+        interpreter = BoundInterpreter(number)
+        interpreter.visit(tree)
+        rows.append(interpreter.GLOBAL_SCOPE)
+    loop_time = (time.perf_counter() - start) / loop_inputs
+
+    start = time.perf_counter()
+    columns = evaluate(tree, {'number': np.arange(args.inputs)})
+    vector_time = (time.perf_counter() - start) / args.inputs
+
+    for name, column in columns.items():
+        assert column[:loop_inputs].tolist() == [row[name] for row in rows], name
+
+    print(f'{args.inputs:,} inputs')
+    print(f'{"interpreter":>12} {loop_time * 1e6:>9.3f} us/input')
+    print(f'{"vectorized":>12} {vector_time * 1e6:>9.3f} us/input  {loop_time / vector_time:.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+'''
+Seeded generator of valid Pascal programs for the current grammar, for
+benchmarks and for checking engines against each other.
+
+Programs are valid all the way to run time: every variable is assigned
+before it is read, INTEGER variables are only assigned expressions over
+integer constants and INTEGER variables, and nothing
+divides by zero or grows without bound. The generator gets there by
+evaluating each expression as it writes it and trying again when the
+result is not acceptable.
+
+Procedure bodies only use their own parameters and locals. Calls pass
+the same constant arguments the body was generated for, so every call
+behaves exactly as checked. The tree-walking Interpreter cannot run
+calls, so there are none unless asked for.
+
+    python -m benchmarks.generator --statements 1000 --procedures 5 > big.pas
+'''
+import argparse
+import random
+
+'''
+Largest magnitude a generated value may have. Keeps integers small and
+floats well inside the range where mixing them never overflows.
+'''
+MAX_VALUE = 10 ** 6
+
+'''
+Attempts at an acceptable expression before falling back to a constant.
+'''
+MAX_TRIES = 20
+
+INTEGER_OPERATORS = ('+', '-', '*', 'DIV')
+REAL_OPERATORS = ('+', '-', '*', '/')
+
+
+class Unacceptable(Exception):
+    pass
+
+
+class Scope:
+    '''
+    Variables visible to the statements being generated: each name's
+    declared type and current value (None until assigned).
+    '''
+    def __init__(self, names, types):
+        self.names = names
+        self.types = dict(zip(names, types))
+        self.values = dict.fromkeys(names)
+
+    def defined(self, want_integer):
+        return [
+            name for name in self.names
+            if self.values[name] is not None
+            and (not want_integer or self.types[name] == 'INTEGER')
+        ]
+
+
+class ProgramGenerator:
+    '''
+    Writes one program. See generate_program() for the parameters.
+    '''
+    def __init__(self, seed=0, variables=10, statements=100, depth=3, nesting=2,
+                 procedures=0, calls=0):
+        self.random = random.Random(seed)
+        self.variables = max(1, variables)
+        self.statements = statements
+        self.depth = depth
+        self.nesting = nesting
+        self.procedures = procedures
+        self.calls = calls
+        self.lines = []
+        self.signatures = []
+
+    def generate(self):
+        names = [f'v{i}' for i in range(self.variables)]
+        types = [self.random.choice(('INTEGER', 'INTEGER', 'REAL')) for _ in names]
+        self.lines.append('PROGRAM Generated;')
+        self.var_section(names, types, indent=0)
+        for i in range(self.procedures):
+            self.procedure(f'p{i}', indent=0)
+
+        scope = Scope(names, types)
+        self.lines.append('BEGIN')
+        body = self.initializers(scope)
+        body += self.statement_list(scope, self.statements, self.nesting, allow_calls=True)
+        self.emit_statements(body, indent=1)
+        self.lines.append('END.')
+        return '\n'.join(self.lines) + '\n'
+
+    ################ Declarations ###################
+
+    def var_section(self, names, types, indent):
+        pad = '   ' * indent
+        self.lines.append(f'{pad}VAR')
+        for name, type_name in zip(names, types):
+            self.lines.append(f'{pad}   {name} : {type_name};')
+
+    def procedure(self, name, indent):
+        pad = '   ' * indent
+        params = [f'a{i}' for i in range(self.random.randint(0, 3))]
+        param_types = [self.random.choice(('INTEGER', 'REAL')) for _ in params]
+        args = [self.constant(type_name == 'INTEGER') for type_name in param_types]
+        header = f'{pad}PROCEDURE {name}'
+        if params:
+            header += '(' + '; '.join(
+                f'{param} : {type_name}' for param, type_name in zip(params, param_types)
+            ) + ')'
+        self.lines.append(header + ';')
+
+        local_names = [f'l{i}' for i in range(self.random.randint(1, 4))]
+        local_types = [self.random.choice(('INTEGER', 'REAL')) for _ in local_names]
+        self.var_section(local_names, local_types, indent)
+
+        scope = Scope(params + local_names, param_types + local_types)
+        for param, arg in zip(params, args):
+            scope.values[param] = self.literal_value(arg)
+        size = max(1, self.statements // max(1, 4 * self.procedures))
+        body = self.initializers(scope, local_names)
+        body += self.statement_list(scope, size, min(self.nesting, 1), allow_calls=False)
+        self.lines.append(f'{pad}BEGIN')
+        self.emit_statements(body, indent + 1)
+        self.lines.append(f'{pad}END;')
+        self.signatures.append((name, args))
+
+    ################ Statements #####################
+
+    def initializers(self, scope, names=None):
+        statements = []
+        for name in names if names is not None else scope.names:
+            text = self.constant(scope.types[name] == 'INTEGER')
+            scope.values[name] = self.literal_value(text)
+            statements.append(f'{name} := {text}')
+        return statements
+
+    def statement_list(self, scope, count, nesting, allow_calls):
+        '''
+        Returns count statements, some of them grouped into nested
+        BEGIN ... END blocks (as lists) up to nesting levels deep.
+        '''
+        statements = []
+        while count > 0:
+            if nesting > 0 and count > 2 and self.random.random() < 0.1:
+                size = self.random.randint(2, min(count, 8))
+                statements.append(self.statement_list(scope, size, nesting - 1, allow_calls))
+                count -= size
+            elif allow_calls and self.signatures and self.random.random() < self.calls_ratio():
+                name, args = self.random.choice(self.signatures)
+                statements.append(f'{name}({", ".join(args)})' if args else name)
+                count -= 1
+            else:
+                statements.append(self.assignment(scope))
+                count -= 1
+        return statements
+
+    def calls_ratio(self):
+        if self.statements == 0:
+            return 0
+        return min(1.0, self.calls / self.statements)
+
+    def assignment(self, scope):
+        name = self.random.choice(scope.names)
+        want_integer = scope.types[name] == 'INTEGER'
+        for _ in range(MAX_TRIES):
+            try:
+                text, value = self.expression(scope, self.depth, want_integer)
+            except (Unacceptable, ArithmeticError):
+                continue
+            if abs(value) <= MAX_VALUE:
+                break
+        else:
+            text = self.constant(want_integer)
+            value = self.literal_value(text)
+        scope.values[name] = value
+        return f'{name} := {text}'
+
+    def emit_statements(self, statements, indent):
+        pad = '   ' * indent
+        for i, statement in enumerate(statements):
+            separator = ';' if i < len(statements) - 1 else ''
+            if isinstance(statement, list):
+                self.lines.append(f'{pad}BEGIN')
+                self.emit_statements(statement, indent + 1)
+                self.lines.append(f'{pad}END{separator}')
+            else:
+                self.lines.append(f'{pad}{statement}{separator}')
+
+    ################ Expressions ####################
+
+    def constant(self, want_integer):
+        if want_integer or self.random.random() < 0.5:
+            return str(self.random.randint(0, 99))
+        return f'{self.random.randint(0, 99)}.{self.random.randint(0, 99):02d}'
+
+    def literal_value(self, text):
+        return float(text) if '.' in text else int(text)
+
+    def expression(self, scope, depth, want_integer):
+        '''
+        Returns the text of a random expression and its value.
+        '''
+        choice = self.random.random()
+        if depth == 0 or choice < 0.25:
+            candidates = scope.defined(want_integer)
+            if candidates and self.random.random() < 0.6:
+                name = self.random.choice(candidates)
+                return name, scope.values[name]
+            text = self.constant(want_integer)
+            return text, self.literal_value(text)
+
+        if choice < 0.35:
+            sign = self.random.choice('+-')
+            text, value = self.expression(scope, depth - 1, want_integer)
+            return f'{sign}{text}', (value if sign == '+' else -value)
+
+        operators = INTEGER_OPERATORS if want_integer else REAL_OPERATORS
+        op = self.random.choice(operators)
+        left, left_value = self.expression(scope, depth - 1, want_integer)
+        right, right_value = self.expression(scope, depth - 1, want_integer)
+        if op == '+':
+            value = left_value + right_value
+        elif op == '-':
+            value = left_value - right_value
+        elif op == '*':
+            value = left_value * right_value
+        elif op == 'DIV':
+            value = left_value // right_value
+        else:
+            value = left_value / right_value
+        if abs(value) > MAX_VALUE:
+            raise Unacceptable()
+        # always parenthesized, so the text means exactly what was evaluated
+        return f'({left} {op} {right})', value
+
+
+def generate_program(seed=0, variables=10, statements=100, depth=3, nesting=2,
+                     procedures=0, calls=0):
+    '''
+    Returns the source of a random program, always the same for the same
+    arguments.
+
+        variables   global variables, a mix of INTEGER and REAL
+        statements  assignments (and calls) in the main body
+        depth       maximum depth of expression trees
+        nesting     maximum depth of nested BEGIN ... END blocks
+        procedures  PROCEDURE declarations, with parameters and locals
+        calls       roughly how many of the statements call a procedure
+    '''
+    return ProgramGenerator(seed, variables, statements, depth, nesting,
+                            procedures, calls).generate()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='write a random Pascal program to stdout')
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--variables', type=int, default=10)
+    argparser.add_argument('--statements', type=int, default=100)
+    argparser.add_argument('--depth', type=int, default=3)
+    argparser.add_argument('--nesting', type=int, default=2)
+    argparser.add_argument('--procedures', type=int, default=0)
+    argparser.add_argument('--calls', type=int, default=0)
+    args = argparser.parse_args()
+    print(generate_program(args.seed, args.variables, args.statements, args.depth,
+                           args.nesting, args.procedures, args.calls), end='')
+
+
+if __name__ == '__main__':
+    main()
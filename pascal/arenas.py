@@ -0,0 +1,407 @@
+from array import array
+
+from pascal.constants import *
+from pascal.parsers import Parser
+from pascal.interpreters import NodeVisitor
+
+'''
+Node kinds stored in ASTArena.kinds.
+'''
+NODE_PROGRAM        = 0
+NODE_BLOCK          = 1
+NODE_PROCEDURE_DECL = 2
+NODE_VAR_DECL       = 3
+NODE_TYPE           = 4
+NODE_COMPOUND       = 5
+NODE_ASSIGN         = 6
+NODE_VAR            = 7
+NODE_NO_OP          = 8
+NODE_BIN_OP         = 9
+NODE_UNARY_OP       = 10
+NODE_NUM            = 11
+NODE_PARAM          = 12
+NODE_PROCEDURE_CALL = 13
+
+
+class ASTArena:
+    '''
+    An AST stored as parallel arrays instead of one object per node.
+
+    Node i has kind kinds[i] and up to three integer fields first[i],
+    second[i] and third[i]. Depending on the kind these hold child node
+    indices, an index into the interned token table, an index into the
+    string table, or a (start, count) slice of child indices in lists:
+
+        Program        name string, block
+        Block          declarations start, declarations count, compound
+        ProcedureDecl  name string, block, params start (lists holds the
+                       count there, followed by the params)
+        VarDecl, Param var node, type node
+        ProcedureCall  token, arguments start, arguments count
+        Type, Var, Num token
+        Compound       children start, children count
+        Assign         token, left, right
+        BinOp          token, left, right
+        UnaryOp        token, expr
+        NoOp           -
+
+    Visitors read it through the NodeView classes below, which look like
+    the node classes in pascal.parsers.
+    '''
+    def __init__(self):
+        self.kinds = array('B')
+        self.first = array('i')
+        self.second = array('i')
+        self.third = array('i')
+        self.lists = array('i')
+        self.tokens = []
+        self.strings = []
+        self._interned = {}
+        self.var_depths = {}
+        self.var_slots = {}
+        self.call_targets = {}
+        self.static_types = {}
+        self.operations = {}
+        self.root = -1
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, first=0, second=0, third=0):
+        '''
+        Appends a node and returns its index.
+        '''
+        self.kinds.append(kind)
+        self.first.append(first)
+        self.second.append(second)
+        self.third.append(third)
+        return len(self.kinds) - 1
+
+    def add_list(self, nodes):
+        '''
+        Stores a list of node indices and returns where it starts.
+        '''
+        start = len(self.lists)
+        self.lists.extend(nodes)
+        return start
+
+    def intern_token(self, token):
+        '''
+        Returns the index of token in the token table. Tokens are compared
+        by type and value, so each distinct token is stored once.
+        '''
+        key = ('token', token.type, type(token.value), token.value)
+        index = self._interned.get(key)
+        if index is None:
+            index = self._interned[key] = len(self.tokens)
+            self.tokens.append(token)
+        return index
+
+    def intern_string(self, string):
+        key = ('string', string)
+        index = self._interned.get(key)
+        if index is None:
+            index = self._interned[key] = len(self.strings)
+            self.strings.append(string)
+        return index
+
+    def view(self, index):
+        '''
+        Returns a lightweight view of node index.
+        '''
+        return VIEWS[self.kinds[index]](self, index)
+
+    def tree(self):
+        return self.view(self.root)
+
+    @classmethod
+    def from_tree(cls, tree):
+        '''
+        Builds an arena holding a copy of tree.
+        '''
+        return ArenaBuilder().build(tree)
+
+
+class ArenaNodes:
+    '''
+    Node constructors that append to self.arena and return node indices
+    instead of node objects. They take the same arguments as the node
+    classes in pascal.parsers.
+    '''
+    def Program(self, name, block):
+        return self.arena.add(NODE_PROGRAM, self.arena.intern_string(name), block)
+
+    def Block(self, declarations, compound_statement):
+        start = self.arena.add_list(declarations)
+        return self.arena.add(NODE_BLOCK, start, len(declarations), compound_statement)
+
+    def ProcedureDecl(self, name, params, block):
+        start = self.arena.add_list([len(params)] + params)
+        return self.arena.add(NODE_PROCEDURE_DECL, self.arena.intern_string(name), block, start)
+
+    def Param(self, var_node, type_node):
+        return self.arena.add(NODE_PARAM, var_node, type_node)
+
+    def ProcedureCall(self, proc_name, actual_params, token):
+        start = self.arena.add_list(actual_params)
+        return self.arena.add(NODE_PROCEDURE_CALL, self.arena.intern_token(token),
+                              start, len(actual_params))
+
+    def VarDecl(self, var_node, type_node):
+        return self.arena.add(NODE_VAR_DECL, var_node, type_node)
+
+    def Type(self, token):
+        return self.arena.add(NODE_TYPE, self.arena.intern_token(token))
+
+    def Compound(self, children=()):
+        start = self.arena.add_list(children)
+        return self.arena.add(NODE_COMPOUND, start, len(children))
+
+    def Assign(self, left, op, right):
+        return self.arena.add(NODE_ASSIGN, self.arena.intern_token(op), left, right)
+
+    def Var(self, token):
+        return self.arena.add(NODE_VAR, self.arena.intern_token(token))
+
+    def NoOp(self):
+        return self.arena.add(NODE_NO_OP)
+
+    def BinOp(self, left, op, right):
+        return self.arena.add(NODE_BIN_OP, self.arena.intern_token(op), left, right)
+
+    def UnaryOp(self, op, expr):
+        return self.arena.add(NODE_UNARY_OP, self.arena.intern_token(op), expr)
+
+    def Num(self, token):
+        return self.arena.add(NODE_NUM, self.arena.intern_token(token))
+
+
+class ArenaParser(ArenaNodes, Parser):
+    '''
+    Parser that builds an ASTArena instead of node objects. parse()
+    returns a view of the root, so it can be handed to Interpreter or
+    any other visitor in place of a Parser.
+    '''
+    def __init__(self, lexer, pretokenize=False):
+        self.arena = ASTArena()
+        super().__init__(lexer, pretokenize)
+
+    def parse(self):
+        self.arena.root = super().parse()
+        return self.arena.tree()
+
+
+class ArenaBuilder(ArenaNodes, NodeVisitor):
+    '''
+    Copies a tree of node objects (or views of another arena) into a
+    new ASTArena.
+    '''
+    def __init__(self):
+        self.arena = ASTArena()
+        self._types = {}
+
+    def build(self, tree):
+        self.arena.root = self.visit(tree)
+        return self.arena
+
+    def visit_Program(self, node):
+        return self.Program(node.name, self.visit(node.block))
+
+    def visit_Block(self, node):
+        declarations = [self.visit(declaration) for declaration in node.declarations]
+        return self.Block(declarations, self.visit(node.compound_statement))
+
+    def visit_ProcedureDecl(self, node):
+        params = [self.visit(param) for param in node.params]
+        return self.ProcedureDecl(node.name, params, self.visit(node.block))
+
+    def visit_Param(self, node):
+        return self.Param(self.visit(node.var_node), self.visit(node.type_node))
+
+    def visit_ProcedureCall(self, node):
+        actual_params = [self.visit(param) for param in node.actual_params]
+        return self.ProcedureCall(node.proc_name, actual_params, node.token)
+
+    def visit_VarDecl(self, node):
+        return self.VarDecl(self.visit(node.var_node), self.visit(node.type_node))
+
+    def visit_Type(self, node):
+        # 'a, b : INTEGER' shares one Type node between its VarDecls
+        index = self._types.get(node)
+        if index is None:
+            index = self._types[node] = self.Type(node.token)
+        return index
+
+    def visit_Compound(self, node):
+        return self.Compound([self.visit(child) for child in node.children])
+
+    def visit_Assign(self, node):
+        return self.Assign(self.visit(node.left), node.op, self.visit(node.right))
+
+    def visit_Var(self, node):
+        return self.Var(node.token)
+
+    def visit_NoOp(self, node):
+        return self.NoOp()
+
+    def visit_BinOp(self, node):
+        return self.BinOp(self.visit(node.left), node.op, self.visit(node.right))
+
+    def visit_UnaryOp(self, node):
+        return self.UnaryOp(node.op, self.visit(node.expr))
+
+    def visit_Num(self, node):
+        return self.Num(node.token)
+
+
+####################### Views ###########################
+
+def _token(self):
+    return self.arena.tokens[self.arena.first[self.index]]
+
+def _token_value(self):
+    return self.arena.tokens[self.arena.first[self.index]].value
+
+def _string(self):
+    return self.arena.strings[self.arena.first[self.index]]
+
+def _node(field):
+    def get(self):
+        return self.arena.view(getattr(self.arena, field)[self.index])
+    return property(get)
+
+def _resolved(field):
+    # addresses and types are worked out at run time, so they live beside the node
+    # arrays, which may be a read-only mapping of a file
+    def get(self):
+        return getattr(self.arena, field)[self.index]
+    def set(self, value):
+        getattr(self.arena, field)[self.index] = value
+    return property(get, set)
+
+def _node_list(self):
+    arena = self.arena
+    start = arena.first[self.index]
+    return [arena.view(i) for i in arena.lists[start:start + arena.second[self.index]]]
+
+def _counted_node_list(self):
+    arena = self.arena
+    start = arena.third[self.index]
+    count = arena.lists[start]
+    return [arena.view(i) for i in arena.lists[start + 1:start + 1 + count]]
+
+def _argument_list(self):
+    arena = self.arena
+    start = arena.second[self.index]
+    return [arena.view(i) for i in arena.lists[start:start + arena.third[self.index]]]
+
+
+class NodeView:
+    '''
+    A node of an ASTArena. Views are created on access and hold nothing
+    but the arena and the node index; the class names match the node
+    classes so visitors dispatch to the same visit_ methods.
+    '''
+    __slots__ = ('arena', 'index')
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, NodeView)
+            and self.arena is other.arena
+            and self.index == other.index
+        )
+
+    def __hash__(self):
+        return hash((id(self.arena), self.index))
+
+    def execute(self, interpreter):
+        return interpreter.dispatch(self)
+
+class Program(NodeView):
+    __slots__ = ()
+    name = property(_string)
+    block = _node('second')
+
+class Block(NodeView):
+    __slots__ = ()
+    declarations = property(_node_list)
+    compound_statement = _node('third')
+
+class ProcedureDecl(NodeView):
+    __slots__ = ()
+    name = property(_string)
+    block = _node('second')
+    params = property(_counted_node_list)
+
+class Param(NodeView):
+    __slots__ = ()
+    var_node = _node('first')
+    type_node = _node('second')
+
+class ProcedureCall(NodeView):
+    __slots__ = ()
+    token = property(_token)
+    proc_name = property(_token_value)
+    actual_params = property(_argument_list)
+    procedure = _resolved('call_targets')
+
+class VarDecl(NodeView):
+    __slots__ = ()
+    var_node = _node('first')
+    type_node = _node('second')
+
+class Type(NodeView):
+    __slots__ = ()
+    token = property(_token)
+    value = property(_token_value)
+
+class Compound(NodeView):
+    __slots__ = ()
+    children = property(_node_list)
+
+class Assign(NodeView):
+    __slots__ = ()
+    type = op = property(_token)
+    left = _node('second')
+    right = _node('third')
+
+class Var(NodeView):
+    __slots__ = ()
+    token = property(_token)
+    value = property(_token_value)
+    depth = _resolved('var_depths')
+    slot = _resolved('var_slots')
+    static_type = _resolved('static_types')
+
+class NoOp(NodeView):
+    __slots__ = ()
+
+class BinOp(NodeView):
+    __slots__ = ()
+    token = op = property(_token)
+    left = _node('second')
+    right = _node('third')
+    static_type = _resolved('static_types')
+    operation = _resolved('operations')
+
+class UnaryOp(NodeView):
+    __slots__ = ()
+    token = op = property(_token)
+    expr = _node('second')
+    static_type = _resolved('static_types')
+    operation = _resolved('operations')
+
+class Num(NodeView):
+    __slots__ = ()
+    token = property(_token)
+    value = property(_token_value)
+    static_type = _resolved('static_types')
+
+VIEWS = [
+    Program, Block, ProcedureDecl, VarDecl, Type, Compound,
+    Assign, Var, NoOp, BinOp, UnaryOp, Num, Param, ProcedureCall,
+]
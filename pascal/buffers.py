@@ -0,0 +1,112 @@
+from array import array
+
+from pascal.constants import *
+from pascal.lexers import Lexer
+
+'''
+Token types in the order of their kind codes.
+'''
+KINDS = [
+    INTEGER, REAL, INTEGER_CONST, REAL_CONST, PLUS, MINUS, MUL,
+    INTEGER_DIV, FLOAT_DIV, LPAREN, RPAREN, ID, ASSIGN, BEGIN, END,
+    SEMI, DOT, PROGRAM, VAR, COLON, COMMA, EOF, PROCEDURE,
+]
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+
+class TokenBuffer:
+    '''
+    A whole token stream stored as parallel arrays: a kind code, an index
+    into the literal table and the source offset of every token. Each
+    distinct (type, value) pair is stored once in the literal table, so
+    the buffer holds no per-token objects.
+
+    The buffer is immutable; any number of TokenReaders, and so any number
+    of parses, can share it.
+    '''
+    def __init__(self, lexer):
+        '''
+        Drains lexer into the buffer.
+        '''
+        offset_type = 'I' if len(lexer.text) < 2 ** 32 else 'Q'
+        if isinstance(lexer, Lexer):
+            # scanned in bulk, offsets included
+            lexer = lexer.reader(offsets=True)
+        self.kinds = array('B')
+        self.values = array('I')
+        self.offsets = array(offset_type)
+        self.literals = []
+        self.tokens = []
+        literal_index = {}
+
+        kinds_append = self.kinds.append
+        values_append = self.values.append
+        offsets_append = self.offsets.append
+        while True:
+            token = lexer.get_next_token()
+            key = (token.type, type(token.value), token.value)
+            index = literal_index.get(key)
+            if index is None:
+                index = literal_index[key] = len(self.literals)
+                self.literals.append(token.value)
+                self.tokens.append(token)
+            kinds_append(KIND_CODES[token.type])
+            values_append(index)
+            offsets_append(lexer.token_start)
+            if token.type == EOF:
+                break
+
+        # most programs have few distinct literals
+        for typecode in ('B', 'H'):
+            if len(self.literals) <= 2 ** (8 * array(typecode).itemsize):
+                self.values = array(typecode, self.values)
+                break
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def token(self, index):
+        '''
+        Returns the token at index. Tokens with the same type and value
+        are one shared instance. Reading past the end returns EOF.
+        '''
+        if index >= len(self.values):
+            index = len(self.values) - 1
+        return self.tokens[self.values[index]]
+
+    def kind(self, index):
+        '''
+        Returns the token type at index without materializing the token.
+        '''
+        if index >= len(self.kinds):
+            index = len(self.kinds) - 1
+        return KINDS[self.kinds[index]]
+
+    def offset(self, index):
+        return self.offsets[min(index, len(self.offsets) - 1)]
+
+    def reader(self):
+        return TokenReader(self)
+
+
+class TokenReader:
+    '''
+    A cursor over a TokenBuffer with the lexer interface the Parser
+    expects, plus arbitrary lookahead.
+    '''
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.index = 0
+        self.token_start = 0
+
+    def get_next_token(self):
+        index = self.index
+        self.index = index + 1
+        self.token_start = self.buffer.offset(index)
+        return self.buffer.token(index)
+
+    def peek_token(self, k=1):
+        '''
+        Returns the k-th token after the last one returned.
+        '''
+        return self.buffer.token(self.index + k - 1)
@@ -0,0 +1,259 @@
+from pascal.constants import *
+from pascal.interpreters import NodeVisitor
+
+'''
+Opcodes understood by the VirtualMachine. Instructions are stored
+flat in a single list of ints; opcodes that take an argument are
+followed directly by it.
+'''
+OP_LOAD_CONST = 0  # OP_LOAD_CONST const_index
+OP_LOAD       = 1  # OP_LOAD slot
+OP_STORE      = 2  # OP_STORE slot
+OP_ADD        = 3
+OP_SUB        = 4
+OP_MUL        = 5
+OP_INT_DIV    = 6
+OP_FLOAT_DIV  = 7
+OP_NEG        = 8
+OP_POS        = 9
+OP_HALT       = 10
+
+OPCODE_NAMES = [
+    'LOAD_CONST', 'LOAD', 'STORE', 'ADD', 'SUB', 'MUL',
+    'INT_DIV', 'FLOAT_DIV', 'NEG', 'POS', 'HALT',
+]
+
+HAS_ARG = {OP_LOAD_CONST, OP_LOAD, OP_STORE}
+
+BINARY_OPCODES = {
+    PLUS: OP_ADD,
+    MINUS: OP_SUB,
+    MUL: OP_MUL,
+    INTEGER_DIV: OP_INT_DIV,
+    FLOAT_DIV: OP_FLOAT_DIV,
+}
+
+UNARY_OPCODES = {
+    PLUS: OP_POS,
+    MINUS: OP_NEG,
+}
+
+
+class Code:
+    '''
+    The output of the Compiler: a flat instruction list, the constant
+    pool it indexes into, and the variable name bound to each slot.
+    '''
+    def __init__(self, instructions, constants, names):
+        self.instructions = instructions
+        self.constants = constants
+        self.names = names
+
+    def disassemble(self):
+        '''
+        Returns a human readable listing of the instructions.
+        '''
+        lines = []
+        code = self.instructions
+        pc = 0
+        while pc < len(code):
+            op = code[pc]
+            if op in HAS_ARG:
+                arg = code[pc + 1]
+                if op == OP_LOAD_CONST:
+                    detail = repr(self.constants[arg])
+                else:
+                    detail = self.names[arg]
+                lines.append(f'{pc:4} {OPCODE_NAMES[op]:<10} {arg} ({detail})')
+                pc += 2
+            else:
+                lines.append(f'{pc:4} {OPCODE_NAMES[op]}')
+                pc += 1
+        return '\n'.join(lines)
+
+
+class Compiler(NodeVisitor):
+    '''
+    Lowers the AST produced by the Parser into a Code object
+    that can be executed by the VirtualMachine.
+    '''
+    def __init__(self, parser):
+        self.parser = parser
+        self.instructions = []
+        self.constants = []
+        self._const_index = {}
+        self.slots = {}
+
+    def compile(self):
+        tree = self.parser.parse()
+        return self.compile_tree(tree)
+
+    def compile_tree(self, tree):
+        self.visit(tree)
+        self.instructions.append(OP_HALT)
+        names = [None] * len(self.slots)
+        for name, slot in self.slots.items():
+            names[slot] = name
+        return Code(self.instructions, self.constants, names)
+
+    def slot(self, name):
+        '''
+        Returns the storage slot for name, allocating one on first use.
+        '''
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.slots)
+        return slot
+
+    def constant(self, value):
+        '''
+        Returns the index of value in the constant pool. Keyed on the
+        type and repr so that 1 and 1.0, and 0.0 and -0.0, stay distinct.
+        '''
+        key = (type(value), repr(value))
+        index = self._const_index.get(key)
+        if index is None:
+            index = self._const_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def visit_Program(self, node):
+        self.visit(node.block)
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            self.visit(declaration)
+        self.visit(node.compound_statement)
+
+    def visit_ProcedureDecl(self, node):
+        pass
+
+    def visit_ProcedureCall(self, node):
+        raise Exception('Procedure calls are not supported by the bytecode VM, '
+                        'use SlotInterpreter (--engine=slots)')
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_Type(self, node):
+        pass
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Assign(self, node):
+        self.visit(node.right)
+        self.instructions.extend((OP_STORE, self.slot(node.left.value)))
+
+    def visit_Var(self, node):
+        self.instructions.extend((OP_LOAD, self.slot(node.value)))
+
+    def visit_BinOp(self, node):
+        self.visit(node.left)
+        self.visit(node.right)
+        self.instructions.append(BINARY_OPCODES[node.op.type])
+
+    def visit_UnaryOp(self, node):
+        self.visit(node.expr)
+        self.instructions.append(UNARY_OPCODES[node.op.type])
+
+    def visit_Num(self, node):
+        self.instructions.extend((OP_LOAD_CONST, self.constant(node.value)))
+
+
+class VirtualMachine:
+    '''
+    A stack machine that executes a Code object. Variable storage is a
+    list indexed by slot; None marks a variable that was never assigned.
+
+    Code has no jumps, so pc only ever moves forward and doubles as the
+    count of instruction words run so far. run() can stop after a budget
+    of them, in the middle of an expression too, and be called again to
+    carry on from there.
+    '''
+    def __init__(self, code):
+        self.code = code
+        self.slots = [None] * len(code.names)
+        self.stack = []
+        self.pc = 0
+
+    @property
+    def GLOBAL_SCOPE(self):
+        '''
+        The name -> value mapping, in the same shape as Interpreter.GLOBAL_SCOPE.
+        '''
+        return {
+            name: value
+            for name, value in zip(self.code.names, self.slots)
+            if value is not None
+        }
+
+    def run(self, budget=None):
+        '''
+        Runs to the end and returns True, or with a budget, stops once pc
+        is budget words past where it started and returns whether the
+        program is done. Stopping is checked before every instruction, so
+        a single long expression is cut into slices too; the stack stays
+        on the machine, so pc and it are all there is to resume from.
+        '''
+        code = self.code.instructions
+        consts = self.code.constants
+        names = self.code.names
+        slots = self.slots
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        pc = self.pc
+        stop = len(code) if budget is None else pc + budget
+        while pc < stop:
+            op = code[pc]
+            if op == OP_LOAD:
+                val = slots[code[pc + 1]]
+                if val is None:
+                    raise NameError(repr(names[code[pc + 1]]))
+                push(val)
+                pc += 2
+            elif op == OP_LOAD_CONST:
+                push(consts[code[pc + 1]])
+                pc += 2
+            elif op == OP_STORE:
+                slots[code[pc + 1]] = pop()
+                pc += 2
+            elif op == OP_ADD:
+                right = pop()
+                stack[-1] = stack[-1] + right
+                pc += 1
+            elif op == OP_SUB:
+                right = pop()
+                stack[-1] = stack[-1] - right
+                pc += 1
+            elif op == OP_MUL:
+                right = pop()
+                stack[-1] = stack[-1] * right
+                pc += 1
+            elif op == OP_INT_DIV:
+                right = pop()
+                stack[-1] = stack[-1] // right
+                pc += 1
+            elif op == OP_FLOAT_DIV:
+                right = pop()
+                stack[-1] = stack[-1] / right
+                pc += 1
+            elif op == OP_NEG:
+                stack[-1] = -stack[-1]
+                pc += 1
+            elif op == OP_POS:
+                stack[-1] = +stack[-1]
+                pc += 1
+            elif op == OP_HALT:
+                self.pc = pc
+                return True
+            else:
+                raise Exception(f'Unknown opcode {op}')
+        self.pc = pc
+        # out of budget right before HALT is the end of the program too
+        return code[pc] == OP_HALT
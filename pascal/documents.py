@@ -0,0 +1,438 @@
+import bisect
+from itertools import accumulate, count
+from operator import add
+
+from pascal.constants import BEGIN, END, EOF, ID, SEMI
+from pascal.lexers import Lexer
+from pascal.parsers import Compound, Parser
+
+'''
+Units a Document keeps for nodes that are no longer in its tree before
+they are dropped, as a multiple of the units in the tree.
+'''
+GARBAGE_RATIO = 2
+
+
+def _same_token(a, b):
+    return a.type == b.type and a.value == b.value and type(a.value) is type(b.value)
+
+
+class TokenStream:
+    '''
+    The tokens of a text and the offset each one starts at. Offsets live
+    in a gap buffer: before the gap they count from the start of the text,
+    from the gap on they count back from its end. Tokens after an edit
+    keep their stored offset, so an edit only rewrites the offsets between
+    it and the previous one.
+
+    Indexing a stream gives token starts, so bisect works on it directly.
+    '''
+    def __init__(self, tokens, starts, length, gap=None):
+        self.tokens = tokens
+        self.starts = starts
+        self.length = length
+        self.gap = len(tokens) if gap is None else gap
+
+    @classmethod
+    def scan(cls, text):
+        lexer = Lexer(text).reader(offsets=True)
+        tokens = []
+        starts = []
+        while True:
+            token = lexer.get_next_token()
+            tokens.append(token)
+            starts.append(lexer.token_start)
+            if token.type == EOF:
+                return cls(tokens, starts, len(text))
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, index):
+        start = self.starts[index]
+        return start if index < self.gap else start + self.length
+
+    def replace(self, first, last, tokens, starts, length):
+        '''
+        Replaces tokens first..last-1 with tokens found at starts, for a
+        text now length characters long.
+        '''
+        old = self.starts
+        gap = self.gap
+        if gap < first:
+            old[gap:first] = [start + self.length for start in old[gap:first]]
+        elif gap > last:
+            old[last:gap] = [start - self.length for start in old[last:gap]]
+        old[first:last] = starts
+        self.tokens[first:last] = tokens
+        self.length = length
+        self.gap = first + len(tokens)
+
+    def relex(self, text, offset, deleted, inserted):
+        '''
+        Scans the edited text (inserted in place of deleted characters at
+        offset) from just before the edit until it is back in step with
+        the old tokens. Returns (first, last, tokens, starts): tokens
+        first..last-1 are to be replaced by tokens, starting at starts.
+
+        Scanning is back in step at the first new token that starts past
+        the inserted text where an old token started: from there on the
+        text is the same, and so are the tokens.
+        '''
+        delta = len(inserted) - deleted
+        end = offset + len(inserted)
+        # the last token before the edit may run into it, and the one
+        # before that may have ended where it did because of what followed
+        first = max(bisect.bisect_left(self, offset) - 2, 0)
+
+        lexer = Lexer(text)
+        lexer.pos = self[first] if first else 0
+        tokens = []
+        starts = []
+        while True:
+            token = lexer.get_next_token()
+            start = lexer.token_start
+            if token.type == EOF:
+                return first, len(self) - 1, tokens, starts
+            if start >= end:
+                old_start = start - delta
+                last = bisect.bisect_left(self, old_start, first)
+                if self[last] == old_start and _same_token(self.tokens[last], token):
+                    return first, last, tokens, starts
+            tokens.append(token)
+            starts.append(start)
+
+
+class ListReader:
+    '''
+    The lexer interface the Parser expects, over a list of tokens ending
+    with EOF.
+    '''
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.index = 0
+
+    def get_next_token(self):
+        index = self.index
+        self.index = index + 1
+        return self.tokens[index]
+
+    def peek_token(self, k=1):
+        return self.tokens[min(self.index + k - 1, len(self.tokens) - 1)]
+
+
+class IncrementalParser(Parser):
+    '''
+    Parser that takes subtrees from a previous parse of the same program
+    instead of parsing their tokens again.
+
+    units maps each Compound, ProcedureDecl and Program node to the number
+    of tokens it was parsed from and what is inside it: the number of
+    tokens of each statement for a Compound, (offset, node) for each
+    nested procedure and the body for the others. The parser adds the
+    nodes it builds, so a parse with no tree to start from prepares
+    the next one.
+
+    Old tokens first..last-1 were replaced and shift is how many tokens
+    the edit added. An old subtree is reused when none of its tokens, nor
+    the token after it that the parse stopped at, were replaced: the
+    grammar is LL(1), so parsing those tokens again would give the same
+    subtree. In a Compound that was touched, the statements before and
+    after the edit are copied over and only the ones in between are
+    parsed again.
+    '''
+    def __init__(self, tokens, units, tree=None, first=0, last=0, shift=0):
+        self.units = units
+        self.first = first
+        self.last = last
+        self.shift = shift
+        self.candidates = {}
+        # what the procedure or program being parsed holds; None
+        # inside a Compound
+        self.owners = [None]
+        if tree is not None:
+            self.offer(0, tree)
+        super().__init__(ListReader(tokens))
+
+    ################ Positions ######################
+
+    def position(self):
+        '''
+        Index of current_token.
+        '''
+        return self.lexer.index - 1
+
+    def jump(self, index):
+        self.lexer.index = index
+        self.current_token = self.lexer.get_next_token()
+
+    def new_index(self, index):
+        '''
+        Where old token index is now, or None if it was replaced.
+        '''
+        if index < self.first:
+            return index
+        if index >= self.last:
+            return index + self.shift
+        return None
+
+    def old_index(self, index):
+        '''
+        Where token index used to be, or None if the edit added it.
+        '''
+        if index < self.first:
+            return index
+        if index >= self.last + self.shift:
+            return index - self.shift
+        return None
+
+    def clean(self, start, length):
+        return start + length < self.first or start >= self.last
+
+    ################ Reuse ##########################
+
+    def offer(self, start, node):
+        '''
+        Makes an old node that was parsed from old token start available
+        to the rule that gets to the same token.
+        '''
+        index = self.new_index(start)
+        if index is not None:
+            self.candidates[index] = (node, start)
+
+    def claim(self, node_type):
+        '''
+        Returns the old node of node_type offered for the current token
+        and its old index, or None.
+        '''
+        candidate = self.candidates.pop(self.position(), None)
+        if candidate is not None and type(candidate[0]) is node_type:
+            return candidate
+        return None
+
+    def reuse(self, start, node, old_start):
+        '''
+        Skips over the tokens of node if they are unchanged and returns
+        whether it did.
+        '''
+        length = self.units[node][0]
+        if not self.clean(old_start, length):
+            return False
+        self.jump(start + length)
+        self.record(start, node)
+        return True
+
+    def record(self, start, node):
+        owner = self.owners[-1]
+        if owner is not None:
+            owner.append((start, node))
+
+    def finish(self, start, node):
+        contents = self.owners.pop()
+        self.units[node] = (
+            self.position() - start,
+            [(index - start, unit) for index, unit in contents],
+        )
+        self.record(start, node)
+        return node
+
+    ################ Grammar ########################
+
+    def program(self):
+        candidate = self.claim(self.Program)
+        if candidate is not None:
+            old, old_start = candidate
+            for offset, unit in self.units[old][1]:
+                self.offer(old_start + offset, unit)
+        self.owners.append([])
+        return self.finish(0, super().program())
+
+    def procedure_declaration(self):
+        start = self.position()
+        candidate = self.claim(self.ProcedureDecl)
+        if candidate is not None:
+            old, old_start = candidate
+            if self.reuse(start, old, old_start):
+                return old
+            for offset, unit in self.units[old][1]:
+                self.offer(old_start + offset, unit)
+        self.owners.append([])
+        return self.finish(start, super().procedure_declaration())
+
+    def compound_statement(self):
+        '''
+        compound_statement: BEGIN statement_list END
+        '''
+        start = self.position()
+        candidate = self.claim(self.Compound)
+        if candidate is not None and self.reuse(start, *candidate):
+            return candidate[0]
+
+        self.owners.append(None)
+        if candidate is not None:
+            nodes, lengths = self.restatement_list(*candidate)
+        else:
+            self.eat(BEGIN)
+            nodes, lengths = self.counted_statement_list([], [])
+        self.owners.pop()
+        self.eat(END)
+
+        node = self.Compound(nodes)
+        self.units[node] = (self.position() - start, lengths)
+        self.record(start, node)
+        return node
+
+    def counted_statement(self, nodes, lengths):
+        start = self.position()
+        nodes.append(self.statement())
+        lengths.append(self.position() - start)
+
+    def counted_statement_list(self, nodes, lengths, old=None, starts=(), resume=None):
+        '''
+        Parses the rest of a statement_list into nodes, and how many
+        tokens each statement took into lengths. Given the old Compound,
+        its statements from resume on are copied over as soon as parsing
+        gets back to the start of one of them.
+        '''
+        if not nodes:
+            self.counted_statement(nodes, lengths)
+        while self.current_token.type == SEMI:
+            self.eat(SEMI)
+            if resume is not None:
+                index = self.old_index(self.position())
+                if index is not None and index >= self.last:
+                    at = bisect.bisect_left(starts, index, resume, len(old.children))
+                    if at < len(old.children) and starts[at] == index:
+                        nodes += old.children[at:]
+                        lengths += self.units[old][1][at:]
+                        # the old END
+                        self.jump(self.new_index(starts[-1] - 1))
+                        break
+            self.counted_statement(nodes, lengths)
+
+        if self.current_token.type == ID:
+            self.error()
+
+        return nodes, lengths
+
+    def restatement_list(self, old, old_start):
+        '''
+        Parses the statement_list of a Compound whose old version old was
+        touched by the edit.
+        '''
+        old_lengths = self.units[old][1]
+        children = old.children
+        # where each statement started, and one past the END
+        starts = list(map(add, accumulate(old_lengths, initial=old_start + 1), count()))
+
+        # statements before unchanged, the token after them included
+        before = bisect.bisect_right(starts, self.first, 1) - 1
+        # statements after
+        after = bisect.bisect_left(starts, self.last, 0, len(children))
+        for index in range(before, after):
+            if type(children[index]) is self.Compound:
+                self.offer(starts[index], children[index])
+
+        nodes = children[:before]
+        lengths = old_lengths[:before]
+        if before:
+            self.jump(starts[before - 1] + old_lengths[before - 1])
+        else:
+            self.eat(BEGIN)
+        return self.counted_statement_list(nodes, lengths, old, starts, after)
+
+
+class Document:
+    '''
+    A program being edited. Keeps its text, tokens and tree, and brings
+    them up to date after each edit by scanning and parsing again only
+    what the edit touched. The tree after an edit is the one a full parse
+    of the new text would give, reusing the old nodes for everything the
+    edit did not touch.
+
+    When an edit leaves the text without a valid parse, edit() raises and
+    tree is None; the next edit starts from the last tree that parsed.
+    The error is not always the one a full parse would give: edits are
+    scanned eagerly, so a bad character is reported as such even where a
+    full parse, which scans as it goes, stops at a syntax error before it.
+    '''
+    def __init__(self, text):
+        self.text = text
+        self.units = {}
+        self.stream = TokenStream.scan(text)
+        self.tree = IncrementalParser(self.stream.tokens, self.units).parse()
+        self.live = len(self.units)
+        # the last good tree and (first, last, count): its tokens
+        # first..last-1 are now count other tokens
+        self.parsed = self.tree
+        self.damage = None
+
+    def edit(self, offset, deleted, inserted):
+        '''
+        Replaces deleted characters at offset with the inserted text and
+        returns the new tree.
+        '''
+        if not 0 <= offset <= offset + deleted <= len(self.text):
+            raise ValueError(f'Edit {offset}+{deleted} outside of the text')
+        text = self.text[:offset] + inserted + self.text[offset + deleted:]
+        self.text = text
+        self.tree = None
+
+        if self.stream is None:
+            # the last edit did not scan
+            self.stream = TokenStream.scan(text)
+            self.parsed = None
+        else:
+            try:
+                first, last, tokens, starts = self.stream.relex(text, offset, deleted, inserted)
+            except Exception:
+                self.stream = None
+                raise
+            self.stream.replace(first, last, tokens, starts, len(text))
+            self.add_damage(first, last, len(tokens))
+
+        if self.parsed is None:
+            parser = IncrementalParser(self.stream.tokens, self.units)
+        else:
+            first, last, number = self.damage
+            parser = IncrementalParser(self.stream.tokens, self.units, self.parsed,
+                                       first, last, number - (last - first))
+        self.tree = self.parsed = parser.parse()
+        self.damage = None
+        if len(self.units) > GARBAGE_RATIO * self.live + 1000:
+            self.collect()
+        return self.tree
+
+    def add_damage(self, first, last, number):
+        '''
+        Merges the tokens the edit replaced with those replaced since the
+        last good parse.
+        '''
+        if self.damage is None:
+            self.damage = (first, last, number)
+            return
+        old_first, old_last, old_number = self.damage
+        old_end = old_first + old_number
+        start = min(first, old_first)
+        end = max(last, old_end)
+        self.damage = (
+            start,
+            old_last + max(0, last - old_end),
+            end + number - (last - first) - start,
+        )
+
+    def collect(self):
+        '''
+        Drops the units of nodes that are no longer in the tree.
+        '''
+        live = {}
+        pending = [self.tree]
+        while pending:
+            node = pending.pop()
+            unit = live[node] = self.units[node]
+            if type(node) is Compound:
+                pending.extend(child for child in node.children if type(child) is Compound)
+            else:
+                pending.extend(inner for offset, inner in unit[1])
+        self.units = live
+        self.live = len(live)
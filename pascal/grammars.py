@@ -0,0 +1,532 @@
+import os
+import re
+
+from pascal.buffers import KINDS
+from pascal.constants import *
+from pascal.parsers import Parser, StreamingParser
+
+'''
+The grammar TableParser follows unless given another.
+'''
+GRAMMAR_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'grammars', 'grammar.lark',
+)
+
+RULE_PATTERN = re.compile(r'(\??)([a-z_][a-z0-9_]*)\s*:(.*)')
+SYMBOL_PATTERN = re.compile(r'\s*([A-Za-z_][A-Za-z0-9_]*|[()|?*+])')
+
+_grammars = {}
+
+
+class Production:
+    '''
+    One plain production, lhs -> rhs. Productions of a rule from the file
+    have kind 'rule' and know which of its alternatives they are; the
+    others stand for a group, ?, * or + inside one.
+
+    Symbols in a * production's values come out in reverse (see
+    TableParser.action), stars lists the positions to turn around.
+    '''
+    __slots__ = ('index', 'lhs', 'rhs', 'kind', 'rule', 'alternative', 'stars')
+
+    def __init__(self, index, lhs, rhs, kind, rule, alternative):
+        self.index = index
+        self.lhs = lhs
+        self.rhs = rhs
+        self.kind = kind
+        self.rule = rule
+        self.alternative = alternative
+        self.stars = ()
+
+    def __repr__(self):
+        return f'{self.lhs} -> {" ".join(self.rhs) or "<empty>"}'
+
+
+class Grammar:
+    '''
+    A grammar read from a file in the subset of Lark's EBNF that
+    grammars/grammar.lark uses: rules, alternatives, groups and ?, *, +.
+    The EBNF is flattened into plain productions, with a made-up
+    nonterminal for each group and operator, from which the FIRST and
+    FOLLOW sets and the LL(1) parse table are built. A grammar that is
+    not LL(1) is an error.
+
+    rows is the table as TableParser reads it: for each nonterminal, the
+    symbols to push for each token type it can start with, ending with
+    the production's index (the first to be pushed), which reduces it.
+    '''
+    def __init__(self, text):
+        self.rules = {}
+        self.start = None
+        for name, alternatives in self.read(text):
+            if name in self.rules:
+                raise Exception(f'Rule {name} defined twice')
+            self.rules[name] = alternatives
+            if self.start is None:
+                self.start = name
+        if self.start is None:
+            raise Exception('Grammar has no rules')
+
+        self.productions = []
+        self.kinds = {}
+        for name, alternatives in self.rules.items():
+            self.add(name, alternatives, 'rule', name)
+        self.check_symbols()
+
+        self.nullable = set()
+        self.first = {name: set() for name in self.kinds}
+        self.follow = {name: set() for name in self.kinds}
+        self.compute_first()
+        self.compute_follow()
+        self.table = self.build_table()
+        self.rows = self.build_rows()
+
+    ################ Reading ########################
+
+    def read(self, text):
+        '''
+        Yields (name, alternatives) for each rule in text. Continuation
+        lines are indented; // comments and % directives are skipped.
+        '''
+        rule = None
+        for line in text.splitlines():
+            line = line.split('//', 1)[0].rstrip()
+            if not line or line.startswith('%'):
+                continue
+            if line[0].isspace():
+                if rule is None:
+                    raise Exception(f'Indented line outside of a rule: {line.strip()}')
+                rule[1].append(line)
+                continue
+            if rule is not None:
+                yield rule[0], self.parse_expansion(rule[0], ' '.join(rule[1]))
+            match = RULE_PATTERN.fullmatch(line)
+            if match is None:
+                raise Exception(f'Cannot read grammar line: {line}')
+            rule = (match.group(2), [match.group(3)])
+        if rule is not None:
+            yield rule[0], self.parse_expansion(rule[0], ' '.join(rule[1]))
+
+    def parse_expansion(self, name, text):
+        symbols = []
+        pos = 0
+        text = text.rstrip()
+        while pos < len(text):
+            match = SYMBOL_PATTERN.match(text, pos)
+            if match is None:
+                raise Exception(f'Cannot read rule {name} at: {text[pos:].strip()}')
+            symbols.append(match.group(1))
+            pos = match.end()
+        symbols.append(None)
+        self.symbols = symbols
+        self.pos = 0
+        alternatives = self.parse_alternatives()
+        if self.symbols[self.pos] is not None:
+            raise Exception(f'Unexpected {self.symbols[self.pos]} in rule {name}')
+        return alternatives
+
+    def parse_alternatives(self):
+        '''
+        alternatives: sequence ('|' sequence)*
+        '''
+        alternatives = [self.parse_sequence()]
+        while self.symbols[self.pos] == '|':
+            self.pos += 1
+            alternatives.append(self.parse_sequence())
+        return alternatives
+
+    def parse_sequence(self):
+        '''
+        sequence: (atom ('?' | '*' | '+')?)*
+        '''
+        items = []
+        while self.symbols[self.pos] not in ('|', ')', None):
+            symbol = self.symbols[self.pos]
+            self.pos += 1
+            if symbol == '(':
+                item = ('group', self.parse_alternatives())
+                if self.symbols[self.pos] != ')':
+                    raise Exception('Missing ) in grammar')
+                self.pos += 1
+            elif symbol in ('?', '*', '+'):
+                raise Exception(f'Nothing to repeat before {symbol} in grammar')
+            else:
+                item = ('name', symbol)
+            quantifier = self.symbols[self.pos]
+            if quantifier in ('?', '*', '+'):
+                self.pos += 1
+                item = ({'?': 'opt', '*': 'star', '+': 'plus'}[quantifier], item)
+            items.append(item)
+        return items
+
+    ################ Flattening #####################
+
+    def add(self, name, alternatives, kind, rule):
+        '''
+        Adds a production per alternative of nonterminal name.
+        '''
+        self.kinds[name] = kind
+        for alternative, items in enumerate(alternatives):
+            rhs = []
+            for item in items:
+                rhs.extend(self.symbol(item, rule))
+            self.production(name, rhs, kind, rule, alternative)
+
+    def production(self, lhs, rhs, kind, rule, alternative):
+        production = Production(len(self.productions), lhs, rhs, kind, rule, alternative)
+        production.stars = tuple(
+            i for i, symbol in enumerate(rhs)
+            if self.kinds.get(symbol) == 'star' and not (kind == 'star' and i == len(rhs) - 1)
+        )
+        self.productions.append(production)
+        return production
+
+    def fresh(self, rule, kind):
+        return f'{rule}_{kind}{len(self.kinds)}'
+
+    def body(self, item, rule):
+        '''
+        Symbols for the thing a ?, * or + applies to: a group of a single
+        sequence goes inline.
+        '''
+        if item[0] == 'group' and len(item[1]) == 1:
+            symbols = []
+            for inner in item[1][0]:
+                symbols.extend(self.symbol(inner, rule))
+            return symbols
+        return self.symbol(item, rule)
+
+    def symbol(self, item, rule):
+        '''
+        Returns the symbols standing for item, adding nonterminals for
+        groups and operators.
+        '''
+        kind, content = item
+        if kind == 'name':
+            return [content]
+        if kind == 'group':
+            name = self.fresh(rule, 'group')
+            self.add(name, content, 'group', rule)
+            return [name]
+
+        if kind == 'plus':
+            name = self.fresh(rule, 'plus')
+            self.kinds[name] = 'plus'
+            star = self.symbol(('star', content), rule)
+            self.production(name, self.body(content, rule) + star, 'plus', rule, 0)
+            return [name]
+
+        name = self.fresh(rule, kind)
+        self.kinds[name] = kind
+        symbols = self.body(content, rule)
+        if kind == 'star':
+            symbols = symbols + [name]
+        self.production(name, symbols, kind, rule, 0)
+        self.production(name, [], kind, rule, 1)
+        return [name]
+
+    def check_symbols(self):
+        for production in self.productions:
+            for symbol in production.rhs:
+                if symbol not in self.kinds and symbol not in KINDS:
+                    raise Exception(f'Unknown symbol {symbol} in rule {production.rule}')
+
+    ################ Sets and table #################
+
+    def first_of(self, symbols):
+        '''
+        Returns the tokens a sequence of symbols can start with and
+        whether it can be empty.
+        '''
+        first = set()
+        for symbol in symbols:
+            if symbol not in self.kinds:
+                first.add(symbol)
+                return first, False
+            first |= self.first[symbol]
+            if symbol not in self.nullable:
+                return first, False
+        return first, True
+
+    def compute_first(self):
+        changed = True
+        while changed:
+            changed = False
+            for production in self.productions:
+                first, nullable = self.first_of(production.rhs)
+                lhs_first = self.first[production.lhs]
+                if not first <= lhs_first:
+                    lhs_first |= first
+                    changed = True
+                if nullable and production.lhs not in self.nullable:
+                    self.nullable.add(production.lhs)
+                    changed = True
+
+    def compute_follow(self):
+        self.follow[self.start].add(EOF)
+        changed = True
+        while changed:
+            changed = False
+            for production in self.productions:
+                rhs = production.rhs
+                for i, symbol in enumerate(rhs):
+                    if symbol not in self.kinds:
+                        continue
+                    first, nullable = self.first_of(rhs[i + 1:])
+                    if nullable:
+                        first = first | self.follow[production.lhs]
+                    if not first <= self.follow[symbol]:
+                        self.follow[symbol] |= first
+                        changed = True
+
+    def build_table(self):
+        table = {name: {} for name in self.kinds}
+        conflicts = []
+        for production in self.productions:
+            first, nullable = self.first_of(production.rhs)
+            if nullable:
+                first = first | self.follow[production.lhs]
+            row = table[production.lhs]
+            for token_type in sorted(first):
+                if token_type in row and row[token_type] is not production:
+                    conflicts.append(f'{production.lhs} on {token_type}: '
+                                     f'{row[token_type]!r} or {production!r}')
+                row[token_type] = production
+        if conflicts:
+            raise Exception('Grammar is not LL(1):\n  ' + '\n  '.join(conflicts))
+        return table
+
+    def build_rows(self):
+        rows = {name: {} for name in self.kinds}
+        for name, row in self.table.items():
+            for token_type, production in row.items():
+                rows[name][token_type] = [production.index] + [
+                    rows.get(symbol, symbol) for symbol in reversed(production.rhs)
+                ]
+        return rows
+
+
+def load_grammar(path=GRAMMAR_PATH):
+    '''
+    Returns the Grammar in the file at path, built once per path.
+    '''
+    grammar = _grammars.get(path)
+    if grammar is None:
+        with open(path, 'r') as f:
+            grammar = _grammars[path] = Grammar(f.read())
+    return grammar
+
+
+def _element(values):
+    return values[0] if len(values) == 1 else tuple(values)
+
+
+class TableParser(Parser):
+    '''
+    Parser driven by the LL(1) table of grammars/grammar.lark rather than
+    by a method per rule. It keeps explicit stacks of symbols and values
+    instead of recursing, so how deeply expressions and blocks nest is
+    limited by memory rather than by the recursion limit.
+
+    When a production is complete its values are handed to the
+    build_<rule> method of its rule, with the index of the alternative:
+    tokens for terminals, nodes for rules, tuples for sequences inside
+    operators, lists for * and +, None for a missing ?. The nodes are
+    the same as Parser's.
+
+    The generic loop costs more per token than Parser's direct method
+    calls: it parses at about 0.4x Parser's speed. It is picked with
+    parser='table' in pascal.runners, or --parser=table.
+    '''
+    def __init__(self, lexer, pretokenize=False, grammar=None):
+        super().__init__(lexer, pretokenize)
+        self.grammar = grammar if grammar is not None else load_grammar()
+        self.actions = [self.action(production) for production in self.grammar.productions]
+
+    def action(self, production):
+        '''
+        Returns the function that turns the values of production into
+        the value of its left-hand side.
+        '''
+        kind = production.kind
+        stars = production.stars
+        if kind == 'rule':
+            build = getattr(self, f'build_{production.rule}', None)
+            alternative = production.alternative
+            if build is None:
+                # rules such as ?start that just pass their child on
+                act = _element
+            else:
+                def act(values):
+                    return build(alternative, values)
+        elif kind == 'group':
+            act = _element
+        elif kind == 'opt':
+            act = _element if production.rhs else (lambda values: None)
+        elif kind == 'star':
+            if production.rhs:
+                # built from the innermost repetition out, so backwards
+                def act(values):
+                    rest = values.pop()
+                    rest.append(_element(values))
+                    return rest
+            else:
+                act = lambda values: []
+        else:
+            # the * after the first repetition is in stars
+            def act(values):
+                rest = values.pop()
+                return [_element(values)] + rest
+
+        if not stars:
+            return act
+
+        def reversing_act(values):
+            for i in stars:
+                values[i].reverse()
+            return act(values)
+        return reversing_act
+
+    def parse(self):
+        node = self.parse_rule(self.grammar.start)
+        if self.current_token.type != EOF:
+            self.error()
+        return node
+
+    def parse_rule(self, name):
+        '''
+        Parses one name (a rule of the grammar) from current_token on and
+        returns its value, leaving current_token at the token after it.
+        '''
+        grammar = self.grammar
+        actions = self.actions
+        sizes = [len(production.rhs) for production in grammar.productions]
+        next_token = self.lexer.get_next_token
+        token = self.current_token
+        stack = [grammar.rows[name]]
+        values = []
+        while stack:
+            symbol = stack.pop()
+            kind = type(symbol)
+            if kind is str:
+                if token.type != symbol:
+                    self.error()
+                values.append(token)
+                token = next_token()
+            elif kind is int:
+                size = sizes[symbol]
+                if size:
+                    args = values[-size:]
+                    del values[-size:]
+                else:
+                    args = []
+                values.append(actions[symbol](args))
+            else:
+                pushed = symbol.get(token.type)
+                if pushed is None:
+                    self.error()
+                stack.extend(pushed)
+        self.current_token = token
+        return values[0]
+
+    # the grammar methods StreamingParser calls, from the table
+
+    def declarations(self):
+        return self.parse_rule('declarations')
+
+    def statement(self):
+        return self.parse_rule('statement')
+
+    ################ Builders #######################
+
+    def build_program(self, alternative, values):
+        return self.Program(values[1].value, values[3])
+
+    def build_block(self, alternative, values):
+        return self.Block(values[0], values[1])
+
+    def build_declarations(self, alternative, values):
+        var_section, procedures = values
+        declarations = []
+        if var_section is not None:
+            for var_declarations, semi in var_section[1]:
+                declarations.extend(var_declarations)
+        return declarations + procedures
+
+    def build_procedure_declaration(self, alternative, values):
+        params = values[2][1] if values[2] is not None else []
+        return self.ProcedureDecl(values[1].value, params, values[4])
+
+    def build_formal_parameter_list(self, alternative, values):
+        params = values[0]
+        for semi, more in values[1]:
+            params.extend(more)
+        return params
+
+    def names(self, values):
+        return [self.Var(values[0])] + [self.Var(token) for comma, token in values[1]]
+
+    def build_formal_parameters(self, alternative, values):
+        type_node = values[3]
+        return [self.Param(var_node, type_node) for var_node in self.names(values)]
+
+    def build_variable_declaration(self, alternative, values):
+        type_node = values[3]
+        return [self.VarDecl(var_node, type_node) for var_node in self.names(values)]
+
+    def build_type_spec(self, alternative, values):
+        return self.Type(values[0])
+
+    def build_compound_statement(self, alternative, values):
+        return self.Compound(values[1])
+
+    def build_statement_list(self, alternative, values):
+        return [values[0]] + [statement for semi, statement in values[1]]
+
+    def build_statement(self, alternative, values):
+        if alternative != 1:
+            return values[0]
+        token, rest = values
+        if isinstance(rest, tuple):
+            # assignment_statement: ASSIGN token and expression
+            return self.Assign(self.Var(token), rest[0], rest[1])
+        return self.ProcedureCall(token.value, rest, token)
+
+    def build_assignment_statement(self, alternative, values):
+        return values[0], values[1]
+
+    def build_proccall_statement(self, alternative, values):
+        arguments = values[0] and values[0][1]
+        if arguments is None:
+            return []
+        return [arguments[0]] + [expr for comma, expr in arguments[1]]
+
+    def build_empty(self, alternative, values):
+        return self.NoOp()
+
+    def build_expr(self, alternative, values):
+        node = values[0]
+        for op, right in values[1]:
+            node = self.BinOp(left=node, op=op, right=right)
+        return node
+
+    build_term = build_expr
+
+    def build_factor(self, alternative, values):
+        if alternative < 2:
+            return self.UnaryOp(values[0], values[1])
+        if alternative < 4:
+            return self.Num(values[0])
+        if alternative == 4:
+            return values[1]
+        return values[0]
+
+    def build_variable(self, alternative, values):
+        return self.Var(values[0])
+
+
+class StreamingTableParser(TableParser, StreamingParser):
+    '''
+    StreamingParser that parses the declarations and each statement of
+    the main block with the table.
+    '''
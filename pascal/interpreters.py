@@ -1,13 +1,35 @@
 from ctypes.wintypes import FLOAT
 from pascal.constants import *
 from pascal.parsers import Block
-from pascal.symbols import SymbolTable, VarSymbol
+from pascal.symbols import ProcedureSymbol, SymbolTable, VarSymbol
 
 class NodeVisitor:
+    '''
+    Calls visit_<node class name> for each node. Every visitor class has
+    a dispatch table from node class to method, filled in the first time
+    it meets a node class, so visiting a node is one dict lookup rather
+    than building a method name and looking it up by string.
+    '''
+    _visitors = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._visitors = {}
+
     def visit(self, node):
-        method_name = 'visit_' + type(node).__name__
-        visitor = getattr(self, method_name, self.generic_visit)
-        return visitor(node)
+        try:
+            visitor = self._visitors[node.__class__]
+        except KeyError:
+            visitor = self._add_visitor(node.__class__)
+        return visitor(self, node)
+
+    @classmethod
+    def _add_visitor(cls, node_class):
+        # classes are looked up on the class, so instances cannot override
+        # a visit_ method, only visit itself
+        visitor = getattr(cls, 'visit_' + node_class.__name__, cls.generic_visit)
+        cls._visitors[node_class] = visitor
+        return visitor
 
     def generic_visit(self, node):
         raise Exception('No visit_{} method'.format(type(node).__name__))
@@ -46,6 +68,12 @@ class Interpreter(NodeVisitor):
     def visit_NoOp(self, node):
         pass
 
+    def visit_ProcedureCall(self, node):
+        # GLOBAL_SCOPE is a single flat dict: there is nowhere to put a
+        # procedure's locals. SlotInterpreter runs procedures.
+        raise Exception(f'Procedure calls are not supported by {type(self).__name__}, '
+                        'use SlotInterpreter (--engine=slots)')
+
     def visit_Assign(self, node):
         var_name = node.left.value
         self.GLOBAL_SCOPE[var_name] = self.visit(node.right)
@@ -80,10 +108,30 @@ class Interpreter(NodeVisitor):
     def visit_Num(self, node):
         return node.value
 
+class SpecializingInterpreter(Interpreter):
+    '''
+    Tree-walking interpreter whose nodes rewrite themselves on first
+    execution into executors specialized for what they saw (see
+    AST.execute in pascal.parsers). Hot expressions then skip both the
+    visitor dispatch and the operator if/elif chain in visit_BinOp.
+    '''
+    def visit(self, node):
+        return node.execute(self)
+
+    def dispatch(self, node):
+        '''
+        The generic path taken by nodes that are not (or no longer) specialized.
+        '''
+        return NodeVisitor.visit(self, node)
+
 class SymbolTableBuilder(NodeVisitor):
     '''
     Traverses through the AST, adding stuff to the
-    symbol table as it goes
+    symbol table as it goes. self.symtab is the table of the scope
+    being visited; each procedure body gets a nested one.
+
+    Visiting an assignment, variable or call returns the symbol it
+    refers to, for subclasses to build on.
     '''
     def __init__(self):
         self.symtab = SymbolTable()
@@ -97,30 +145,61 @@ class SymbolTableBuilder(NodeVisitor):
         self.visit(node.compound_statement)
 
     def visit_ProcedureDecl(self, node):
-        pass
+        proc_symbol = ProcedureSymbol(node.name, decl=node)
+        self.symtab.define(proc_symbol)
+        self.symtab = SymbolTable(node.name, self.symtab.scope_level + 1, self.symtab)
+        proc_symbol.symtab = self.symtab
+        for param in node.params:
+            proc_symbol.params.append(self.visit(param))
+        self.visit(node.block)
+        self.symtab = self.symtab.enclosing_scope
+
+    def visit_Param(self, node):
+        return self.define_var(node.var_node, node.type_node)
+
+    def visit_ProcedureCall(self, node):
+        proc_symbol = self.symtab.lookup(node.proc_name)
+        if not isinstance(proc_symbol, ProcedureSymbol):
+            raise Exception(f'Procedure {node.proc_name} not defined.')
+        if len(node.actual_params) != len(proc_symbol.params):
+            raise Exception(f'Procedure {node.proc_name} takes {len(proc_symbol.params)} '
+                            f'arguments, {len(node.actual_params)} given.')
+        for param in node.actual_params:
+            self.visit(param)
+        return proc_symbol
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
 
     def visit_VarDecl(self, node):
-        type_name = node.type_node.value
+        self.define_var(node.var_node, node.type_node)
+
+    def define_var(self, var_node, type_node):
+        type_name = type_node.value
         type_symbol = self.symtab.lookup(type_name)
         if not type_symbol:
             raise Exception(f'Referenced type {type_name} does not exist')
-        var_name = node.var_node.value
+        var_name = var_node.value
         var_symbol = VarSymbol(var_name, type_symbol)
         self.symtab.define(var_symbol)
+        return var_symbol
 
     def visit_Assign(self, node):
         var_name = node.left.value
         var_symbol = self.symtab.lookup(var_name)
-        if var_symbol is None:
+        if not isinstance(var_symbol, VarSymbol):
             raise Exception(f'variable {var_name} not defined.')
 
         self.visit(node.right)
+        return var_symbol
 
     def visit_Var(self, node):
         var_name = node.value
         var_symbol = self.symtab.lookup(var_name)
-        if var_symbol is None:
+        if not isinstance(var_symbol, VarSymbol):
             raise Exception(f'Variable {var_name} not defined.')
+        return var_symbol
 
     def visit_NoOp(self, node):
         pass
@@ -1,3 +1,7 @@
+import codecs
+import re
+from itertools import chain
+
 from pascal.constants import *
 
 class Token:
@@ -29,7 +33,11 @@ RESERVED_KEYWORDS = {
 }
 
 
-class Lexer:
+class CharLexer:
+    '''
+    The original scanner, advancing one character at a time. Lexer
+    falls back to it for anything outside its ASCII fast path.
+    '''
     def __init__(self, text):
         '''
         Accepts a string input from the client as text,
@@ -39,6 +47,7 @@ class Lexer:
         self.text = text
         self.pos = 0
         self.current_char = self.text[self.pos]
+        self.token_start = 0
 
     def error(self):
         '''
@@ -97,7 +106,9 @@ class Lexer:
         while self.current_char is not None and self.current_char.isalnum():
             result += self.current_char
             self.advance()
-        token = RESERVED_KEYWORDS.get(result, Token(ID, result))
+        token = RESERVED_KEYWORDS.get(result)
+        if token is None:
+            token = Token(ID, result)
         return token
 
 
@@ -135,6 +146,7 @@ class Lexer:
         while self.current_char is not None:
 
             current_char = self.current_char
+            self.token_start = self.pos
 
             # whitespace
             if current_char.isspace():
@@ -216,4 +228,406 @@ class Lexer:
             else:
                 self.error()
 
+        self.token_start = self.pos
         return Token(EOF, None)
+
+    def peek_token(self, k=1):
+        '''
+        Returns the k-th token from the current position without
+        consuming anything: scans ahead and rewinds.
+        '''
+        state = self.pos, self.current_char, self.token_start
+        for _ in range(k):
+            token = self.get_next_token()
+        self.pos, self.current_char, self.token_start = state
+        return token
+
+
+'''
+Tokens without a payload are immutable, so like RESERVED_KEYWORDS
+a single instance of each is shared.
+'''
+PUNCTUATION = {
+    ':=': Token(ASSIGN, ':='),
+    ';': Token(SEMI, ';'),
+    ':': Token(COLON, ':'),
+    ',': Token(COMMA, ','),
+    '+': Token(PLUS, '+'),
+    '-': Token(MINUS, '-'),
+    '*': Token(MUL, '*'),
+    '/': Token(FLOAT_DIV, '/'),
+    '(': Token(LPAREN, '('),
+    ')': Token(RPAREN, ')'),
+    '.': Token(DOT, '.'),
+}
+
+'''
+Whitespace and comments, then one lexeme. The character classes are the
+ASCII subsets of str.isspace, str.isalpha and str.isdigit used by
+CharLexer; anything else is left to it. A whitespace run is matched as
+one run between comments, never as a run of runs, so a failed match
+backtracks in linear time.
+'''
+WHITESPACE = r'\t\n\x0b\x0c\r\x1c-\x1f '
+SKIP = rf'[{WHITESPACE}]*(?:\{{[^}}]*\}}[{WHITESPACE}]*)*'
+LEXEME = r'[A-Za-z][A-Za-z0-9]*|[0-9]+(?:\.[0-9]*)?|:=|[;:,+\-*/().]'
+
+TOKEN_PATTERN = re.compile(f'{SKIP}({LEXEME})')
+
+'''
+TOKEN_PATTERN with the lexeme optional: it matches wherever the previous
+match ended, so finditer() walks the text token after token. A match
+without a lexeme is where the fast path stops.
+'''
+SCAN_PATTERN = re.compile(f'{SKIP}({LEXEME})?')
+
+COMMENT_PATTERN = re.compile(r'\{[^}]*\}')
+
+'''
+Characters that always form a token on their own. ':' and '.' are
+missing: they can be the start of ':=' or part of a number.
+'''
+SEPARATORS = ';,+-*/()'
+
+
+class Lexer(CharLexer):
+    '''
+    Scanner built on a single compiled regex. It produces exactly the
+    tokens and errors of CharLexer, handing a token over to it whenever
+    the input strays outside ASCII. tokenize() and scan() go through a
+    whole program at once and are the fast path for large inputs; the
+    Parser reads its tokens from reader(), which uses them.
+
+    Tokens are immutable, so every occurrence of a lexeme shares one
+    Token instance.
+    '''
+    def __init__(self, text):
+        self.text = text
+        self.length = len(text)
+        self.pos = 0
+        self.current_char = self.text[self.pos]
+        self.token_start = 0
+        self.tokens = dict(RESERVED_KEYWORDS)
+        self.tokens.update(PUNCTUATION)
+
+    @property
+    def current_char(self):
+        '''
+        Derived from pos, so the fast path only needs to move pos.
+        '''
+        if self.pos < self.length:
+            return self.text[self.pos]
+        return None
+
+    @current_char.setter
+    def current_char(self, value):
+        pass
+
+    def fallback(self, pos):
+        '''
+        Scans the token starting at pos with CharLexer.
+        '''
+        self.pos = pos
+        return CharLexer.get_next_token(self)
+
+    def make_token(self, lexeme):
+        '''
+        Builds and caches the token for an identifier or number lexeme
+        matched by TOKEN_PATTERN.
+        '''
+        if lexeme[0].isalpha():
+            token = Token(ID, lexeme)
+        elif '.' in lexeme:
+            token = Token(REAL_CONST, float(lexeme))
+        else:
+            token = Token(INTEGER_CONST, int(lexeme))
+        self.tokens[lexeme] = token
+        return token
+
+    def get_next_token(self):
+        text = self.text
+        match = TOKEN_PATTERN.match(text, self.pos)
+        if match is None:
+            # EOF, an unterminated comment, an invalid or non-ASCII character
+            return self.fallback(self.pos)
+
+        end = match.end()
+        if end < self.length and text[end] >= '\x80':
+            # an identifier or number might continue past the ASCII range
+            return self.fallback(match.start(1))
+        self.pos = end
+        self.token_start = match.start(1)
+
+        lexeme = match.group(1)
+        token = self.tokens.get(lexeme)
+        if token is None:
+            token = self.make_token(lexeme)
+        return token
+
+    def reader(self, offsets=False):
+        '''
+        Scans all remaining tokens in bulk and returns a ScannedTokens
+        over them, which the Parser reads like a lexer. Without offsets,
+        token_start is not kept and scanning goes through tokenize().
+        '''
+        return ScannedTokens(*self.scan(offsets))
+
+    def scan(self, offsets=False):
+        '''
+        Returns (tokens, starts, error) for all remaining tokens: starts
+        are their offsets (None without offsets), and the tokens end with
+        EOF, or just before the first error in the text, which is then
+        returned as error rather than raised.
+        '''
+        if not offsets:
+            first = self.pos
+            try:
+                return self.tokenize(), None, None
+            except Exception:
+                # scanned again below, to keep the tokens before the error
+                self.pos = first
+
+        text = self.text
+        length = self.length
+        ascii = text.isascii()
+        cache = self.tokens
+        tokens = []
+        starts = []
+        while True:
+            # the last match is always one without a lexeme: at EOF, at a
+            # character left to CharLexer, or at an unterminated comment
+            for match in SCAN_PATTERN.finditer(text, self.pos):
+                lexeme = match.group(1)
+                if lexeme is None:
+                    self.pos = match.start()
+                    break
+                start = match.start(1)
+                if not ascii:
+                    end = match.end()
+                    if end < length and text[end] >= '\x80':
+                        # an identifier or number might go on past ASCII
+                        self.pos = start
+                        break
+                token = cache.get(lexeme)
+                if token is None:
+                    token = self.make_token(lexeme)
+                tokens.append(token)
+                starts.append(start)
+            try:
+                token = self.get_next_token()
+            except Exception as e:
+                return tokens, starts, e
+            tokens.append(token)
+            starts.append(self.token_start)
+            if token.type == EOF:
+                return tokens, starts, None
+
+    def tokenize(self):
+        '''
+        Returns all remaining tokens as a list ending with EOF.
+
+        Comments are cut out and punctuation is padded with spaces, so that
+        str.split() breaks the text into words that never straddle two
+        tokens. Each distinct word is scanned once and all its occurrences
+        share the result. On any error the text is scanned again token by
+        token, so that the error raised is the first one in the text.
+        '''
+        start = self.pos
+        text = self.text[start:]
+        if '{' in text:
+            text = COMMENT_PATTERN.sub(' ', text)
+        for char in SEPARATORS:
+            text = text.replace(char, f' {char} ')
+        text = text.replace(':', ' :').replace('=', '= ')
+        words = text.split()
+
+        spans = {}
+        try:
+            for word in set(words).difference(self.tokens):
+                word_lexer = Lexer(word)
+                word_lexer.tokens = self.tokens
+                tokens = word_lexer._tokenize_slow()[:-1]
+                if len(tokens) == 1:
+                    self.tokens[word] = tokens[0]
+                else:
+                    spans[word] = tokens
+        except Exception:
+            self.pos = start
+            return self._tokenize_slow()
+
+        tokens = list(map(self.tokens.get, words))
+        if spans:
+            # words such as 'END.' that hold several tokens
+            tokens = self._expand_spans(tokens, words, spans)
+        self.pos = self.token_start = self.length
+        tokens.append(Token(EOF, None))
+        return tokens
+
+    def _expand_spans(self, tokens, words, spans):
+        count = tokens.count(None)
+        if count > 1000:
+            return list(chain.from_iterable(
+                spans[word] if token is None else (token,)
+                for word, token in zip(words, tokens)
+            ))
+        positions = []
+        index = -1
+        for _ in range(count):
+            index = tokens.index(None, index + 1)
+            positions.append(index)
+        for index in reversed(positions):
+            tokens[index:index + 1] = spans[words[index]]
+        return tokens
+
+    def _tokenize_slow(self):
+        tokens = [self.get_next_token()]
+        while tokens[-1].type != EOF:
+            tokens.append(self.get_next_token())
+        return tokens
+
+
+class ScannedTokens:
+    '''
+    Tokens scanned ahead by Lexer.reader(), with the lexer interface the
+    Parser expects. An error the scan ran into is raised only when the
+    token it is in is read, as it is when scanning token by token, so a
+    syntax error before it is still reported first.
+    '''
+    def __init__(self, tokens, starts=None, error=None):
+        self.tokens = tokens
+        self.starts = starts
+        self.error = error
+        self.index = 0
+        self.token_start = 0
+
+    def get_next_token(self):
+        index = self.index
+        if index >= len(self.tokens):
+            if self.error is not None:
+                raise self.error
+            # past EOF, which is read again
+            index = len(self.tokens) - 1
+        self.index = index + 1
+        if self.starts is not None:
+            self.token_start = self.starts[index]
+        return self.tokens[index]
+
+    def peek_token(self, k=1):
+        index = self.index + k - 1
+        if index >= len(self.tokens):
+            if self.error is not None:
+                raise self.error
+            index = len(self.tokens) - 1
+        return self.tokens[index]
+
+
+'''
+Bytes StreamLexer decodes at a time. Text before the current token is
+dropped once this much of it has piled up.
+'''
+CHUNK_SIZE = 1 << 20
+
+'''
+Whitespace and comments as CharLexer skips them: \s matches exactly the
+characters of str.isspace, non-ASCII ones included, which TOKEN_PATTERN
+leaves to CharLexer.
+'''
+CHAR_SKIP_PATTERN = re.compile(r'\s*(?:\{[^}]*\}\s*)*')
+
+'''
+Distinct identifiers and numbers StreamLexer caches tokens for before
+starting over, so that programs with ever new literals do not grow it.
+'''
+TOKEN_CACHE_SIZE = 1 << 16
+
+
+class StreamLexer(Lexer):
+    '''
+    Lexer over UTF-8 bytes, such as an mmap of a source file, that only
+    holds a window of decoded text around the current position. The
+    window grows when a token or comment runs into its end and is cut
+    back once the lexer has moved a chunk past its start, so memory stays
+    bounded however long the source is.
+
+    token_start counts characters from the start of the source.
+    '''
+    def __init__(self, source):
+        self.source = source
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.read = 0
+        self.exhausted = len(source) == 0
+        self.base = 0
+        self.text = ''
+        self.length = 0
+        self.pos = 0
+        self.token_start = 0
+        self.peeking = False
+        self.tokens = dict(RESERVED_KEYWORDS)
+        self.tokens.update(PUNCTUATION)
+        self.extend()
+
+    def extend(self):
+        '''
+        Decodes the next chunk of the source onto the window.
+        '''
+        data = self.source[self.read:self.read + CHUNK_SIZE]
+        self.read += len(data)
+        self.exhausted = self.read >= len(self.source)
+        self.text += self.decoder.decode(data, final=self.exhausted)
+        self.length = len(self.text)
+
+    def slide(self):
+        '''
+        Drops the text before pos.
+        '''
+        self.text = self.text[self.pos:]
+        self.length = len(self.text)
+        self.base += self.pos
+        self.pos = 0
+        if len(self.tokens) > TOKEN_CACHE_SIZE:
+            self.tokens = dict(RESERVED_KEYWORDS)
+            self.tokens.update(PUNCTUATION)
+
+    def truncated(self, pos):
+        '''
+        Whether scanning from pos failed only because the window ends
+        inside whitespace or a comment.
+        '''
+        if self.exhausted:
+            return False
+        end = CHAR_SKIP_PATTERN.match(self.text, pos).end()
+        return end == self.length or self.text[end] == '{'
+
+    def get_next_token(self):
+        if self.pos >= CHUNK_SIZE and not self.peeking:
+            self.slide()
+        while True:
+            pos = self.pos
+            try:
+                token = Lexer.get_next_token(self)
+            except Exception:
+                if not self.truncated(pos):
+                    raise
+            else:
+                # a token that ends with the window may go on past it
+                if self.exhausted or self.pos < self.length:
+                    break
+            self.pos = pos
+            self.extend()
+        self.token_start += self.base
+        return token
+
+    def peek_token(self, k=1):
+        # peek_token rewinds to pos, so the window must not move
+        self.peeking = True
+        try:
+            return Lexer.peek_token(self, k)
+        finally:
+            self.peeking = False
+
+    def reader(self, offsets=False):
+        # scanning ahead would hold the whole program
+        return self
+
+    def tokenize(self):
+        return self._tokenize_slow()
@@ -0,0 +1,296 @@
+import time
+
+from pascal.constants import *
+from pascal.interpreters import NodeVisitor
+from pascal.lexers import Token
+from pascal.parsers import BINARY_OPERATIONS, CHILD_FIELDS, BinOp, Num, UnaryOp
+
+'''
+Version of the optimizer's output. Compiled programs cached by
+pascal.transpilers are keyed on it: bump it whenever the optimizer
+rewrites trees differently, or stale optimized builds keep running.
+'''
+VERSION = 1
+
+UNARY_OPERATIONS = {
+    PLUS: lambda value: +value,
+    MINUS: lambda value: -value,
+}
+
+
+def count_nodes(tree):
+    '''
+    Returns the number of distinct nodes in tree.
+    '''
+    seen = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        for field in CHILD_FIELDS.get(type(node).__name__, ()):
+            child = getattr(node, field)
+            if isinstance(child, list):
+                stack.extend(child)
+            else:
+                stack.append(child)
+    return len(seen)
+
+
+def make_num(value):
+    '''
+    Returns a Num node for a computed constant.
+    '''
+    if isinstance(value, int):
+        return Num(Token(INTEGER_CONST, value))
+    return Num(Token(REAL_CONST, value))
+
+
+class NodeTransformer(NodeVisitor):
+    '''
+    Walks the tree and replaces each child with whatever visiting it
+    returns. By default every node is returned unchanged; passes override
+    the visit_ methods for the nodes they rewrite and count their
+    rewrites in self.rewrites.
+    '''
+    def __init__(self):
+        self.rewrites = 0
+
+    def transform(self, tree):
+        return self.visit(tree)
+
+    def visit_Program(self, node):
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_Block(self, node):
+        node.declarations = [self.visit(declaration) for declaration in node.declarations]
+        node.compound_statement = self.visit(node.compound_statement)
+        return node
+
+    def visit_ProcedureDecl(self, node):
+        node.block = self.visit(node.block)
+        return node
+
+    def visit_Param(self, node):
+        return node
+
+    def visit_ProcedureCall(self, node):
+        node.actual_params = [self.visit(param) for param in node.actual_params]
+        return node
+
+    def visit_VarDecl(self, node):
+        return node
+
+    def visit_Compound(self, node):
+        node.children = [self.visit(child) for child in node.children]
+        return node
+
+    def visit_Assign(self, node):
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_BinOp(self, node):
+        node.left = self.visit(node.left)
+        node.right = self.visit(node.right)
+        return node
+
+    def visit_UnaryOp(self, node):
+        node.expr = self.visit(node.expr)
+        return node
+
+    def visit_NoOp(self, node):
+        return node
+
+    def visit_Var(self, node):
+        return node
+
+    def visit_Num(self, node):
+        return node
+
+
+class ConstantFolding(NodeTransformer):
+    '''
+    Replaces BinOp and UnaryOp nodes whose operands are all constants with
+    a single Num, computed with the same Python operators as the
+    Interpreter. Operations that raise, such as 1 DIV 0, are left for
+    the program to raise at run time.
+    '''
+    name = 'constant folding'
+
+    def visit_BinOp(self, node):
+        node = super().visit_BinOp(node)
+        if type(node.left) is Num and type(node.right) is Num:
+            try:
+                value = BINARY_OPERATIONS[node.op.type](node.left.value, node.right.value)
+            except ArithmeticError:
+                return node
+            self.rewrites += 1
+            return make_num(value)
+        return node
+
+    def visit_UnaryOp(self, node):
+        node = super().visit_UnaryOp(node)
+        if type(node.expr) is Num:
+            self.rewrites += 1
+            return make_num(UNARY_OPERATIONS[node.op.type](node.expr.value))
+        return node
+
+
+class AlgebraicSimplification(NodeTransformer):
+    '''
+    Rewrites that hold for every value the operands can take:
+
+        - - x, + x      ->  x
+        a - - b         ->  a + b
+        a + - b         ->  a - b
+        x * 1, 1 * x    ->  x
+        x - 0           ->  x
+        x + 0, 0 + x    ->  x, when x is an integer
+
+    x + 0 is not an identity for REAL (-0.0 + 0 is 0.0), so it is only
+    removed when x is an integer literal, a variable declared INTEGER, or
+    +, -, * and DIV over those. x / 1 and x DIV 1 can change the type of
+    the result and are kept.
+    '''
+    name = 'algebraic simplification'
+
+    def __init__(self):
+        super().__init__()
+        self.integer_vars = set()
+
+    def visit_ProcedureDecl(self, node):
+        # a procedure's declarations shadow the outer ones only inside it
+        outer = set(self.integer_vars)
+        for param in node.params:
+            self.visit_VarDecl(param)
+        node = super().visit_ProcedureDecl(node)
+        self.integer_vars = outer
+        return node
+
+    def visit_VarDecl(self, node):
+        if node.type_node.value == INTEGER:
+            self.integer_vars.add(node.var_node.value)
+        else:
+            self.integer_vars.discard(node.var_node.value)
+        return node
+
+    def is_integer(self, node):
+        node_type = type(node).__name__
+        if node_type == 'Num':
+            return type(node.value) is int
+        if node_type == 'Var':
+            return node.value in self.integer_vars
+        if node_type == 'UnaryOp':
+            return self.is_integer(node.expr)
+        if node_type == 'BinOp' and node.op.type != FLOAT_DIV:
+            return self.is_integer(node.left) and self.is_integer(node.right)
+        return False
+
+    def visit_UnaryOp(self, node):
+        node = super().visit_UnaryOp(node)
+        expr = node.expr
+        if node.op.type == PLUS:
+            self.rewrites += 1
+            return expr
+        if type(expr) is UnaryOp and expr.op.type == MINUS:
+            self.rewrites += 1
+            return expr.expr
+        return node
+
+    def visit_BinOp(self, node):
+        node = super().visit_BinOp(node)
+        op = node.op.type
+        left, right = node.left, node.right
+
+        if op in (PLUS, MINUS) and type(right) is UnaryOp and right.op.type == MINUS:
+            self.rewrites += 1
+            flipped = Token(MINUS, '-') if op == PLUS else Token(PLUS, '+')
+            return self.visit_BinOp(BinOp(left, flipped, right.expr))
+
+        if op == MUL:
+            if _is_constant(right, 1):
+                self.rewrites += 1
+                return left
+            if _is_constant(left, 1):
+                self.rewrites += 1
+                return right
+        elif op == MINUS:
+            if _is_constant(right, 0):
+                self.rewrites += 1
+                return left
+        elif op == PLUS:
+            if _is_constant(right, 0) and self.is_integer(left):
+                self.rewrites += 1
+                return left
+            if _is_constant(left, 0) and self.is_integer(right):
+                self.rewrites += 1
+                return right
+        return node
+
+
+def _is_constant(node, value):
+    '''
+    Tells whether node is the integer literal value. A REAL literal such
+    as 1.0 is no identity: x * 1.0 turns an INTEGER x into a REAL.
+    '''
+    return type(node) is Num and type(node.value) is int and node.value == value
+
+
+class PassStats:
+    '''
+    What one optimization pass did to the tree.
+    '''
+    def __init__(self, name, nodes_before, nodes_after, rewrites, seconds):
+        self.name = name
+        self.nodes_before = nodes_before
+        self.nodes_after = nodes_after
+        self.rewrites = rewrites
+        self.seconds = seconds
+
+    @property
+    def nodes_removed(self):
+        return self.nodes_before - self.nodes_after
+
+    def __repr__(self):
+        return (f'PassStats({self.name!r}, nodes {self.nodes_before} -> '
+                f'{self.nodes_after}, {self.rewrites} rewrites)')
+
+
+class Optimizer:
+    '''
+    Optional stage between Parser.parse() and execution. Runs each pass
+    over the tree in turn, rewriting it in place, and records a PassStats
+    per pass in self.stats.
+    '''
+    def __init__(self, passes=None):
+        if passes is None:
+            passes = [ConstantFolding, AlgebraicSimplification]
+        self.passes = passes
+        self.stats = []
+
+    def optimize(self, tree):
+        for pass_class in self.passes:
+            optimization = pass_class()
+            nodes_before = count_nodes(tree)
+            start = time.perf_counter()
+            tree = optimization.transform(tree)
+            seconds = time.perf_counter() - start
+            self.stats.append(PassStats(
+                optimization.name, nodes_before, count_nodes(tree),
+                optimization.rewrites, seconds,
+            ))
+        return tree
+
+    def report(self):
+        '''
+        Returns the statistics of every pass run so far as a text table.
+        '''
+        lines = [f'{"pass":<26} {"nodes before":>12} {"after":>8} {"removed":>8}'
+                 f' {"rewrites":>9} {"ms":>8}']
+        for stats in self.stats:
+            lines.append(f'{stats.name:<26} {stats.nodes_before:>12} {stats.nodes_after:>8}'
+                         f' {stats.nodes_removed:>8} {stats.rewrites:>9}'
+                         f' {stats.seconds * 1000:>8.2f}')
+        return '\n'.join(lines)
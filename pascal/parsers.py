@@ -1,79 +1,378 @@
 from ctypes.wintypes import FLOAT
+import operator
+
 from pascal.constants import *
+from pascal.buffers import TokenBuffer
+from pascal.lexers import Lexer
 
 ####################### Classes #########################
 
 class AST:
-    pass
+    '''
+    Nodes use __slots__: large programs have millions of them.
+    '''
+    __slots__ = ()
+
+    def execute(self, interpreter):
+        '''
+        Runs the node under a SpecializingInterpreter. Nodes that do not
+        specialize go through the interpreter's regular visit_ methods.
+        '''
+        return interpreter.dispatch(self)
+
+    def __getattr__(self, name):
+        # Self-specializing nodes keep their executor in an 'execute' slot,
+        # which is empty until the node first runs.
+        if name == 'execute':
+            return self.specialize
+        raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
 
 class NoOp(AST):
-    pass
+    __slots__ = ()
 
 class Num(AST):
+    __slots__ = ('token', 'value', 'static_type')
+
     def __init__(self, token):
         self.token = token
         self.value = token.value
 
+    def execute(self, interpreter):
+        return self.value
+
 class UnaryOp(AST):
+    __slots__ = ('token', 'op', 'expr', 'static_type', 'operation', 'execute')
+
     def __init__(self, op, expr):
         self.token = self.op = op
         self.expr = expr
 
+    def specialize(self, interpreter):
+        '''
+        The operator never changes, so the first execution installs an
+        executor bound to it.
+        '''
+        self.execute = _specialize_unaryop(self)
+        return self.execute(interpreter)
+
 class BinOp(AST):
+    __slots__ = ('left', 'token', 'op', 'right', 'respecializations',
+                 'static_type', 'operation', 'execute')
+
     def __init__(self, left, op, right):
         self.left = left
         self.token = self.op = op
         self.right = right
+        self.respecializations = 0
+
+    def specialize(self, interpreter):
+        '''
+        First execution: evaluates the operands and installs an executor
+        specialized on the operator and operand types. A node that went
+        through a TypeChecker gets the operation it picked instead, with
+        no guards.
+        '''
+        if getattr(self, 'operation', None) is not None:
+            self.execute = _typed_binop(self)
+            return self.execute(interpreter)
+        left = self.left.execute(interpreter)
+        right = self.right.execute(interpreter)
+        self.execute = _specialize_binop(self, type(left), type(right))
+        return BINARY_OPERATIONS[self.op.type](left, right)
+
+    def deoptimize(self, interpreter, left, right):
+        '''
+        Called by a specialized executor when its type guard fails. Picks
+        a new specialization for the operand types seen now, or settles on
+        the type-generic executor once the node has proven polymorphic.
+        '''
+        self.respecializations += 1
+        if self.respecializations > MAX_RESPECIALIZATIONS:
+            self.execute = _generic_binop(self)
+        else:
+            self.execute = _specialize_binop(self, type(left), type(right))
+        return BINARY_OPERATIONS[self.op.type](left, right)
 
 class Var(AST):
+    __slots__ = ('token', 'value', 'depth', 'slot', 'static_type', 'execute')
+
     def __init__(self, token):
         self.token = token
         self.value = token.value
 
+    def specialize(self, interpreter):
+        '''
+        Installs a direct read of the variable, skipping visitor dispatch.
+        '''
+        self.execute = _specialize_var(self)
+        return self.execute(interpreter)
+
 class Assign(AST):
+    __slots__ = ('left', 'type', 'op', 'right', 'execute')
+
     def __init__(self, left, op, right):
         self.left = left
         self.type = self.op = op
         self.right = right
 
+    def specialize(self, interpreter):
+        '''
+        Installs a direct store into the variable, skipping visitor dispatch.
+        '''
+        self.execute = _specialize_assign(self)
+        return self.execute(interpreter)
+
 class Compound(AST):
-    def __init__(self):
-        self.children = []
+    __slots__ = ('children',)
+
+    def __init__(self, children=()):
+        self.children = list(children)
+
+    def execute(self, interpreter):
+        for child in self.children:
+            child.execute(interpreter)
 
 class Type(AST):
+    __slots__ = ('token', 'value')
+
     def __init__(self, token):
         self.token = token
         self.value = token.value
 
 class VarDecl(AST):
+    __slots__ = ('var_node', 'type_node')
+
+    def __init__(self, var_node, type_node):
+        self.var_node = var_node
+        self.type_node = type_node
+
+class Param(AST):
+    __slots__ = ('var_node', 'type_node')
+
     def __init__(self, var_node, type_node):
         self.var_node = var_node
         self.type_node = type_node
 
 class ProcedureDecl(AST):
-    def __init__(self, name, block):
+    __slots__ = ('name', 'params', 'block')
+
+    def __init__(self, name, params, block):
         self.name = name
+        self.params = params
         self.block = block
 
+class ProcedureCall(AST):
+    __slots__ = ('proc_name', 'actual_params', 'token', 'procedure')
+
+    def __init__(self, proc_name, actual_params, token):
+        self.proc_name = proc_name
+        self.actual_params = actual_params
+        self.token = token
+
 class Block(AST):
+    __slots__ = ('declarations', 'compound_statement')
+
     def __init__(self, declarations, compound_statement):
         self.declarations = declarations
         self.compound_statement = compound_statement
 
 class Program(AST):
+    __slots__ = ('name', 'block')
+
     def __init__(self, name, block):
         self.name = name
         self.block = block
 
+'''
+Fields holding child nodes, per node class.
+'''
+CHILD_FIELDS = {
+    'Program': ('block',),
+    'Block': ('declarations', 'compound_statement'),
+    'ProcedureDecl': ('params', 'block'),
+    'Param': ('var_node', 'type_node'),
+    'ProcedureCall': ('actual_params',),
+    'VarDecl': ('var_node', 'type_node'),
+    'Compound': ('children',),
+    'Assign': ('left', 'right'),
+    'BinOp': ('left', 'right'),
+    'UnaryOp': ('expr',),
+}
+
+################ Node specialization ###################
+
+'''
+How many times a node may re-specialize before it gives up and stays generic.
+'''
+MAX_RESPECIALIZATIONS = 4
+
+BINARY_OPERATIONS = {
+    PLUS: operator.add,
+    MINUS: operator.sub,
+    MUL: operator.mul,
+    INTEGER_DIV: operator.floordiv,
+    FLOAT_DIV: operator.truediv,
+}
+
+def _generic_binop(node):
+    '''
+    Type-generic executor: still skips visitor dispatch and the operator
+    if/elif chain, but makes no assumption about operand types.
+    '''
+    left, right = node.left, node.right
+    operation = BINARY_OPERATIONS[node.op.type]
+    def execute(interpreter):
+        return operation(left.execute(interpreter), right.execute(interpreter))
+    return execute
+
+def _specialize_binop(node, left_type, right_type):
+    '''
+    Returns an executor for node that inlines the operator and guards on
+    both operands having the types seen so far.
+    '''
+    if left_type is not right_type or left_type not in (int, float):
+        return _generic_binop(node)
+    kind = left_type
+    left, right = node.left, node.right
+    deoptimize = node.deoptimize
+    op = node.op.type
+
+    if op == PLUS:
+        def execute(interpreter):
+            l = left.execute(interpreter)
+            r = right.execute(interpreter)
+            if l.__class__ is kind and r.__class__ is kind:
+                return l + r
+            return deoptimize(interpreter, l, r)
+    elif op == MINUS:
+        def execute(interpreter):
+            l = left.execute(interpreter)
+            r = right.execute(interpreter)
+            if l.__class__ is kind and r.__class__ is kind:
+                return l - r
+            return deoptimize(interpreter, l, r)
+    elif op == MUL:
+        def execute(interpreter):
+            l = left.execute(interpreter)
+            r = right.execute(interpreter)
+            if l.__class__ is kind and r.__class__ is kind:
+                return l * r
+            return deoptimize(interpreter, l, r)
+    elif op == INTEGER_DIV:
+        def execute(interpreter):
+            l = left.execute(interpreter)
+            r = right.execute(interpreter)
+            if l.__class__ is kind and r.__class__ is kind:
+                return l // r
+            return deoptimize(interpreter, l, r)
+    else:
+        def execute(interpreter):
+            l = left.execute(interpreter)
+            r = right.execute(interpreter)
+            if l.__class__ is kind and r.__class__ is kind:
+                return l / r
+            return deoptimize(interpreter, l, r)
+    return execute
+
+def _typed_binop(node):
+    '''
+    Returns an executor for a node whose operand types a TypeChecker has
+    proven: its operation inlined, with nothing left to check. Only the
+    operators' own implementations are inlined; any other operation is
+    called as it is.
+    '''
+    left, right = node.left, node.right
+    operation = node.operation
+    if operation is operator.add:
+        def execute(interpreter):
+            return left.execute(interpreter) + right.execute(interpreter)
+    elif operation is operator.sub:
+        def execute(interpreter):
+            return left.execute(interpreter) - right.execute(interpreter)
+    elif operation is operator.mul:
+        def execute(interpreter):
+            return left.execute(interpreter) * right.execute(interpreter)
+    elif operation is operator.floordiv:
+        def execute(interpreter):
+            return left.execute(interpreter) // right.execute(interpreter)
+    elif operation is operator.truediv:
+        def execute(interpreter):
+            return left.execute(interpreter) / right.execute(interpreter)
+    else:
+        def execute(interpreter):
+            return operation(left.execute(interpreter), right.execute(interpreter))
+    return execute
+
+def _specialize_unaryop(node):
+    expr = node.expr
+    if node.op.type == MINUS:
+        def execute(interpreter):
+            return -expr.execute(interpreter)
+    else:
+        def execute(interpreter):
+            return +expr.execute(interpreter)
+    return execute
+
+def _specialize_var(node):
+    '''
+    Reads the variable straight out of the interpreter's storage; only an
+    undefined variable takes the generic path, which raises the error.
+    '''
+    name = node.value
+    def execute(interpreter):
+        val = interpreter.GLOBAL_SCOPE.get(name)
+        if val is None:
+            return interpreter.dispatch(node)
+        return val
+    return execute
+
+def _specialize_assign(node):
+    name = node.left.value
+    right = node.right
+    def execute(interpreter):
+        interpreter.GLOBAL_SCOPE[name] = right.execute(interpreter)
+    return execute
+
 ########################################################
 
 class Parser:
-    def __init__(self, lexer):
-        '''
-        Accepts a string input from the client as text,
-        and maintains an index into text and the
-        current token instance.
-        '''
+    # Node constructors used by the grammar methods. Subclasses can
+    # replace them to build a different tree representation.
+    Program = Program
+    Block = Block
+    ProcedureDecl = ProcedureDecl
+    Param = Param
+    ProcedureCall = ProcedureCall
+    VarDecl = VarDecl
+    Type = Type
+    Compound = Compound
+    Assign = Assign
+    Var = Var
+    NoOp = NoOp
+    BinOp = BinOp
+    UnaryOp = UnaryOp
+    Num = Num
+
+    # Whether grammar methods read lexer.token_start. A Lexer is only
+    # asked to keep offsets for parsers that do, its fastest scan has none.
+    token_offsets = False
+
+    def __init__(self, lexer, pretokenize=False):
+        '''
+        Accepts a lexer (or a TokenBuffer to parse again), and
+        maintains the current token instance. A Lexer is scanned in bulk
+        up front, through Lexer.reader().
+
+        With pretokenize the lexer is first drained into a TokenBuffer,
+        available afterwards as self.buffer.
+        '''
+        if pretokenize and not isinstance(lexer, TokenBuffer):
+            lexer = TokenBuffer(lexer)
+        if isinstance(lexer, TokenBuffer):
+            self.buffer = lexer
+            lexer = lexer.reader()
+        elif isinstance(lexer, Lexer):
+            lexer = lexer.reader(self.token_offsets)
         self.lexer = lexer
         self.current_token = self.lexer.get_next_token()
 
@@ -91,6 +390,12 @@ class Parser:
     def error(self):
         raise Exception('Invalid syntax')
 
+    def peek(self, k=1):
+        '''
+        Returns the k-th token after current_token without consuming it.
+        '''
+        return self.lexer.peek_token(k)
+
     def parse(self):
         root = self.program()
         if self.current_token.type != EOF:
@@ -102,11 +407,12 @@ class Parser:
         program: PROGRAM variable SEMI block DOT
         '''
         self.eat(PROGRAM)
-        prog_name = self.variable().value
+        prog_name = self.current_token.value
+        self.eat(ID)
         self.eat(SEMI)
         block_node = self.block()
         self.eat(DOT)
-        return Program(prog_name, block_node)
+        return self.Program(prog_name, block_node)
 
     def block(self):
         '''
@@ -114,11 +420,11 @@ class Parser:
         '''
         decl = self.declarations()
         compound = self.compound_statement()
-        return Block(decl, compound)
+        return self.Block(decl, compound)
 
     def declarations(self):
         '''
-        declarations: VAR (variable_declaration SEMI)+ | empty
+        declarations: (VAR (variable_declaration SEMI)+)? procedure_declaration*
         '''
         declarations = []
         if self.current_token.type == VAR:
@@ -129,30 +435,67 @@ class Parser:
                 self.eat(SEMI)
 
         while self.current_token.type == PROCEDURE:
-            self.eat(PROCEDURE)
-            name = self.current_token.value
-            self.eat(ID)
-            self.eat(SEMI)
-            declarations.append(ProcedureDecl(name, self.block()))
-            self.eat(SEMI)
+            declarations.append(self.procedure_declaration())
 
         return declarations
 
+    def procedure_declaration(self):
+        '''
+        procedure_declaration: PROCEDURE ID (LPAREN formal_parameter_list RPAREN)? SEMI block SEMI
+        '''
+        self.eat(PROCEDURE)
+        name = self.current_token.value
+        self.eat(ID)
+        params = []
+        if self.current_token.type == LPAREN:
+            self.eat(LPAREN)
+            params = self.formal_parameter_list()
+            self.eat(RPAREN)
+        self.eat(SEMI)
+        block_node = self.block()
+        self.eat(SEMI)
+        return self.ProcedureDecl(name, params, block_node)
+
+    def formal_parameter_list(self):
+        '''
+        formal_parameter_list: formal_parameters (SEMI formal_parameters)*
+        '''
+        params = self.formal_parameters()
+        while self.current_token.type == SEMI:
+            self.eat(SEMI)
+            params.extend(self.formal_parameters())
+        return params
+
+    def formal_parameters(self):
+        '''
+        formal_parameters: ID (COMMA ID)* COLON type_spec
+        '''
+        var_nodes = [self.Var(self.current_token)]
+        self.eat(ID)
+        while self.current_token.type == COMMA:
+            self.eat(COMMA)
+            var_nodes.append(self.Var(self.current_token))
+            self.eat(ID)
+        self.eat(COLON)
+
+        type_node = self.type_spec()
+        return [self.Param(var_node, type_node) for var_node in var_nodes]
+
     def variable_declaration(self):
         '''
         variable_declaration : ID (COMMA ID)* COLON type_spec
         '''
-        var_nodes = [Var(self.current_token)] # first id
+        var_nodes = [self.Var(self.current_token)] # first id
         self.eat(ID)
 
         while self.current_token.type == COMMA:
             self.eat(COMMA)
-            var_nodes.append(Var(self.current_token))
+            var_nodes.append(self.Var(self.current_token))
             self.eat(ID)
         self.eat(COLON)
 
         type_node = self.type_spec()
-        var_declarations = [ VarDecl(var_node, type_node) for var_node in var_nodes]
+        var_declarations = [ self.VarDecl(var_node, type_node) for var_node in var_nodes]
         return var_declarations
 
     def type_spec(self):
@@ -164,7 +507,7 @@ class Parser:
             self.eat(INTEGER)
         else:
             self.eat(REAL)
-        node = Type(token)
+        node = self.Type(token)
         return node
 
     def compound_statement(self):
@@ -175,9 +518,7 @@ class Parser:
         nodes = self.statement_list()
         self.eat(END)
 
-        root = Compound()
-        root.children.extend(nodes)
-        return root
+        return self.Compound(nodes)
 
     def statement_list(self):
         '''
@@ -196,15 +537,34 @@ class Parser:
 
     def statement(self):
         '''
-        statement: compound_statement | assignment_statement | empty
+        statement: compound_statement | proccall_statement | assignment_statement | empty
         '''
         if self.current_token.type == BEGIN:
             return self.compound_statement()
         elif self.current_token.type == ID:
-            return self.assignment_statement()
+            if self.peek().type == ASSIGN:
+                return self.assignment_statement()
+            return self.proccall_statement()
         else:
             return self.empty()
 
+    def proccall_statement(self):
+        '''
+        proccall_statement: ID (LPAREN (expr (COMMA expr)*)? RPAREN)?
+        '''
+        token = self.current_token
+        self.eat(ID)
+        actual_params = []
+        if self.current_token.type == LPAREN:
+            self.eat(LPAREN)
+            if self.current_token.type != RPAREN:
+                actual_params.append(self.expr())
+                while self.current_token.type == COMMA:
+                    self.eat(COMMA)
+                    actual_params.append(self.expr())
+            self.eat(RPAREN)
+        return self.ProcedureCall(token.value, actual_params, token)
+
     def assignment_statement(self):
         '''
         assigment_statement: variable ASSIGN expr
@@ -213,13 +573,13 @@ class Parser:
         token = self.current_token
         self.eat(ASSIGN)
         right = self.expr()
-        return Assign(left, token, right)
+        return self.Assign(left, token, right)
 
     def variable(self):
         '''
         variable: ID
         '''
-        node = Var(self.current_token)
+        node = self.Var(self.current_token)
         self.eat(ID)
         return node
 
@@ -227,7 +587,7 @@ class Parser:
         '''
         empty:
         '''
-        return NoOp()
+        return self.NoOp()
 
     def expr(self):
         '''
@@ -244,7 +604,7 @@ class Parser:
                 self.eat(PLUS)
             elif token.type == MINUS:
                 self.eat(MINUS)
-            node = BinOp(left=node, op=token, right=self.term())
+            node = self.BinOp(left=node, op=token, right=self.term())
         return node
 
     def term(self):
@@ -262,7 +622,7 @@ class Parser:
                 self.eat(INTEGER_DIV)
             elif token.type == FLOAT_DIV:
                 self.eat(FLOAT_DIV)
-            node = BinOp(left=node, op=token, right=self.factor())
+            node = self.BinOp(left=node, op=token, right=self.factor())
         return node
 
     def factor(self):
@@ -276,21 +636,21 @@ class Parser:
 
         if token.type == PLUS:
             self.eat(PLUS)
-            node = UnaryOp(token, self.factor())
+            node = self.UnaryOp(token, self.factor())
             return node
 
         elif token.type == MINUS:
             self.eat(MINUS)
-            node = UnaryOp(token, self.factor())
+            node = self.UnaryOp(token, self.factor())
             return node
 
         elif token.type == INTEGER_CONST:
             self.eat(INTEGER_CONST)
-            return Num(token)
+            return self.Num(token)
 
         elif token.type == REAL_CONST:
             self.eat(REAL_CONST)
-            return Num(token)
+            return self.Num(token)
 
         elif token.type == LPAREN:
             self.eat(LPAREN)
@@ -300,4 +660,44 @@ class Parser:
 
         else:
             node = self.variable()
-            return node
\ No newline at end of file
+            return node
+
+class StreamingParser(Parser):
+    '''
+    Parser that hands out the main block of a program one statement at a
+    time, so that each can be run and dropped before the next is parsed:
+    first header(), then statements().
+    '''
+    def header(self):
+        '''
+        Parses the program up to its first statement and returns it as a
+        Program whose main block has no statements.
+
+        PROGRAM variable SEMI declarations BEGIN
+        '''
+        self.eat(PROGRAM)
+        prog_name = self.current_token.value
+        self.eat(ID)
+        self.eat(SEMI)
+        declarations = self.declarations()
+        self.eat(BEGIN)
+        return self.Program(prog_name, self.Block(declarations, self.Compound([])))
+
+    def statements(self):
+        '''
+        Yields each statement of the main block, then parses the rest of
+        the program.
+
+        statement_list END DOT
+        '''
+        yield self.statement()
+        while self.current_token.type == SEMI:
+            self.eat(SEMI)
+            yield self.statement()
+
+        if self.current_token.type == ID:
+            self.error()
+        self.eat(END)
+        self.eat(DOT)
+        if self.current_token.type != EOF:
+            self.error()
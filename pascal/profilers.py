@@ -0,0 +1,196 @@
+import bisect
+import time
+
+from pascal.parsers import Parser
+
+'''
+Node types reported as statements.
+'''
+STATEMENTS = ('Assign', 'ProcedureCall')
+
+
+def _recorded(method):
+    '''
+    Wraps a grammar method so that the node it returns is mapped to the
+    offset of the token it started at. Inner calls return first, so a
+    node keeps the position of the innermost rule that produced it.
+    '''
+    def parse(self):
+        start = self.lexer.token_start
+        node = method(self)
+        self.positions.setdefault(node, start)
+        return node
+    parse.__name__ = method.__name__
+    parse.__doc__ = method.__doc__
+    return parse
+
+
+class PositionParser(Parser):
+    '''
+    Parser that also records where each node starts in the source, as
+    self.positions: node -> character offset. Positions are kept out of
+    the nodes themselves so that nothing is paid for them when not
+    profiling.
+    '''
+    token_offsets = True
+
+    def __init__(self, lexer, pretokenize=False):
+        self.positions = {}
+        super().__init__(lexer, pretokenize)
+
+    def BinOp(self, left, op, right):
+        # built after its right operand has been parsed, so it starts
+        # where its left operand does
+        node = Parser.BinOp(left, op, right)
+        if left in self.positions:
+            self.positions[node] = self.positions[left]
+        return node
+
+    program = _recorded(Parser.program)
+    block = _recorded(Parser.block)
+    procedure_declaration = _recorded(Parser.procedure_declaration)
+    compound_statement = _recorded(Parser.compound_statement)
+    statement = _recorded(Parser.statement)
+    assignment_statement = _recorded(Parser.assignment_statement)
+    proccall_statement = _recorded(Parser.proccall_statement)
+    expr = _recorded(Parser.expr)
+    term = _recorded(Parser.term)
+    factor = _recorded(Parser.factor)
+    variable = _recorded(Parser.variable)
+
+
+class NodeStats:
+    __slots__ = ('hits', 'total', 'own')
+
+    def __init__(self):
+        self.hits = 0
+        self.total = 0.0
+        self.own = 0.0
+
+
+class Profiler:
+    '''
+    Counts and times every node an Interpreter (or SlotInterpreter)
+    visits. attach() replaces visit on that one interpreter instance;
+    nothing changes for interpreters that are not attached, so profiling
+    costs nothing when it is off. SpecializingInterpreter bypasses visit
+    and cannot be profiled.
+
+    total is a node's inclusive time, own its time minus that of the
+    nodes it visited. Given the text and positions from a PositionParser,
+    nodes are reported by line and column.
+    '''
+    def __init__(self, text=None, positions=None):
+        self.text = text
+        self.positions = positions or {}
+        self.line_starts = []
+        if text is not None:
+            self.line_starts = [0] + [i + 1 for i, char in enumerate(text) if char == '\n']
+        self.stats = {}
+        self.stacks = {}
+
+    def attach(self, interpreter):
+        visit = interpreter.visit
+        stats = self.stats
+        stacks = self.stacks
+        label = self.label
+        clock = time.perf_counter
+        # one [path, child time] entry per node being visited
+        frames = [['', 0.0]]
+
+        def profiled_visit(node):
+            parent = frames[-1]
+            frame = [f'{parent[0]};{label(node)}' if parent[0] else label(node), 0.0]
+            frames.append(frame)
+            start = clock()
+            try:
+                return visit(node)
+            finally:
+                elapsed = clock() - start
+                frames.pop()
+                parent[1] += elapsed
+                own = elapsed - frame[1]
+                node_stats = stats.get(node)
+                if node_stats is None:
+                    node_stats = stats[node] = NodeStats()
+                node_stats.hits += 1
+                node_stats.total += elapsed
+                node_stats.own += own
+                stacks[frame[0]] = stacks.get(frame[0], 0.0) + own
+
+        interpreter.visit = profiled_visit
+        return interpreter
+
+    def detach(self, interpreter):
+        interpreter.__dict__.pop('visit', None)
+
+    def location(self, node):
+        '''
+        Returns (line, column) of node, both counted from 1, or None if
+        its position is unknown (for example a node built by an optimizer).
+        '''
+        offset = self.positions.get(node)
+        if offset is None or not self.line_starts:
+            return None
+        line = bisect.bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def label(self, node):
+        kind = type(node).__name__
+        if kind == 'ProcedureCall':
+            kind = f'{kind} {node.proc_name}'
+        location = self.location(node)
+        if location is None:
+            return kind
+        return f'{kind} {location[0]}:{location[1]}'
+
+    def source_line(self, line):
+        end = self.text.find('\n', self.line_starts[line - 1])
+        return self.text[self.line_starts[line - 1]:None if end == -1 else end].strip()
+
+    def report(self, limit=20):
+        '''
+        Returns a text report: statements by cumulative time, then node
+        types by their own time.
+        '''
+        statements = sorted(
+            (node for node in self.stats if type(node).__name__ in STATEMENTS),
+            key=lambda node: self.stats[node].total,
+            reverse=True,
+        )
+        lines = ['Statements by cumulative time',
+                 f'{"line:col":>10} {"hits":>8} {"total ms":>10} {"own ms":>9}  statement']
+        for node in statements[:limit]:
+            node_stats = self.stats[node]
+            location = self.location(node)
+            where = f'{location[0]}:{location[1]}' if location else '?'
+            source = self.source_line(location[0]) if location else type(node).__name__
+            lines.append(f'{where:>10} {node_stats.hits:>8} {node_stats.total * 1000:>10.3f}'
+                         f' {node_stats.own * 1000:>9.3f}  {source}')
+
+        by_type = {}
+        for node, node_stats in self.stats.items():
+            kind = by_type.setdefault(type(node).__name__, [0, 0.0])
+            kind[0] += node_stats.hits
+            kind[1] += node_stats.own
+        lines += ['', 'Node types by own time',
+                  f'{"node":>14} {"hits":>10} {"own ms":>10} {"us/hit":>8}']
+        for kind, (hits, own) in sorted(by_type.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f'{kind:>14} {hits:>10} {own * 1000:>10.3f} {own * 1e6 / hits:>8.2f}')
+        return '\n'.join(lines)
+
+    def collapsed(self):
+        '''
+        Returns the profile in collapsed-stack format, one
+        'frame;frame;frame microseconds' line per distinct stack, as read
+        by flamegraph.pl, speedscope and inferno.
+        '''
+        return ''.join(
+            f'{stack} {round(own * 1e6)}\n'
+            for stack, own in sorted(self.stacks.items())
+            if round(own * 1e6) > 0
+        )
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
@@ -0,0 +1,219 @@
+from pascal.interpreters import Interpreter, SymbolTableBuilder
+from pascal.typecheckers import TypeChecker
+
+'''
+Marks a slot whose variable has not been assigned yet. A sentinel rather
+than None, so that no value a program computes can look undefined.
+'''
+UNDEFINED = object()
+
+'''
+Activation frames SlotInterpreter allocates up front. Deeper call chains
+grow the pool, once; after that calls reuse the same frames.
+'''
+FRAME_POOL_SIZE = 32
+
+
+def assignment_order(statements, order, expanded):
+    '''
+    Adds to order, a dict used as an ordered set, the program frame slot
+    of every variable statements assign, in the order running them first
+    assigns each one, going into the body of each procedure the first
+    time it is called. Programs have no branches or loops, so that order
+    is known before running. expanded holds the procedures already gone
+    into. Returns order.
+    '''
+    for node in statements:
+        kind = type(node).__name__
+        if kind == 'Assign':
+            if node.left.depth == 0:
+                order.setdefault(node.left.slot)
+        elif kind == 'Compound':
+            assignment_order(node.children, order, expanded)
+        elif kind == 'ProcedureCall' and node.procedure not in expanded:
+            expanded.add(node.procedure)
+            assignment_order(node.procedure.decl.block.compound_statement.children,
+                             order, expanded)
+    return order
+
+
+class SlotResolver(SymbolTableBuilder):
+    '''
+    Builds the symbol tables, then gives every variable a static address:
+    the scope level it is declared at (0 for the program, 1 for a
+    procedure declared in it, and so on) and a slot index in that scope's
+    frame. Var nodes get both written onto them as depth and slot, and
+    ProcedureCall nodes get the ProcedureSymbol they call, so the
+    interpreter never looks a name up.
+
+    A procedure's parameters take the first slots of its frame, in order.
+    Other variables get slots in order of first use in the tree, where
+    procedure bodies come before the main block.
+
+    After resolve(), names and types describe the program's frame, and
+    order lists its slots in the order a run first assigns them (see
+    assignment_order()), the order the tree-walker's GLOBAL_SCOPE dict
+    fills in, so that SlotInterpreter.GLOBAL_SCOPE comes out in it too.
+    procedures lists every ProcedureSymbol, each with its depth,
+    frame_size and a blank frame to reset frames from.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.frames = {self.symtab: []}
+        self.procedures = []
+        self.names = []
+        self.types = []
+        self.order = {}
+        self.levels = 1
+        self.frame_size = 0
+
+    def resolve(self, tree):
+        self.visit(tree)
+        program_frame = self.frames[self.symtab]
+        self.names = [var_symbol.name for var_symbol in program_frame]
+        self.types = [var_symbol.type for var_symbol in program_frame]
+        for procedure in self.procedures:
+            self.layout(procedure)
+        self.order = assignment_order(tree.block.compound_statement.children, {}, set())
+        for slot in range(len(self.names)):
+            self.order.setdefault(slot)
+        return self.names
+
+    def layout(self, procedure):
+        '''
+        Sets the depth, frame_size and blank frame of a resolved procedure.
+        '''
+        size = len(self.frames.get(procedure.symtab, ()))
+        procedure.depth = procedure.symtab.scope_level
+        procedure.frame_size = size
+        procedure.blank = [UNDEFINED] * size
+        self.levels = max(self.levels, procedure.depth + 1)
+        self.frame_size = max(self.frame_size, size)
+
+    def allocate(self, var_symbol):
+        frame = self.frames.setdefault(var_symbol.scope, [])
+        var_symbol.slot = len(frame)
+        frame.append(var_symbol)
+
+    def slot(self, node, var_symbol):
+        if var_symbol.slot is None:
+            self.allocate(var_symbol)
+        node.depth = var_symbol.scope.scope_level
+        node.slot = var_symbol.slot
+
+    def visit_ProcedureDecl(self, node):
+        super().visit_ProcedureDecl(node)
+        self.procedures.append(self.symtab.lookup(node.name, current_scope_only=True))
+
+    def visit_Param(self, node):
+        var_symbol = super().visit_Param(node)
+        self.allocate(var_symbol)
+        return var_symbol
+
+    def visit_ProcedureCall(self, node):
+        node.procedure = proc_symbol = super().visit_ProcedureCall(node)
+        return proc_symbol
+
+    def visit_Assign(self, node):
+        var_symbol = super().visit_Assign(node)
+        self.slot(node.left, var_symbol)
+        return var_symbol
+
+    def visit_Var(self, node):
+        var_symbol = super().visit_Var(node)
+        self.slot(node, var_symbol)
+        return var_symbol
+
+
+class SemanticAnalyzer(TypeChecker, SlotResolver):
+    '''
+    The whole of semantic analysis in one walk over the tree: declarations
+    and names are checked as SymbolTableBuilder does, variables and calls
+    are resolved as SlotResolver does, and expressions are typed, with
+    their operations picked, as TypeChecker does. Each node is visited
+    once, where running the three separately would walk the tree three
+    times.
+    '''
+
+
+class SlotInterpreter(Interpreter):
+    '''
+    Tree-walking interpreter that keeps variables in preallocated frames,
+    indexed by the addresses SlotResolver assigned, instead of a dict
+    keyed by name. GLOBAL_SCOPE is still available as a name -> value
+    dict, built on demand.
+
+    display[d] is the frame of the innermost active scope at level d,
+    which under lexical scoping is the only frame at that level a
+    procedure can see. A call takes the next frame from a pool indexed
+    by call depth, points display at it for the callee's level and puts
+    the old entry back on return, so calls allocate nothing.
+
+    Resolution writes into the tree, so a tree that is run many times only
+    needs it once: pass a SlotResolver that has resolved it and
+    visit_Program skips straight to execution.
+    '''
+    def __init__(self, parser, resolver=None):
+        self.parser = parser
+        self.resolver = resolver
+        self.names = []
+        self.order = {}
+        self.display = []
+        self.frames = []
+        self.call_depth = 0
+
+    @property
+    def GLOBAL_SCOPE(self):
+        if not self.display:
+            return {}
+        names = self.names
+        frame = self.display[0]
+        return {names[slot]: frame[slot] for slot in self.order if frame[slot] is not UNDEFINED}
+
+    def visit_Program(self, node):
+        if self.resolver is None:
+            self.resolver = SlotResolver()
+            self.resolver.resolve(node)
+        resolver = self.resolver
+        self.names = resolver.names
+        self.order = resolver.order
+        self.display = [[UNDEFINED] * len(self.names)] + [None] * (resolver.levels - 1)
+        if resolver.procedures:
+            self.frames = [[UNDEFINED] * resolver.frame_size for _ in range(FRAME_POOL_SIZE)]
+        self.call_depth = 0
+        self.visit(node.block)
+
+    def visit_ProcedureCall(self, node):
+        procedure = node.procedure
+        call_depth = self.call_depth
+        if call_depth == len(self.frames):
+            self.frames.append([UNDEFINED] * self.resolver.frame_size)
+        frame = self.frames[call_depth]
+        frame[:procedure.frame_size] = procedure.blank
+        # arguments are evaluated in the caller's scope, before the
+        # callee's frame becomes visible
+        slot = 0
+        for param in node.actual_params:
+            frame[slot] = self.visit(param)
+            slot += 1
+
+        display = self.display
+        depth = procedure.depth
+        saved = display[depth]
+        display[depth] = frame
+        self.call_depth = call_depth + 1
+        try:
+            self.visit(procedure.decl.block.compound_statement)
+        finally:
+            self.call_depth = call_depth
+            display[depth] = saved
+
+    def visit_Assign(self, node):
+        left = node.left
+        self.display[left.depth][left.slot] = self.visit(node.right)
+
+    def visit_Var(self, node):
+        val = self.display[node.depth][node.slot]
+        if val is UNDEFINED:
+            raise NameError(repr(node.value))
+        return val
@@ -0,0 +1,333 @@
+import mmap
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from pascal.lexers import Lexer, StreamLexer
+from pascal.parsers import Parser, StreamingParser
+from pascal.grammars import StreamingTableParser, TableParser
+from pascal.interpreters import Interpreter, SpecializingInterpreter
+from pascal.resolvers import SlotInterpreter, SlotResolver
+from pascal.bytecode import Compiler, VirtualMachine
+from pascal.transpilers import compile_source, compile_tree, load_program, run_code
+from pascal.serializers import is_serialized, load
+from pascal.optimizers import Optimizer
+from pascal.typecheckers import TypeChecker, TypedInterpreter
+from pascal.profilers import PositionParser, Profiler
+from pascal.tracers import TraceRecorder, TracingInterpreter
+
+ENGINES = ('tree', 'specializing', 'typed', 'slots', 'vm', 'python')
+
+'''
+Parsers programs can be read with: the hand-written recursive-descent
+Parser, or TableParser, driven by the LL(1) table of grammars/grammar.lark.
+Both build the same tree. The table parser takes expressions and blocks
+nested to any depth, but parses at about 0.4x the speed.
+'''
+PARSERS = {
+    'recursive': Parser,
+    'table': TableParser,
+}
+
+'''
+Engines that go through NodeVisitor.visit, which is what Profiler hooks.
+'''
+PROFILED_ENGINES = ('tree', 'slots')
+
+'''
+Engines that can run a program one statement at a time, see run_stream().
+The others need the whole tree before they start.
+'''
+STREAMED_ENGINES = ('tree', 'specializing')
+
+'''
+Files picked up when a directory is given to find_programs().
+'''
+PROGRAM_SUFFIXES = ('.pas', '.txt', '.pasast')
+
+'''
+Programs a batch worker runs per task. Small programs take well under a
+millisecond, so sending them one at a time would spend more on
+inter-process traffic than on running them.
+'''
+DEFAULT_CHUNKSIZE = 32
+
+
+def optimize(tree, optimizer, engine='tree'):
+    '''
+    Optimizes tree for engine, after checking it the way engine checks
+    programs before running them. Folding can remove the very expression
+    a check rejects, like 7.5 DIV 2, so checking afterwards would accept
+    optimized programs that fail unoptimized.
+    '''
+    if engine == 'typed':
+        TypeChecker().check(tree)
+    elif engine == 'slots':
+        SlotResolver().resolve(tree)
+    return optimizer.optimize(tree)
+
+
+def parse(text, parser='recursive'):
+    '''
+    Parses Pascal source text with the chosen parser (see PARSERS).
+    '''
+    return PARSERS[parser](Lexer(text)).parse()
+
+
+def run(text, engine='tree', optimizer=None, parser='recursive'):
+    '''
+    Runs a Pascal program with the chosen engine and returns
+    its global scope.
+    '''
+    if engine == 'python':
+        return run_code(compile_source(text, optimizer=optimizer, parser_class=PARSERS[parser]))
+    tree = parse(text, parser)
+    if optimizer is not None:
+        tree = optimize(tree, optimizer, engine)
+    return execute(tree, engine)
+
+
+def execute(tree, engine='tree'):
+    '''
+    Runs an already parsed program (node objects or an arena view)
+    with the chosen engine and returns its global scope.
+    '''
+    if engine == 'vm':
+        vm = VirtualMachine(Compiler(None).compile_tree(tree))
+        vm.run()
+        return vm.GLOBAL_SCOPE
+    if engine == 'python':
+        return run_code(compile_tree(tree))
+    if engine == 'specializing':
+        interpreter = SpecializingInterpreter(None)
+    elif engine == 'typed':
+        interpreter = TypedInterpreter(None)
+    elif engine == 'slots':
+        interpreter = SlotInterpreter(None)
+    else:
+        interpreter = Interpreter(None)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def profile(text, engine='tree', optimizer=None):
+    '''
+    Runs a Pascal program under a Profiler and returns its global scope
+    and the profiler.
+    '''
+    if engine not in PROFILED_ENGINES:
+        raise Exception(f'Cannot profile the {engine} engine, use one of {", ".join(PROFILED_ENGINES)}')
+    parser = PositionParser(Lexer(text))
+    tree = parser.parse()
+    if optimizer is not None:
+        tree = optimize(tree, optimizer, engine)
+    interpreter = SlotInterpreter(None) if engine == 'slots' else Interpreter(None)
+    profiler = Profiler(text, parser.positions)
+    profiler.attach(interpreter)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE, profiler
+
+
+def trace(text, capacity, optimizer=None):
+    '''
+    Runs a Pascal program on a TracingInterpreter keeping the last
+    capacity assignments, and returns its global scope. If the program
+    raises, the exception carries those assignments, by line and column,
+    as a note.
+    '''
+    parser = PositionParser(Lexer(text))
+    tree = parser.parse()
+    if optimizer is not None:
+        tree = optimize(tree, optimizer)
+    recorder = TraceRecorder(capacity, text, parser.positions)
+    interpreter = TracingInterpreter(None, recorder, dump=capacity)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def run_file(path, engine='tree', optimizer=None, use_cache=True, parser='recursive'):
+    '''
+    Runs the Pascal source file, or serialized AST, at path and returns
+    its global scope.
+    '''
+    if is_serialized(path):
+        # built elsewhere with --emit-ast: no front end at all
+        return execute(load(path).tree(), engine)
+    if engine == 'python':
+        # the cache is keyed on the file, so unchanged programs
+        # never reach the lexer
+        return run_code(load_program(path, use_cache=use_cache, optimizer=optimizer,
+                                     parser_class=PARSERS[parser]))
+    with open(path, 'r') as f:
+        text = f.read()
+    return run(text, engine, optimizer, parser)
+
+
+def run_stream(path, engine='tree', parser='recursive'):
+    '''
+    Runs the Pascal source file at path without ever holding all of it:
+    the file is memory-mapped, and each statement of the main block is
+    parsed, run and dropped before the next. Returns the global scope,
+    the same one run_file() would.
+
+    Statements run as they are parsed, so a program with a syntax error
+    further down has already run everything above it when the error is
+    raised.
+    '''
+    if engine not in STREAMED_ENGINES:
+        raise Exception(f'Cannot stream the {engine} engine, use one of {", ".join(STREAMED_ENGINES)}')
+    interpreter = SpecializingInterpreter(None) if engine == 'specializing' else Interpreter(None)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap refuses empty files
+            source = b''
+        else:
+            source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            parser_class = StreamingTableParser if parser == 'table' else StreamingParser
+            stream = parser_class(StreamLexer(source))
+            interpreter.visit(stream.header())
+            for statement in stream.statements():
+                interpreter.visit(statement)
+        finally:
+            if isinstance(source, mmap.mmap):
+                source.close()
+    return interpreter.GLOBAL_SCOPE
+
+
+def find_programs(paths=(), manifest=None):
+    '''
+    Yields the programs to run: each path that is a file, every file with
+    one of PROGRAM_SUFFIXES under each path that is a directory, then each
+    line of the manifest file. Manifest paths are relative to the
+    manifest; blank lines and lines starting with # are skipped.
+    '''
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(name for name in dirnames if not name.startswith(('.', '__')))
+                for filename in sorted(filenames):
+                    if filename.endswith(PROGRAM_SUFFIXES):
+                        yield os.path.join(directory, filename)
+        else:
+            yield path
+
+    if manifest is not None:
+        base = os.path.dirname(manifest)
+        with open(manifest, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield os.path.join(base, line)
+
+
+def run_chunk(paths, engine='tree', optimize=False, use_cache=True, parser='recursive'):
+    '''
+    Runs each program in paths and returns one result dict per program:
+    file, ok, seconds, and either scope or the error and its message. A
+    failing program never stops the others.
+    '''
+    results = []
+    for path in paths:
+        start = time.perf_counter()
+        try:
+            optimizer = Optimizer() if optimize else None
+            scope = run_file(path, engine, optimizer, use_cache, parser)
+        except Exception as e:
+            results.append({
+                'file': path,
+                'ok': False,
+                'error': type(e).__name__,
+                'message': str(e),
+                'seconds': time.perf_counter() - start,
+            })
+        else:
+            results.append({
+                'file': path,
+                'ok': True,
+                'scope': scope,
+                'seconds': time.perf_counter() - start,
+            })
+    return results
+
+
+def _chunks(paths, chunksize):
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == chunksize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _failed(chunk, error):
+    return [{
+        'file': path,
+        'ok': False,
+        'error': type(error).__name__,
+        'message': str(error),
+        'seconds': 0.0,
+    } for path in chunk]
+
+
+def _completed(pending):
+    '''
+    Waits for at least one of the pending futures (future -> chunk) and
+    yields the results of every chunk that is done. A chunk whose worker
+    died gets a failed result per program instead.
+    '''
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        chunk = pending.pop(future)
+        try:
+            results = future.result()
+        except Exception as e:
+            results = _failed(chunk, e)
+        yield from results
+
+
+def run_batch(paths, engine='tree', workers=None, chunksize=DEFAULT_CHUNKSIZE,
+              optimize=False, use_cache=True, parser='recursive'):
+    '''
+    Runs many programs across a pool of worker processes and yields one
+    run_chunk() result per program. Results come a chunk at a time, as
+    each chunk completes, so output starts before the whole batch is done
+    and comes in completion order, not input order.
+
+    paths may be any iterable, including a find_programs() generator; only
+    a couple of chunks per worker are queued at a time, so huge batches
+    do not sit in memory. With workers=1 everything runs in this process.
+
+    A worker that dies, say killed for running out of memory, fails the
+    programs of the chunks that were queued at the time; the pool is
+    started again for the rest of the batch.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = _chunks(paths, chunksize)
+
+    if workers == 1:
+        for chunk in chunks:
+            yield from run_chunk(chunk, engine, optimize, use_cache, parser)
+        return
+
+    executor = ProcessPoolExecutor(workers)
+    try:
+        pending = {}
+        for chunk in chunks:
+            try:
+                future = executor.submit(run_chunk, chunk, engine, optimize, use_cache, parser)
+            except BrokenProcessPool:
+                executor.shutdown(wait=False)
+                executor = ProcessPoolExecutor(workers)
+                future = executor.submit(run_chunk, chunk, engine, optimize, use_cache, parser)
+            pending[future] = chunk
+            if len(pending) >= 2 * workers:
+                yield from _completed(pending)
+        while pending:
+            yield from _completed(pending)
+    finally:
+        executor.shutdown(cancel_futures=True)
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from pascal.bytecode import Code, Compiler, VirtualMachine
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+
+'''
+Instruction words a program runs before giving the event loop back:
+about a millisecond on the VM.
+'''
+DEFAULT_BUDGET = 10000
+
+
+def compile_text(text):
+    return Compiler(None).compile_tree(Parser(Lexer(text)).parse())
+
+
+async def run_async(program, budget=DEFAULT_BUDGET, max_steps=None, timeout=None):
+    '''
+    Runs a program, given as source or as compiled Code, on the bytecode
+    VM in slices of about budget instruction words, yielding to the event
+    loop between slices, and returns its global scope. Source is
+    compiled in a worker thread, so big programs do not hold up the loop
+    while they are parsed either.
+
+    A step is an instruction word: one for an operator, two for a load,
+    constant or store. A slice ends after budget of them, in the middle
+    of a statement if need be, so even one huge expression yields to the
+    loop. A program that runs max_steps of them without finishing raises
+    RuntimeError, one still running timeout seconds after it started
+    raises TimeoutError; both are checked between slices. Cancelling the
+    task stops the program at the end of the current slice.
+
+    The VM runs what Interpreter runs, without procedure calls.
+    '''
+    loop = asyncio.get_running_loop()
+    deadline = None if timeout is None else loop.time() + timeout
+    if not isinstance(program, Code):
+        program = await asyncio.to_thread(compile_text, program)
+    vm = VirtualMachine(program)
+    if max_steps is not None:
+        budget = min(budget, max_steps)
+    while True:
+        # every slice, the first one too, waits for a turn of its own:
+        # asyncio runs ready callbacks first in, first out, so every
+        # running program gets one slice per round, and a burst of short
+        # programs cannot run back to back in one go
+        await asyncio.sleep(0)
+        if vm.run(budget):
+            break
+        if max_steps is not None and vm.pc >= max_steps:
+            raise RuntimeError(f'Program did not finish within {max_steps} steps')
+        if deadline is not None and loop.time() >= deadline:
+            raise TimeoutError(f'Program did not finish within {timeout} seconds')
+    return vm.GLOBAL_SCOPE
+
+
+class Scheduler:
+    '''
+    Runs many programs concurrently in one event loop with run_async(),
+    sharing the same budget and limits. Every running program gets one
+    slice per round, so a long program never holds up short ones for
+    more than a slice at a time. With concurrency, at most that many
+    programs run at once and the others wait their turn in the order
+    they were submitted.
+    '''
+    def __init__(self, budget=DEFAULT_BUDGET, max_steps=None, timeout=None, concurrency=None):
+        self.budget = budget
+        self.max_steps = max_steps
+        self.timeout = timeout
+        self.semaphore = None if concurrency is None else asyncio.Semaphore(concurrency)
+
+    async def run(self, program):
+        if self.semaphore is None:
+            return await run_async(program, self.budget, self.max_steps, self.timeout)
+        async with self.semaphore:
+            return await run_async(program, self.budget, self.max_steps, self.timeout)
+
+    def submit(self, program):
+        '''
+        Starts program as a task of the running loop and returns the task,
+        which gives the global scope and can be cancelled.
+        '''
+        return asyncio.ensure_future(self.run(program))
+
+    async def _result(self, index, program):
+        start = time.perf_counter()
+        try:
+            scope = await self.run(program)
+        except Exception as e:
+            return {
+                'index': index,
+                'ok': False,
+                'error': type(e).__name__,
+                'message': str(e),
+                'seconds': time.perf_counter() - start,
+            }
+        return {'index': index, 'ok': True, 'scope': scope, 'seconds': time.perf_counter() - start}
+
+    async def run_all(self, programs):
+        '''
+        Runs every program and yields one result dict per program as it
+        finishes, like run_batch() in pascal.runners: index (its position
+        in programs), ok, seconds, and either scope or the error and its
+        message. A failing program never stops the others; leaving the
+        loop early cancels the programs still running.
+        '''
+        tasks = [asyncio.ensure_future(self._result(index, program))
+                 for index, program in enumerate(programs)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
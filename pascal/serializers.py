@@ -0,0 +1,211 @@
+import mmap
+import struct
+import sys
+from array import array
+
+from pascal.arenas import ASTArena, NodeView
+from pascal.buffers import KINDS, KIND_CODES
+from pascal.lexers import Token
+
+'''
+Binary AST format, version 2. All integers are little-endian.
+
+    header   MAGIC, version (u16), node count, list length, token count,
+             string count, root node, offset of the tables (u32 each)
+    kinds    one byte per node, padded to a multiple of 4
+    first    node count i32
+    second   node count i32
+    third    node count i32
+    lists    list length i32
+    tables   the tokens, then the strings
+
+A token is its kind code (u8), a value tag (u8) and the value; a string
+is a u32 byte length followed by UTF-8. Integer values are stored as
+decimal text since Pascal literals are not bounded to 64 bits.
+
+The node arrays are 4-byte aligned, so load() can hand them to ASTArena
+as memoryviews over the mapped file: nothing is copied and no node is
+built until a visitor reaches it.
+'''
+MAGIC = b'PASAST'
+VERSION = 2
+HEADER = struct.Struct('<6sH6I')
+
+TAG_NONE  = 0
+TAG_INT   = 1
+TAG_FLOAT = 2
+TAG_STR   = 3
+
+
+def _pack_string(out, string):
+    data = string.encode('utf-8')
+    out += struct.pack('<I', len(data))
+    out += data
+
+
+def _pack_token(out, token):
+    out.append(KIND_CODES[token.type])
+    value = token.value
+    if value is None:
+        out.append(TAG_NONE)
+    elif isinstance(value, int):
+        out.append(TAG_INT)
+        _pack_string(out, str(value))
+    elif isinstance(value, float):
+        out.append(TAG_FLOAT)
+        out += struct.pack('<d', value)
+    else:
+        out.append(TAG_STR)
+        _pack_string(out, value)
+
+
+def _int32_bytes(values):
+    data = array('i', values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def dumps(tree):
+    '''
+    Serializes an ASTArena, a view of one, or a tree of node objects
+    as returned by Parser.parse().
+    '''
+    if isinstance(tree, NodeView):
+        arena = tree.arena
+    elif isinstance(tree, ASTArena):
+        arena = tree
+    else:
+        arena = ASTArena.from_tree(tree)
+
+    nodes = len(arena.kinds)
+    kinds = bytes(arena.kinds)
+    kinds += b'\0' * (-len(kinds) % 4)
+    sections = [
+        kinds,
+        _int32_bytes(arena.first),
+        _int32_bytes(arena.second),
+        _int32_bytes(arena.third),
+        _int32_bytes(arena.lists),
+    ]
+    tables_offset = HEADER.size + sum(len(section) for section in sections)
+
+    tables = bytearray()
+    for token in arena.tokens:
+        _pack_token(tables, token)
+    for string in arena.strings:
+        _pack_string(tables, string)
+
+    header = HEADER.pack(
+        MAGIC, VERSION, nodes, len(arena.lists), len(arena.tokens),
+        len(arena.strings), arena.root, tables_offset,
+    )
+    return b''.join([header] + sections + [bytes(tables)])
+
+
+def dump(tree, path):
+    with open(path, 'wb') as f:
+        f.write(dumps(tree))
+
+
+def is_serialized(path):
+    '''
+    Tells whether the file at path starts with the binary AST magic.
+    '''
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class _Reader:
+    def __init__(self, data, pos):
+        self.data = data
+        self.pos = pos
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def string(self):
+        (length,) = self.unpack('<I')
+        start = self.pos
+        self.pos += length
+        if self.pos > len(self.data):
+            raise Exception('Truncated serialized AST')
+        return bytes(self.data[start:self.pos]).decode('utf-8')
+
+    def token(self):
+        kind, tag = self.unpack('<BB')
+        if tag == TAG_NONE:
+            value = None
+        elif tag == TAG_INT:
+            value = int(self.string())
+        elif tag == TAG_FLOAT:
+            (value,) = self.unpack('<d')
+        elif tag == TAG_STR:
+            value = self.string()
+        else:
+            raise Exception(f'Invalid value tag {tag} in serialized AST')
+        return Token(KINDS[kind], value)
+
+
+def _int32_view(data, start, count):
+    view = data[start:start + 4 * count]
+    if sys.byteorder == 'little':
+        return view.cast('i')
+    values = array('i', view)
+    values.byteswap()
+    return values
+
+
+def loads(data):
+    '''
+    Returns an ASTArena reading its node arrays straight out of data
+    (bytes, or any buffer such as a memoryview or mmap). The sections the
+    header describes are checked against the size of data up front.
+    '''
+    data = memoryview(data)
+    if len(data) < HEADER.size:
+        raise Exception('Truncated serialized AST')
+    (magic, version, nodes, list_length, token_count, string_count,
+     root, tables_offset) = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise Exception('Not a serialized AST')
+    if version != VERSION:
+        raise Exception(f'Unsupported serialized AST version {version}')
+    arrays_end = HEADER.size + nodes + (-nodes % 4) + 12 * nodes + 4 * list_length
+    if not arrays_end <= tables_offset <= len(data):
+        raise Exception('Truncated serialized AST')
+    if nodes and root >= nodes:
+        raise Exception(f'Invalid root node {root} in serialized AST')
+
+    arena = ASTArena()
+    pos = HEADER.size
+    arena.kinds = data[pos:pos + nodes]
+    pos += nodes + (-nodes % 4)
+    arena.first = _int32_view(data, pos, nodes)
+    pos += 4 * nodes
+    arena.second = _int32_view(data, pos, nodes)
+    pos += 4 * nodes
+    arena.third = _int32_view(data, pos, nodes)
+    pos += 4 * nodes
+    arena.lists = _int32_view(data, pos, list_length)
+
+    reader = _Reader(data, tables_offset)
+    try:
+        arena.tokens = [reader.token() for _ in range(token_count)]
+        arena.strings = [reader.string() for _ in range(string_count)]
+    except (struct.error, IndexError, UnicodeDecodeError):
+        raise Exception('Truncated serialized AST')
+    arena.root = root
+    return arena
+
+
+def load(path):
+    '''
+    Maps the file at path into memory and returns the arena stored in it.
+    The mapping stays open for as long as the arena is referenced.
+    '''
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(mapped)
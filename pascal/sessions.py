@@ -0,0 +1,192 @@
+import time
+
+from pascal.constants import *
+from pascal.lexers import Lexer
+from pascal.parsers import Parser, ProcedureDecl
+from pascal.resolvers import (
+    FRAME_POOL_SIZE, UNDEFINED, SemanticAnalyzer, SlotInterpreter, assignment_order,
+)
+from pascal.symbols import VarSymbol
+
+
+class SessionParser(Parser):
+    '''
+    Parses one line of an interactive session: declarations, statements
+    or both, with no PROGRAM header, BEGIN/END or final dot.
+
+        VAR x, y : INTEGER; x := 2; y := x * 3
+    '''
+    def entry(self):
+        '''
+        entry: (VAR (variable_declaration SEMI)* | procedure_declaration)* statement_list
+        '''
+        declarations = []
+        while self.current_token.type in (VAR, PROCEDURE):
+            if self.current_token.type == PROCEDURE:
+                declarations.append(self.procedure_declaration())
+                continue
+            self.eat(VAR)
+            # an ID that is not followed by , or : starts a statement
+            while self.current_token.type == ID and self.peek().type in (COMMA, COLON):
+                declarations.extend(self.variable_declaration())
+                self.eat(SEMI)
+        statements = self.statement_list()
+        if self.current_token.type != EOF:
+            self.error()
+        return declarations, statements
+
+
+class SessionResolver(SemanticAnalyzer):
+    '''
+    SemanticAnalyzer that is fed a session one line at a time. Everything
+    resolved so far stays, so a line is only checked, typed and given
+    slots against the tables built by the lines before it. A type error,
+    like assigning a REAL to an INTEGER, is caught before the line runs.
+
+    assigned collects the program variables each line assigns to, for
+    the session to report.
+    '''
+    def __init__(self):
+        super().__init__()
+        self.assigned = []
+
+    def visit_VarDecl(self, node):
+        name = node.var_node.value
+        if self.symtab.scope_level == 0 and isinstance(self.symtab.lookup(name, current_scope_only=True), VarSymbol):
+            raise Exception(f'Variable {name} already declared.')
+        super().visit_VarDecl(node)
+
+    def visit_Assign(self, node):
+        var_symbol = super().visit_Assign(node)
+        # not those in procedure bodies, which do not run yet
+        if self.symtab.scope_level == 0:
+            self.assigned.append(node.left)
+        return var_symbol
+
+
+class Session:
+    '''
+    An interactive session: declarations, procedures and variable values
+    persist from one line to the next, the way they would if the lines
+    made up one program.
+
+    Each line is parsed on its own and resolved against the symbol
+    tables and slots of the lines before it, then run on a
+    SlotInterpreter whose frames are only ever grown. Nothing earlier is
+    parsed, checked or run again, so the time a line takes depends on
+    the line, not on how long the session has gone on.
+
+    A line that fails to parse or check changes nothing. A line that
+    fails while running keeps the effects of the statements before the
+    failing one.
+
+    timings holds (line, compile seconds, run seconds) for every line
+    that got as far as running.
+    '''
+    def __init__(self):
+        self.resolver = SessionResolver()
+        self.interpreter = SlotInterpreter(None, self.resolver)
+        self.interpreter.names = self.names = []
+        self.interpreter.order = self.order = {}
+        self.expanded = set()
+        self.interpreter.display = [[]]
+        self.timings = []
+
+    @property
+    def GLOBAL_SCOPE(self):
+        return self.interpreter.GLOBAL_SCOPE
+
+    def run(self, text):
+        '''
+        Runs one line and returns the variables it assigned, with their
+        new values, in order.
+        '''
+        start = time.perf_counter()
+        declarations, statements = SessionParser(Lexer(text)).entry()
+        self.check(declarations, statements)
+        self.grow()
+        compiled = time.perf_counter()
+
+        interpreter = self.interpreter
+        try:
+            for statement in statements:
+                try:
+                    interpreter.visit(statement)
+                finally:
+                    # also when it failed part way: what it did assign stays
+                    assignment_order((statement,), self.order, self.expanded)
+        finally:
+            self.timings.append((text, compiled - start, time.perf_counter() - compiled))
+
+        storage = interpreter.display[0]
+        return {var.value: storage[var.slot] for var in self.resolver.assigned}
+
+    def check(self, declarations, statements):
+        '''
+        Resolves a parsed line, undoing its declarations if any of it
+        does not check.
+        '''
+        resolver = self.resolver
+        symtab = resolver.symtab
+        # only declarations change the tables; statements just add slots
+        symbols = symtab._symbols
+        frame = resolver.frames[symtab]
+        slots = len(frame)
+        saved = {}
+        for declaration in declarations:
+            name = declaration.name if isinstance(declaration, ProcedureDecl) else declaration.var_node.value
+            saved.setdefault(name, symbols.get(name))
+        procedures = len(resolver.procedures)
+        resolver.assigned = []
+        try:
+            for declaration in declarations:
+                resolver.visit(declaration)
+            for statement in statements:
+                resolver.visit(statement)
+        except Exception:
+            resolver.symtab = symtab
+            for name, symbol in saved.items():
+                if symbol is None:
+                    symbols.pop(name, None)
+                else:
+                    symbols[name] = symbol
+            del resolver.procedures[procedures:]
+            # variables first used by this line, declared by it or before it
+            for var_symbol in frame[slots:]:
+                var_symbol.slot = None
+            del frame[slots:]
+            raise
+        for procedure in resolver.procedures[procedures:]:
+            resolver.layout(procedure)
+
+    def grow(self):
+        '''
+        Makes room in the interpreter for slots and procedures added by
+        the line just checked.
+        '''
+        resolver = self.resolver
+        interpreter = self.interpreter
+        storage = interpreter.display[0]
+        for var_symbol in resolver.frames[resolver.symtab][len(storage):]:
+            self.names.append(var_symbol.name)
+            storage.append(UNDEFINED)
+        display = interpreter.display
+        display.extend([None] * (resolver.levels - len(display)))
+        if not resolver.procedures:
+            return
+        if not interpreter.frames:
+            interpreter.frames = [[] for _ in range(FRAME_POOL_SIZE)]
+        for frame in interpreter.frames:
+            frame.extend([UNDEFINED] * (resolver.frame_size - len(frame)))
+
+    def report(self, last=None):
+        '''
+        Returns a table of compile and run time per line, for the last
+        lines only if last is given.
+        '''
+        timings = self.timings if last is None else self.timings[-last:]
+        first = len(self.timings) - len(timings) + 1
+        lines = [f'{"#":>5} {"compile ms":>11} {"run ms":>9}  line']
+        for number, (text, compile_time, run_time) in enumerate(timings, first):
+            lines.append(f'{number:>5} {compile_time * 1000:>11.3f} {run_time * 1000:>9.3f}  {text}')
+        return '\n'.join(lines)
@@ -0,0 +1,305 @@
+import gc
+import os
+import pickle
+import struct
+import time
+
+from pascal.interpreters import Interpreter
+
+'''
+Binary snapshot format, version 1. All integers are little-endian.
+
+    header     MAGIC, version (u16), position length, variable count (u32 each)
+    position   position length u32
+    variables  a name, then a value tag (u8) and the value, per variable
+
+A name is a u32 byte length followed by UTF-8. Integers that fit in 64
+bits are stored as i64, bigger ones as decimal text like a name, reals as
+f64.
+'''
+MAGIC = b'PASSNP'
+VERSION = 1
+HEADER = struct.Struct('<6sH2I')
+
+TAG_INT    = 1
+TAG_BIGINT = 2
+TAG_FLOAT  = 3
+
+
+class Snapshot:
+    '''
+    The state of an Interpreter between two statements: its global
+    variables, and the position of the next statement to run as the
+    index of that statement in each enclosing Compound, outermost (the
+    main block) first. (k,) is just before the k-th statement of the
+    main block, and (len(children),) is the end of the program.
+
+    A snapshot says nothing about which program it was taken from:
+    resuming it on a program whose statements before position differ
+    runs the rest of that program on the wrong values.
+    '''
+    __slots__ = ('scope', 'position')
+
+    def __init__(self, scope, position):
+        self.scope = scope
+        self.position = tuple(position)
+
+    def __repr__(self):
+        return f'Snapshot(position={self.position}, variables={len(self.scope)})'
+
+    def __eq__(self, other):
+        return (isinstance(other, Snapshot) and self.position == other.position
+                and not diff(self, other))
+
+
+class _Stop(Exception):
+    def __init__(self, snapshot):
+        super().__init__(f'Stopped at {snapshot.position}')
+        self.snapshot = snapshot
+
+
+class SnapshotInterpreter(Interpreter):
+    '''
+    Interpreter that keeps track of the statement it is at, so it can
+    stop at a given position and hand its state over as a Snapshot, and
+    can start from a Snapshot instead of from the top.
+
+    Only the main block is positioned: procedure bodies are not run by
+    Interpreter.
+    '''
+    def __init__(self, parser, snapshot=None, stop_at=None):
+        super().__init__(parser)
+        self.position = []
+        self.stop_at = None if stop_at is None else list(stop_at)
+        self._resume = []
+        if snapshot is not None:
+            # values are immutable numbers, so a shallow copy is all it
+            # takes for runs from one snapshot not to see each other
+            self.GLOBAL_SCOPE = dict(snapshot.scope)
+            self._resume = list(reversed(snapshot.position))
+
+    def snapshot(self):
+        return Snapshot(dict(self.GLOBAL_SCOPE), self.position)
+
+    def visit_Compound(self, node):
+        children = node.children
+        start = 0
+        if self._resume:
+            # entering the Compounds along a resumed position, outermost first
+            start = self._resume.pop()
+            if start > len(children) or self._resume and (
+                    start == len(children) or type(children[start]).__name__ != 'Compound'):
+                raise Exception('Snapshot position does not fit this program')
+        position = self.position
+        depth = len(position)
+        position.append(start)
+        for index in range(start, len(children)):
+            position[depth] = index
+            if position == self.stop_at:
+                raise _Stop(self.snapshot())
+            self.visit(children[index])
+        position[depth] = len(children)
+        if position == self.stop_at:
+            raise _Stop(self.snapshot())
+        position.pop()
+
+
+def checkpoint(tree, position):
+    '''
+    Runs tree from the top up to position (a tuple as in Snapshot, or an
+    int k for (k,)) and returns the Snapshot there.
+    '''
+    if isinstance(position, int):
+        position = (position,)
+    interpreter = SnapshotInterpreter(None, stop_at=position)
+    try:
+        interpreter.visit(tree)
+    except _Stop as stop:
+        return stop.snapshot
+    raise Exception(f'The program ended without reaching position {tuple(position)}')
+
+
+def resume(tree, snapshot):
+    '''
+    Runs tree from the position of snapshot, starting from its variables,
+    and returns the global scope. The snapshot is not changed, so any
+    number of runs can start from it.
+    '''
+    interpreter = SnapshotInterpreter(None, snapshot)
+    interpreter.visit(tree)
+    return interpreter.GLOBAL_SCOPE
+
+
+def _run_continuation(tree, snapshot):
+    start = time.perf_counter()
+    try:
+        scope = resume(tree, snapshot)
+    except Exception as e:
+        return {
+            'ok': False,
+            'error': type(e).__name__,
+            'message': str(e),
+            'seconds': time.perf_counter() - start,
+        }
+    return {'ok': True, 'scope': scope, 'seconds': time.perf_counter() - start}
+
+
+def run_continuations(snapshot, trees):
+    '''
+    Resumes snapshot on each of trees in turn, typically programs that
+    share the statements before its position and differ after it, and
+    yields one result dict per tree as run_chunk() does: ok, seconds, and
+    either scope or the error and its message.
+    '''
+    for tree in trees:
+        yield _run_continuation(tree, snapshot)
+
+
+def _spawn(trees, snapshot):
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            os.close(read_fd)
+            with os.fdopen(write_fd, 'wb') as f:
+                for tree in trees:
+                    pickle.dump(_run_continuation(tree, snapshot), f)
+                    f.flush()
+            status = 0
+        finally:
+            # never return into the parent's code, nor flush its buffers
+            os._exit(status)
+    os.close(write_fd)
+    return pid, os.fdopen(read_fd, 'rb')
+
+
+def run_forked(snapshot, trees, workers=None):
+    '''
+    Like run_continuations(), across workers child processes forked from
+    this one, each resuming its share of trees. Children get the snapshot
+    and the parsed trees copy-on-write from the parent, so nothing is
+    sent to them; only the results come back, in the order of trees.
+    '''
+    if not hasattr(os, 'fork'):
+        raise Exception('os.fork is not available on this platform, use run_continuations()')
+    trees = list(trees)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(trees)))
+    children = []
+    # keep the collector in the children off the objects they share with
+    # the parent, or it would copy every page it touches
+    gc.freeze()
+    try:
+        for worker in range(workers):
+            children.append(_spawn(trees[worker::workers], snapshot))
+    finally:
+        gc.unfreeze()
+    try:
+        for index in range(len(trees)):
+            pid, f = children[index % workers]
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                raise Exception(f'Continuation worker {pid} exited without a result')
+    finally:
+        # also when the consumer stopped early: do not leave zombies behind
+        for pid, f in children:
+            f.close()
+            os.waitpid(pid, 0)
+
+
+def diff(before, after):
+    '''
+    Returns {name: (value in before, value in after)} for every variable
+    that differs between two snapshots, with None for a variable that is
+    not set. An INTEGER and a REAL of equal value differ.
+    '''
+    changes = {}
+    for name, value in before.scope.items():
+        other = after.scope.get(name)
+        if other is None or type(other) is not type(value) or other != value:
+            changes[name] = (value, other)
+    for name, value in after.scope.items():
+        if name not in before.scope:
+            changes[name] = (None, value)
+    return changes
+
+
+def _pack_string(out, string):
+    data = string.encode('utf-8')
+    out += struct.pack('<I', len(data))
+    out += data
+
+
+def dumps(snapshot):
+    out = bytearray(HEADER.pack(MAGIC, VERSION, len(snapshot.position), len(snapshot.scope)))
+    out += struct.pack(f'<{len(snapshot.position)}I', *snapshot.position)
+    for name, value in snapshot.scope.items():
+        _pack_string(out, name)
+        if isinstance(value, int):
+            if -2 ** 63 <= value < 2 ** 63:
+                out.append(TAG_INT)
+                out += struct.pack('<q', value)
+            else:
+                out.append(TAG_BIGINT)
+                _pack_string(out, str(value))
+        elif isinstance(value, float):
+            out.append(TAG_FLOAT)
+            out += struct.pack('<d', value)
+        else:
+            raise TypeError(f'Cannot store {name} = {value!r} in a snapshot')
+    return bytes(out)
+
+
+def dump(snapshot, path):
+    with open(path, 'wb') as f:
+        f.write(dumps(snapshot))
+
+
+def loads(data):
+    data = memoryview(data)
+    if len(data) < HEADER.size:
+        raise Exception('Truncated snapshot')
+    magic, version, depth, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise Exception('Not a snapshot')
+    if version != VERSION:
+        raise Exception(f'Unsupported snapshot version {version}')
+    pos = HEADER.size
+    position = struct.unpack_from(f'<{depth}I', data, pos)
+    pos += 4 * depth
+
+    def string():
+        nonlocal pos
+        (length,) = struct.unpack_from('<I', data, pos)
+        pos += 4 + length
+        if pos > len(data):
+            raise Exception('Truncated snapshot')
+        return bytes(data[pos - length:pos]).decode('utf-8')
+
+    scope = {}
+    try:
+        for _ in range(count):
+            name = string()
+            tag = data[pos]
+            pos += 1
+            if tag == TAG_INT:
+                (scope[name],) = struct.unpack_from('<q', data, pos)
+                pos += 8
+            elif tag == TAG_BIGINT:
+                scope[name] = int(string())
+            elif tag == TAG_FLOAT:
+                (scope[name],) = struct.unpack_from('<d', data, pos)
+                pos += 8
+            else:
+                raise Exception(f'Invalid value tag {tag} in snapshot')
+    except (struct.error, IndexError):
+        raise Exception('Truncated snapshot')
+    return Snapshot(scope, position)
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
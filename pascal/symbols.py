@@ -6,6 +6,7 @@ class Symbol:
     def __init__(self, name, type=None):
         self.name = name
         self.type = type
+        self.scope = None
 
 class BuiltinTypeSymbol(Symbol):
     '''
@@ -19,35 +20,65 @@ class BuiltinTypeSymbol(Symbol):
         return self.name
 
 class VarSymbol(Symbol):
-    def __init__(self, name, type):
+    def __init__(self, name, type, slot=None):
         super().__init__(name, type)
+        self.slot = slot
 
     def __repr__(self):
         return f'{self.name}:{self.type}'
 
+class ProcedureSymbol(Symbol):
+    '''
+    A procedure, with its formal parameters (VarSymbols, in order), the
+    declaration node holding its body and the symbol table of that body.
+    '''
+    def __init__(self, name, params=None, decl=None):
+        super().__init__(name)
+        self.params = params if params is not None else []
+        self.decl = decl
+        self.symtab = None
+
+    def __repr__(self):
+        return f'{self.name}({", ".join(map(repr, self.params))})'
+
 class SymbolTable(object):
     '''
-    Tracks symbols in source code.
+    Tracks symbols in source code. Each program and procedure body gets
+    its own table, linked to the table of the scope it is nested in;
+    scope_level counts the nesting, with the program at 0. Builtin types
+    live in the outermost table.
     '''
-    def __init__(self):
+    def __init__(self, scope_name='global', scope_level=0, enclosing_scope=None):
         self._symbols = {}
-        self._init_builtins()
+        self.scope_name = scope_name
+        self.scope_level = scope_level
+        self.enclosing_scope = enclosing_scope
+        if enclosing_scope is None:
+            self._init_builtins()
 
     def _init_builtins(self):
         self.define(BuiltinTypeSymbol('INTEGER'))
         self.define(BuiltinTypeSymbol('REAL'))
 
     def __repr__(self):
-        return f'Symbols: {[v for v in self._symbols.value()]}'
+        return f'Symbols: {[v for v in self._symbols.values()]}'
 
     def define(self, symbol):
         '''
         Defines a symbol into the table.
         '''
+        symbol.scope = self
         self._symbols[symbol.name] = symbol
 
-    def lookup(self, name):
+    def lookup(self, name, current_scope_only=False):
         '''
-        Looks up a name and returns the corresponding symbol
+        Looks up a name and returns the corresponding symbol, searching
+        the enclosing scopes outwards unless current_scope_only is set.
         '''
-        return self._symbols.get(name)
+        scope = self
+        while scope is not None:
+            symbol = scope._symbols.get(name)
+            if symbol is not None or current_scope_only:
+                return symbol
+            scope = scope.enclosing_scope
+        return None
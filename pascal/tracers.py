@@ -0,0 +1,119 @@
+import bisect
+from itertools import cycle
+
+from pascal.interpreters import Interpreter
+
+'''
+Assignments a TraceRecorder keeps by default. Each costs two list slots
+(16 bytes on 64-bit builds) plus the value it keeps alive.
+'''
+DEFAULT_CAPACITY = 4096
+
+'''
+Assignments listed in the note added to an exception by TracingInterpreter.
+'''
+DEFAULT_DUMP = 20
+
+
+class TraceRecorder:
+    '''
+    A fixed-size ring buffer of the last capacity assignments a
+    TracingInterpreter ran, as the Assign node (the statement) and the
+    value it stored. Everything is allocated up front: recording an
+    assignment overwrites two list slots and takes the next slot number
+    from a cycle over ints that already exist, so memory never grows
+    however long the program runs.
+
+    Given the text and positions of a PositionParser, statements are
+    reported by line and column.
+    '''
+    def __init__(self, capacity=DEFAULT_CAPACITY, text=None, positions=None):
+        if capacity < 1:
+            raise ValueError('A trace needs room for at least one assignment')
+        self.capacity = capacity
+        self.text = text
+        self.positions = positions or {}
+        self.line_starts = []
+        if text is not None:
+            self.line_starts = [0] + [i + 1 for i, char in enumerate(text) if char == '\n']
+        self.statements = [None] * capacity
+        self.values = [None] * capacity
+        self.slots = cycle(list(range(capacity)))
+        self.last = capacity - 1
+
+    def clear(self):
+        '''
+        Forgets every recorded assignment. The buffers are emptied in place,
+        so interpreters recording into them carry on into the same ones.
+        '''
+        self.statements[:] = [None] * self.capacity
+        self.values[:] = [None] * self.capacity
+
+    def events(self, limit=None):
+        '''
+        Returns the recorded assignments, oldest first, as (statement,
+        variable name, value); with limit, only the last limit of them.
+        '''
+        order = list(range(self.last + 1, self.capacity)) + list(range(self.last + 1))
+        events = [(self.statements[i], self.statements[i].left.value, self.values[i])
+                  for i in order if self.statements[i] is not None]
+        return events if limit is None else events[max(0, len(events) - limit):]
+
+    def location(self, node):
+        '''
+        Returns (line, column) of node, both counted from 1, or None if
+        its position is unknown.
+        '''
+        offset = self.positions.get(node)
+        if offset is None or not self.line_starts:
+            return None
+        line = bisect.bisect_right(self.line_starts, offset)
+        return line, offset - self.line_starts[line - 1] + 1
+
+    def report(self, limit=DEFAULT_DUMP):
+        '''
+        Returns the last limit assignments as text, one per line, oldest
+        first.
+        '''
+        events = self.events(limit)
+        lines = [f'Last {len(events)} assignments, oldest first',
+                 f'{"line:col":>10} {"variable":>12}  value']
+        for statement, name, value in events:
+            location = self.location(statement)
+            where = f'{location[0]}:{location[1]}' if location else '?'
+            lines.append(f'{where:>10} {name:>12}  {value!r}')
+        return '\n'.join(lines)
+
+
+class TracingInterpreter(Interpreter):
+    '''
+    Interpreter that records every assignment it runs in a TraceRecorder.
+    When the program raises, the last dump assignments are added to the
+    exception as a note, so they are printed with its traceback.
+
+    Recording lives in this subclass only: a plain Interpreter does not
+    check whether it is tracing, so tracing costs nothing when it is off.
+    '''
+    def __init__(self, parser, recorder=None, dump=DEFAULT_DUMP):
+        super().__init__(parser)
+        self.recorder = TraceRecorder() if recorder is None else recorder
+        self.dump = dump
+        self._next_slot = self.recorder.slots.__next__
+        self._statements = self.recorder.statements
+        self._values = self.recorder.values
+
+    def visit_Program(self, node):
+        try:
+            super().visit_Program(node)
+        except Exception as e:
+            if hasattr(e, 'add_note'):
+                e.add_note(self.recorder.report(self.dump))
+            raise
+
+    def visit_Assign(self, node):
+        value = self.GLOBAL_SCOPE[node.left.value] = self.visit(node.right)
+        # written out here, on buffers bound in __init__, rather than in
+        # a recorder method: this runs for every assignment
+        slot = self.recorder.last = self._next_slot()
+        self._statements[slot] = node
+        self._values[slot] = value
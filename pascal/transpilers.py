@@ -0,0 +1,270 @@
+import hashlib
+import importlib.util
+import marshal
+import math
+import os
+
+from pascal.constants import *
+from pascal.interpreters import NodeVisitor
+from pascal.lexers import Lexer
+from pascal.optimizers import VERSION as OPTIMIZER_VERSION
+from pascal.parsers import Parser
+
+'''
+Directory, next to the source file, where compiled programs are kept.
+Works like __pycache__.
+'''
+CACHE_DIR = '__pascache__'
+
+'''
+Header of every cache file: our own format tag followed by the magic
+number of the running Python, since marshal output is version specific.
+'''
+CACHE_MAGIC = b'PASC\x01' + importlib.util.MAGIC_NUMBER
+
+'''
+Version of the Python code the transpiler writes. Cache entries are keyed
+on it, along with the optimizer's VERSION for optimized builds: bump it
+whenever PythonTranspiler output changes, or stale builds keep running.
+'''
+TRANSPILER_VERSION = 2
+
+BINARY_OPERATORS = {
+    PLUS: '+',
+    MINUS: '-',
+    MUL: '*',
+    INTEGER_DIV: '//',
+    FLOAT_DIV: '/',
+}
+
+UNARY_OPERATORS = {
+    PLUS: '+',
+    MINUS: '-',
+}
+
+'''
+How tightly each operator binds in Python, which matches Pascal for the
+operators above. Operands are only parenthesized where this asks for it:
+Python refuses more than 200 nested parentheses, which a long sum would
+otherwise reach.
+'''
+BINARY_PRECEDENCE = {
+    PLUS: 1,
+    MINUS: 1,
+    MUL: 2,
+    INTEGER_DIV: 2,
+    FLOAT_DIV: 2,
+}
+UNARY_PRECEDENCE = 3
+ATOM_PRECEDENCE = 4
+
+
+def _undefined(name):
+    '''
+    Emitted in place of a variable that is read before it is assigned,
+    raising the same error as Interpreter.visit_Var.
+    '''
+    raise NameError(repr(name))
+
+
+class PythonTranspiler(NodeVisitor):
+    '''
+    Turns a Pascal AST into the source of a Python function that
+    runs the program and returns its global scope. Pascal variables
+    become Python locals, prefixed so that they cannot clash with
+    Python keywords or builtins.
+    '''
+    def __init__(self, parser):
+        self.parser = parser
+        self.lines = []
+        self.assigned = {}
+
+    def transpile(self):
+        tree = self.parser.parse()
+        return self.transpile_tree(tree)
+
+    def transpile_tree(self, tree):
+        self.lines.append('def program():')
+        self.visit(tree)
+        scope = ', '.join(f'{name!r}: {self.local(name)}' for name in self.assigned)
+        self.lines.append(f'    return {{{scope}}}')
+        return '\n'.join(self.lines) + '\n'
+
+    def local(self, name):
+        return 'v_' + name
+
+    def visit_Program(self, node):
+        self.visit(node.block)
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            self.visit(declaration)
+        self.visit(node.compound_statement)
+
+    def visit_ProcedureDecl(self, node):
+        pass
+
+    def visit_ProcedureCall(self, node):
+        raise Exception('Procedure calls are not supported by the Python backend, '
+                        'use SlotInterpreter (--engine=slots)')
+
+    def visit_VarDecl(self, node):
+        pass
+
+    def visit_Type(self, node):
+        pass
+
+    def visit_Compound(self, node):
+        for child in node.children:
+            self.visit(child)
+
+    def visit_NoOp(self, node):
+        pass
+
+    def visit_Assign(self, node):
+        # the right hand side is generated first: it may not see the
+        # variable being assigned as defined yet
+        value = self.visit(node.right)
+        var_name = node.left.value
+        self.assigned[var_name] = True
+        self.lines.append(f'    {self.local(var_name)} = {value}')
+
+    def visit_Var(self, node):
+        # programs are straight-line code, so whether a variable has
+        # been assigned at this point is known statically
+        if node.value in self.assigned:
+            return self.local(node.value)
+        return f'_undefined({node.value!r})'
+
+    def precedence(self, node):
+        kind = type(node).__name__
+        if kind == 'BinOp':
+            return BINARY_PRECEDENCE[node.op.type]
+        if kind == 'UnaryOp':
+            return UNARY_PRECEDENCE
+        return ATOM_PRECEDENCE
+
+    def operand(self, node, precedence):
+        source = self.visit(node)
+        if self.precedence(node) < precedence:
+            return f'({source})'
+        return source
+
+    def visit_BinOp(self, node):
+        precedence = BINARY_PRECEDENCE[node.op.type]
+        # all operators are left-associative, so an operand on the right
+        # that binds no tighter keeps its parentheses
+        left = self.operand(node.left, precedence)
+        right = self.operand(node.right, precedence + 1)
+        return f'{left} {BINARY_OPERATORS[node.op.type]} {right}'
+
+    def visit_UnaryOp(self, node):
+        return f'{UNARY_OPERATORS[node.op.type]}{self.operand(node.expr, UNARY_PRECEDENCE)}'
+
+    def visit_Num(self, node):
+        if isinstance(node.value, float) and not math.isfinite(node.value):
+            # a REAL literal too big for a double, or one the optimizer
+            # folded, has no literal in Python: repr() gives inf or nan
+            return f'float({repr(node.value)!r})'
+        return repr(node.value)
+
+
+def compile_source(text, filename='<pascal>', optimizer=None, parser_class=Parser):
+    '''
+    Runs the whole front end over Pascal source text and returns
+    a Python code object.
+    '''
+    return compile_tree(parser_class(Lexer(text)).parse(), filename, optimizer)
+
+
+def compile_tree(tree, filename='<pascal>', optimizer=None):
+    '''
+    Returns a Python code object for an already parsed program,
+    optimized first if an Optimizer is given.
+    '''
+    if optimizer is not None:
+        tree = optimizer.optimize(tree)
+    source = PythonTranspiler(None).transpile_tree(tree)
+    return compile(source, filename, 'exec')
+
+
+def cache_path(path, text, optimized=False):
+    '''
+    Returns the cache file for a source file with the given contents.
+    Optimized and unoptimized builds are cached side by side, and a new
+    transpiler or optimizer version gives new file names.
+    '''
+    directory, basename = os.path.split(os.path.abspath(path))
+    stem = os.path.splitext(basename)[0]
+    versions = f'{TRANSPILER_VERSION}.{OPTIMIZER_VERSION if optimized else 0}\n'
+    digest = hashlib.sha256((versions + text).encode('utf-8')).hexdigest()[:16]
+    suffix = '.opt.pasc' if optimized else '.pasc'
+    return os.path.join(directory, CACHE_DIR, f'{stem}.{digest}{suffix}')
+
+
+def load_cached(cache_file):
+    '''
+    Returns the code object stored in cache_file, or None if it is
+    missing or was written by a different version.
+    '''
+    try:
+        with open(cache_file, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(CACHE_MAGIC):
+        return None
+    try:
+        return marshal.loads(data[len(CACHE_MAGIC):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def store_cached(cache_file, code):
+    '''
+    Writes code to cache_file. The file is renamed into place so that
+    concurrent runs never see a partial write. Failing to write the
+    cache is not an error.
+    '''
+    tmp_file = f'{cache_file}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, 'wb') as f:
+            f.write(CACHE_MAGIC + marshal.dumps(code))
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        try:
+            os.remove(tmp_file)
+        except OSError:
+            pass
+
+
+def load_program(path, use_cache=True, optimizer=None, parser_class=Parser):
+    '''
+    Returns the compiled code object for the Pascal file at path. When the
+    cache holds an entry for the file's current contents, the lexer, parser
+    and transpiler are skipped entirely (and so is the optimizer, whose
+    stats then stay empty). Both parsers build the same tree, so which
+    one wrote an entry does not matter.
+    '''
+    with open(path, 'r') as f:
+        text = f.read()
+    if not use_cache:
+        return compile_source(text, path, optimizer, parser_class)
+
+    cache_file = cache_path(path, text, optimized=optimizer is not None)
+    code = load_cached(cache_file)
+    if code is None:
+        code = compile_source(text, path, optimizer, parser_class)
+        store_cached(cache_file, code)
+    return code
+
+
+def run_code(code):
+    '''
+    Executes a code object produced by compile_source and returns the
+    program's global scope.
+    '''
+    namespace = {'_undefined': _undefined}
+    exec(code, namespace)
+    return namespace['program']()
@@ -0,0 +1,129 @@
+import operator
+
+from pascal.constants import *
+from pascal.interpreters import SpecializingInterpreter, SymbolTableBuilder
+
+'''
+The implementation each binary operator runs, by operator and the static
+type of its result: int add, float add, ..., int floor division and true
+division. DIV has no REAL entry because it only takes INTEGER operands.
+'''
+TYPED_OPERATIONS = {
+    (PLUS, INTEGER): operator.add,
+    (PLUS, REAL): operator.add,
+    (MINUS, INTEGER): operator.sub,
+    (MINUS, REAL): operator.sub,
+    (MUL, INTEGER): operator.mul,
+    (MUL, REAL): operator.mul,
+    (INTEGER_DIV, INTEGER): operator.floordiv,
+    (FLOAT_DIV, REAL): operator.truediv,
+}
+
+UNARY_OPERATIONS = {
+    PLUS: operator.pos,
+    MINUS: operator.neg,
+}
+
+
+class TypeChecker(SymbolTableBuilder):
+    '''
+    Builds the symbol tables and works out the static type, INTEGER or
+    REAL, of every expression, following Pascal:
+
+        +, -, *   INTEGER if both operands are, REAL otherwise
+        DIV       INTEGER operands only, INTEGER result
+        /         REAL
+        constant  INTEGER or REAL as written
+
+    An INTEGER may go wherever a REAL is expected, not the other way
+    round: assigning or passing a REAL to an INTEGER is a TypeError, as
+    is DIV with a REAL operand. All of it is found before the program
+    runs.
+
+    Expression nodes get static_type written onto them, and BinOp and
+    UnaryOp nodes the operation their types select, so executing them
+    needs no decision at all (see TypedInterpreter). Each visit_ method
+    builds on the one it overrides, so the checker can be combined with
+    other SymbolTableBuilders into a single walk (see SemanticAnalyzer).
+    '''
+    def check(self, tree):
+        self.visit(tree)
+        return tree
+
+    def visit_Assign(self, node):
+        var_symbol = super().visit_Assign(node)
+        node.left.static_type = var_symbol.type.name
+        if node.left.static_type == INTEGER and node.right.static_type == REAL:
+            raise TypeError(f'Cannot assign a REAL value to {var_symbol.name} : INTEGER')
+        return var_symbol
+
+    def visit_ProcedureCall(self, node):
+        proc_symbol = super().visit_ProcedureCall(node)
+        for param, param_symbol in zip(node.actual_params, proc_symbol.params):
+            if param.static_type == REAL and param_symbol.type.name == INTEGER:
+                raise TypeError(f'Cannot pass a REAL value as {param_symbol.name} : INTEGER '
+                                f'to {node.proc_name}')
+        return proc_symbol
+
+    def visit_Var(self, node):
+        var_symbol = super().visit_Var(node)
+        node.static_type = var_symbol.type.name
+        return var_symbol
+
+    def visit_Num(self, node):
+        node.static_type = INTEGER if node.token.type == INTEGER_CONST else REAL
+
+    def visit_UnaryOp(self, node):
+        super().visit_UnaryOp(node)
+        node.static_type = node.expr.static_type
+        node.operation = UNARY_OPERATIONS[node.op.type]
+
+    def visit_BinOp(self, node):
+        super().visit_BinOp(node)
+        left = node.left.static_type
+        right = node.right.static_type
+        op = node.op.type
+        if op == FLOAT_DIV:
+            static_type = REAL
+        elif op == INTEGER_DIV:
+            if left == REAL or right == REAL:
+                raise TypeError(f'DIV takes INTEGER operands, not {left} DIV {right}')
+            static_type = INTEGER
+        else:
+            static_type = INTEGER if left == right == INTEGER else REAL
+        node.static_type = static_type
+        node.operation = TYPED_OPERATIONS[op, static_type]
+
+
+class TypedInterpreter(SpecializingInterpreter):
+    '''
+    SpecializingInterpreter that type-checks the whole program before
+    running any of it, so type errors never surface halfway through a
+    run. Operators then run the implementation the TypeChecker picked
+    for them, with none of the operator dispatch of Interpreter and none
+    of the type guards of specialized nodes.
+
+    Values are the same as Interpreter's: an INTEGER assigned to a REAL
+    variable is not converted.
+
+    Checking annotates the tree, so a tree that is run many times only
+    needs it once: pass the TypeChecker that checked it and visit_Program
+    skips straight to execution.
+    '''
+    def __init__(self, parser, checker=None):
+        super().__init__(parser)
+        self.checker = checker
+
+    def visit_Program(self, node):
+        if self.checker is None:
+            self.checker = TypeChecker()
+            self.checker.check(node)
+        super().visit_Program(node)
+
+    # only reached by nodes that do not execute themselves, like arena views
+
+    def visit_BinOp(self, node):
+        return node.operation(self.visit(node.left), self.visit(node.right))
+
+    def visit_UnaryOp(self, node):
+        return node.operation(self.visit(node.expr))
@@ -0,0 +1,186 @@
+import operator
+
+import numpy as np
+
+from pascal.constants import *
+from pascal.interpreters import Interpreter
+from pascal.lexers import Lexer
+from pascal.parsers import Parser
+
+'''
+Column type of a bound variable, by declared type.
+'''
+DTYPES = {INTEGER: np.int64, REAL: np.float64}
+
+OPERATIONS = {
+    PLUS: operator.add,
+    MINUS: operator.sub,
+    MUL: operator.mul,
+    INTEGER_DIV: operator.floordiv,
+    FLOAT_DIV: operator.truediv,
+}
+
+INT64_MIN = np.iinfo(np.int64).min
+
+
+def _is_constant(node):
+    kind = type(node).__name__
+    if kind == 'Num':
+        return True
+    if kind == 'UnaryOp':
+        return _is_constant(node.expr)
+    if kind == 'BinOp':
+        return _is_constant(node.left) and _is_constant(node.right)
+    return False
+
+
+def _is_int64(value):
+    return isinstance(value, np.ndarray) and value.dtype == np.int64
+
+
+def _is_integer(value):
+    return _is_int64(value) or isinstance(value, (int, np.integer))
+
+
+def _objects(value):
+    return value.astype(object) if isinstance(value, np.ndarray) else int(value)
+
+
+def _overflows(op, left, right):
+    '''
+    Tells whether op on two integers, at least one of them an int64
+    column, could leave the 64-bit range. May say yes too often, never
+    too rarely: a false alarm only costs the slower exact path.
+    '''
+    try:
+        a = np.asarray(left, dtype=np.int64)
+        b = np.asarray(right, dtype=np.int64)
+    except OverflowError:
+        # a Python int constant that does not fit in 64 bits
+        return True
+    with np.errstate(over='ignore'):
+        if op == PLUS:
+            result = a + b
+            return bool(np.any((a ^ result) & (b ^ result) < 0))
+        if op == MINUS:
+            result = a - b
+            return bool(np.any((a ^ b) & (a ^ result) < 0))
+        if op == MUL:
+            return bool(np.any(np.abs(a.astype(np.float64) * b) >= 2.0 ** 62))
+    return bool(np.any((a == INT64_MIN) & (b == -1)))
+
+
+class VectorInterpreter(Interpreter):
+    '''
+    Runs a program once for many inputs at the same time. bindings maps
+    variable names to equally long sequences of values, one per input.
+    Bound variables hold NumPy arrays, so every statement and operator
+    runs once, as an array operation over all inputs.
+
+    Values follow the Interpreter: INTEGER arithmetic stays integer, DIV
+    floors and / always gives a REAL. Bound columns are converted to the
+    type their variable is declared with, so binding floats to an INTEGER
+    variable is an error. Integer columns are 64 bits wide; an operation
+    whose result might not fit runs on columns of Python ints instead
+    (object dtype), slower but as exact as Interpreter integers.
+
+    Bound variables are the program's parameters: the first assignment
+    of a constant to one of them, as in number := 2, only sets a default
+    and is skipped, as long as the variable has not been read or
+    assigned before it. Every other statement runs as written.
+    '''
+    def __init__(self, bindings, parser=None):
+        super().__init__(parser)
+        self.bindings = {}
+        self.rows = None
+        for name, values in bindings.items():
+            column = np.asarray(values)
+            if column.ndim != 1:
+                raise ValueError(f'Values bound to {name} must be one-dimensional')
+            if self.rows is None:
+                self.rows = len(column)
+            elif len(column) != self.rows:
+                raise ValueError(f'{name} is bound to {len(column)} values, expected {self.rows}')
+            self.bindings[name] = column
+        # bound variables whose default assignment may still come
+        self.defaults = set(self.bindings)
+        if self.rows is None:
+            self.rows = 1
+
+    def visit_Block(self, node):
+        for declaration in node.declarations:
+            self.visit(declaration)
+        unknown = self.bindings.keys() - self.GLOBAL_SCOPE.keys()
+        if unknown:
+            raise NameError(f'Bound variables not declared: {", ".join(sorted(unknown))}')
+        self.visit(node.compound_statement)
+
+    def visit_VarDecl(self, node):
+        name = node.var_node.value
+        if name not in self.bindings:
+            return
+        column = self.bindings[name]
+        dtype = DTYPES[node.type_node.value]
+        if not np.can_cast(column.dtype, dtype, casting='same_kind'):
+            raise TypeError(f'Cannot bind {column.dtype} values to {name} : {node.type_node.value}')
+        self.GLOBAL_SCOPE[name] = column.astype(dtype, copy=False)
+
+    def visit_Assign(self, node):
+        name = node.left.value
+        if name in self.defaults:
+            self.defaults.discard(name)
+            if _is_constant(node.right):
+                return
+        super().visit_Assign(node)
+
+    def visit_Var(self, node):
+        self.defaults.discard(node.value)
+        return super().visit_Var(node)
+
+    def visit_BinOp(self, node):
+        op = node.op.type
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+        if op == INTEGER_DIV or op == FLOAT_DIV:
+            # NumPy only warns, Python raises
+            if isinstance(right, np.ndarray):
+                zeros = np.flatnonzero(right == 0)
+                if len(zeros):
+                    raise ZeroDivisionError(f'division by zero for input {zeros[0]}')
+            elif right == 0:
+                raise ZeroDivisionError('division by zero')
+        if (op != FLOAT_DIV and (_is_int64(left) or _is_int64(right))
+                and _is_integer(left) and _is_integer(right) and _overflows(op, left, right)):
+            left, right = _objects(left), _objects(right)
+        return OPERATIONS[op](left, right)
+
+    def visit_UnaryOp(self, node):
+        value = self.visit(node.expr)
+        if _is_int64(value) and np.any(value == INT64_MIN):
+            value = _objects(value)
+        if node.op.type == MINUS:
+            return -value
+        return +value
+
+    def columns(self):
+        '''
+        Returns each variable's values, one per input, as arrays.
+        Variables that do not depend on any input are repeated.
+        '''
+        return {
+            name: value if isinstance(value, np.ndarray) else np.full(self.rows, value)
+            for name, value in self.GLOBAL_SCOPE.items()
+        }
+
+
+def evaluate(program, bindings):
+    '''
+    Runs program (source text or a parsed tree) for every set of inputs
+    in bindings and returns one column of results per variable.
+
+        evaluate(text, {'number': np.arange(100000)})['b']
+    '''
+    tree = Parser(Lexer(program)).parse() if isinstance(program, str) else program
+    interpreter = VectorInterpreter(bindings)
+    interpreter.visit(tree)
+    return interpreter.columns()
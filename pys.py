@@ -1,50 +1,288 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
 from pascal.constants import *
 from pascal.lexers import Lexer
-from pascal.parsers import Parser
-from pascal.interpreters import Interpreter
-from visualizer.visualizer import ASTVisualizer
-from visualizer.viztools import VizParser, VizLexer
+from pascal.arenas import ArenaParser
+from pascal.serializers import dump, is_serialized, load, loads
+from pascal.optimizers import Optimizer
+from pascal.sessions import Session
+from visualizer.exporters import FORMATS as EXPORT_FORMATS, export
+from pascal.runners import (
+    DEFAULT_CHUNKSIZE, ENGINES, PARSERS, STREAMED_ENGINES, execute, find_programs, parse,
+    profile, run, run_batch, run_file, run_stream, trace,
+)
+
+
+def parse_args(argv=None):
+    argparser = argparse.ArgumentParser(description='pyscal: a tiny Pascal interpreter')
+    argparser.add_argument('file', nargs='*',
+                           help='Pascal source file, or serialized AST, to run; with --batch, '
+                                'any number of files and directories; with none, start an '
+                                'interactive session')
+    argparser.add_argument('--visualize', action='store_true',
+                           help='draw the AST of a calculator expression instead of running it')
+    argparser.add_argument('--engine', choices=ENGINES, default='tree',
+                           help='execution engine: AST tree-walker, self-specializing '
+                                'tree-walker, statically typed tree-walker (type errors are '
+                                'reported before running), tree-walker over resolved variable '
+                                'slots, bytecode VM or Python code objects')
+    argparser.add_argument('--parser', choices=PARSERS, default='recursive',
+                           help='hand-written recursive-descent parser, or the LL(1) table '
+                                'parser generated from grammars/grammar.lark, which takes any '
+                                'nesting depth but is slower')
+    argparser.add_argument('--no-cache', action='store_true',
+                           help='with --engine=python, do not read or write __pascache__')
+    argparser.add_argument('--emit-ast', metavar='OUT',
+                           help='parse the program and write its binary AST to OUT instead of running it '
+                                '(a serialized AST is written out as stored)')
+    argparser.add_argument('--draw-ast', metavar='OUT',
+                           help='write the AST of the program as Graphviz DOT (.dot, .gv), '
+                                'SVG (.svg) or a table of node positions (.tsv) to OUT '
+                                'instead of running it')
+    argparser.add_argument('--optimize', action='store_true',
+                           help='fold constants and simplify expressions before running '
+                                '(or before writing --emit-ast); serialized ASTs run as stored')
+    argparser.add_argument('--optimizer-stats', action='store_true',
+                           help='with --optimize, print what each pass did to stderr')
+    argparser.add_argument('--profile', action='store_true',
+                           help='print time and hit counts per statement and node type to stderr '
+                                '(tree and slots engines)')
+    argparser.add_argument('--profile-out', metavar='FILE',
+                           help='profile, writing collapsed stacks for flamegraph tools to FILE')
+    argparser.add_argument('--trace', type=int, metavar='N',
+                           help='record the last N assignments and print them with the '
+                                'traceback if the program fails (tree engine)')
+    argparser.add_argument('--stream', action='store_true',
+                           help='run the main block one statement at a time, reading the file '
+                                'through mmap, so memory stays bounded however large it is '
+                                f'({" and ".join(STREAMED_ENGINES)} engines)')
+    batch = argparser.add_argument_group('batch mode')
+    batch.add_argument('--batch', action='store_true',
+                       help='run every program given, printing one JSON line per program '
+                            'as it finishes')
+    batch.add_argument('--manifest', metavar='FILE',
+                       help='with --batch, also run the programs listed in FILE, one path per line')
+    batch.add_argument('--workers', type=int, default=None,
+                       help='with --batch, number of worker processes (default: one per CPU)')
+    batch.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                       help='with --batch, programs sent to a worker at a time '
+                            f'(default: {DEFAULT_CHUNKSIZE})')
+    args = argparser.parse_args(argv)
+    if args.batch:
+        if not args.file and not args.manifest:
+            argparser.error('--batch needs files, directories or a --manifest')
+        if args.workers is not None and args.workers < 1:
+            argparser.error('--workers must be at least 1')
+        if args.chunksize < 1:
+            argparser.error('--chunksize must be at least 1')
+    elif len(args.file) > 1:
+        argparser.error('expected exactly one file (use --batch to run several)')
+    elif not args.file:
+        needs_file = [flag for flag, value in (
+            ('--visualize', args.visualize), ('--emit-ast', args.emit_ast),
+            ('--draw-ast', args.draw_ast), ('--optimize', args.optimize),
+            ('--profile', args.profile or args.profile_out),
+            ('--stream', args.stream), ('--trace', args.trace),
+            ('--parser', args.parser != 'recursive'),
+        ) if value]
+        if needs_file:
+            argparser.error(f'{needs_file[0]} needs a file')
+        if args.engine not in ('tree', 'slots'):
+            # 'tree' is the default; its results are the same
+            argparser.error('the interactive session always runs on the slots engine')
+    if args.draw_ast and os.path.splitext(args.draw_ast)[1].lower() not in EXPORT_FORMATS:
+        argparser.error(f'--draw-ast writes one of {", ".join(EXPORT_FORMATS)} files')
+    if args.parser != 'recursive':
+        # these record source positions with PositionParser
+        conflicts = [flag for flag, value in (
+            ('--visualize', args.visualize), ('--profile', args.profile or args.profile_out),
+            ('--trace', args.trace is not None),
+        ) if value]
+        if conflicts:
+            argparser.error(f'--parser={args.parser} cannot be combined with {conflicts[0]}')
+    if args.trace is not None:
+        if args.trace < 1:
+            argparser.error('--trace must be at least 1')
+        if args.engine != 'tree':
+            argparser.error('--trace only works with the tree engine')
+        conflicts = [flag for flag, value in (
+            ('--batch', args.batch), ('--visualize', args.visualize),
+            ('--profile', args.profile or args.profile_out),
+        ) if value]
+        if conflicts:
+            argparser.error(f'--trace cannot be combined with {conflicts[0]}')
+    if args.stream:
+        if args.engine not in STREAMED_ENGINES:
+            argparser.error(f'--stream only works with the {" and ".join(STREAMED_ENGINES)} engines')
+        conflicts = [flag for flag, value in (
+            ('--batch', args.batch), ('--visualize', args.visualize), ('--emit-ast', args.emit_ast),
+            ('--draw-ast', args.draw_ast), ('--optimize', args.optimize),
+            ('--profile', args.profile or args.profile_out), ('--trace', args.trace),
+        ) if value]
+        if conflicts:
+            argparser.error(f'--stream cannot be combined with {conflicts[0]}')
+    return args
+
+
+def print_stats(args, optimizer):
+    # a cache hit skips the optimizer, leaving nothing to report
+    if args.optimizer_stats and optimizer is not None and optimizer.stats:
+        print(optimizer.report(), file=sys.stderr)
+
+
+def to_json(result):
+    '''
+    Returns a batch result as one line of strict JSON. JSON has no
+    Infinity or NaN, so REAL values that overflowed are written as the
+    strings "inf", "-inf" and "nan" instead.
+    '''
+    try:
+        return json.dumps(result, allow_nan=False)
+    except ValueError:
+        result = dict(result)
+        result['scope'] = {
+            name: str(value) if isinstance(value, float) and not math.isfinite(value) else value
+            for name, value in result['scope'].items()
+        }
+        return json.dumps(result, allow_nan=False)
+
+
+def main_batch(args):
+    start = time.perf_counter()
+    programs = failures = 0
+    results = run_batch(
+        find_programs(args.file, args.manifest), args.engine, args.workers,
+        args.chunksize, args.optimize, not args.no_cache, args.parser,
+    )
+    for result in results:
+        programs += 1
+        failures += not result['ok']
+        print(to_json(result), flush=True)
+    elapsed = time.perf_counter() - start
+    print(f'{programs} programs, {failures} failed, {elapsed:.2f}s', file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main_repl():
+    '''
+    Reads lines until quit or end of input, running each in one Session.
+    :timing [N] shows compile and run time of every line, or the last N;
+    :vars shows every variable.
+    '''
+    session = Session()
+    while True:
+        try:
+            text = input('pys> ')
+        except EOFError:
+            break
+        text = text.strip()
+        if not text:
+            continue
+        if text in ('quit', ':quit'):
+            print('pyscal says bye!')
+            break
+        if text == ':vars':
+            print(session.GLOBAL_SCOPE)
+            continue
+        if text.split()[0] == ':timing':
+            words = text.split()
+            if len(words) > 2 or len(words) == 2 and not words[1].isdigit():
+                print('Error: usage is :timing [N]')
+                continue
+            print(session.report(int(words[1]) if len(words) == 2 else None))
+            continue
+        try:
+            assigned = session.run(text)
+        except Exception as e:
+            print(f'Error: {e}')
+            continue
+        for name, value in assigned.items():
+            print(f'{name} = {value}')
 
 
 def main():
-    import sys
-    text = open(sys.argv[1], 'r').read()
-    visualize = False
-    if len(sys.argv) > 2:
-        if sys.argv[2] == '--visualize':
-            visualize = True
-
-    if visualize:
+    args = parse_args()
+
+    if args.batch:
+        sys.exit(main_batch(args))
+
+    if not args.file:
+        main_repl()
+        return
+
+    path = args.file[0]
+
+    if args.visualize:
+        from visualizer.visualizer import ASTVisualizer
+        from visualizer.viztools import VizParser, VizLexer
+        text = open(path, 'r').read()
         lexer = VizLexer(text)
         parser = VizParser(lexer)
         visualizer = ASTVisualizer(parser)
         visualizer.visualize()
-    else:
-        lexer = Lexer(text)
-        parser = Parser(lexer)
-        interpreter = Interpreter(parser)
-        result = interpreter.interpret()
-        print(interpreter.GLOBAL_SCOPE)
-
-    # while True:
-    #     try:
-    #         text = input('pys> ')
-    #     except EOFError:
-    #         break
-    #     if not text:
-    #         continue
-    #     if text == 'quit':
-    #         print('pyscal says bye!')
-    #         break
-    #     try:
-    #         lexer = Lexer(text)
-    #         parser = Parser(lexer)
-    #         interpreter = Interpreter(parser)
-    #         result = interpreter.interpret()
-    #         print(result)
-    #     except Exception as e:
-    #         print(f'Error: {e} \n Exiting pyscal...')
-    #         break
+        return
+
+    optimizer = Optimizer() if args.optimize else None
+
+    if args.emit_ast and is_serialized(path):
+        # read, not mapped, so OUT may be the input file itself
+        with open(path, 'rb') as f:
+            dump(loads(f.read()), args.emit_ast)
+        return
+
+    if args.emit_ast:
+        text = open(path, 'r').read()
+        if optimizer is None and args.parser == 'recursive':
+            dump(ArenaParser(Lexer(text)).parse(), args.emit_ast)
+        elif optimizer is None:
+            dump(parse(text, args.parser), args.emit_ast)
+        else:
+            dump(optimizer.optimize(parse(text, args.parser)), args.emit_ast)
+        print_stats(args, optimizer)
+        return
+
+    if args.draw_ast:
+        if is_serialized(path):
+            tree = load(path).tree()
+        else:
+            text = open(path, 'r').read()
+            tree = parse(text, args.parser)
+            if optimizer is not None:
+                tree = optimizer.optimize(tree)
+        export(tree, args.draw_ast)
+        print_stats(args, optimizer)
+        return
+
+    if args.profile or args.profile_out:
+        text = open(path, 'r').read()
+        scope, profiler = profile(text, args.engine, optimizer)
+        print(scope)
+        if args.profile:
+            print(profiler.report(), file=sys.stderr)
+        if args.profile_out:
+            profiler.write_collapsed(args.profile_out)
+        print_stats(args, optimizer)
+        return
+
+    if args.trace is not None:
+        if is_serialized(path):
+            sys.exit('--trace needs Pascal source: a serialized AST has no source positions')
+        text = open(path, 'r').read()
+        print(trace(text, args.trace, optimizer))
+        print_stats(args, optimizer)
+        return
+
+    if args.stream:
+        print(run_stream(path, args.engine, args.parser))
+        return
+
+    print(run_file(path, args.engine, optimizer, use_cache=not args.no_cache, parser=args.parser))
+    print_stats(args, optimizer)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,161 @@
+import os
+from html import escape
+
+from pascal.parsers import CHILD_FIELDS
+from visualizer.layouts import tidy_layout, write_positions
+
+'''
+Output formats of export(), by file suffix. tsv is the layout alone, as
+written by write_positions().
+'''
+FORMATS = {'.dot': 'dot', '.gv': 'dot', '.svg': 'svg', '.tsv': 'tsv'}
+
+'''
+SVG geometry, in pixels: the least distance between neighbouring nodes,
+between levels, and the margin around the drawing.
+'''
+X_STEP = 40
+Y_STEP = 60
+MARGIN = 30
+
+'''
+Edges written per SVG path element. One path per edge makes files that
+browsers are slow to open; one path for all of them can hit renderer limits.
+'''
+EDGES_PER_PATH = 1000
+
+SVG_STYLE = '''
+path { stroke: #888; stroke-width: 1; fill: none; }
+text { font: 12px monospace; text-anchor: middle; dominant-baseline: middle;
+       paint-order: stroke; stroke: white; stroke-width: 3px; }
+'''
+
+
+def label(node):
+    '''
+    The text shown for a node: its kind, and its name, operator or value
+    when it has one.
+    '''
+    kind = type(node).__name__
+    if kind in ('Num', 'Var', 'Type'):
+        return str(node.value)
+    if kind in ('BinOp', 'UnaryOp'):
+        return str(node.op.value)
+    if kind == 'Assign':
+        return ':='
+    if kind in ('Program', 'ProcedureDecl'):
+        return f'{kind} {node.name}'
+    if kind == 'ProcedureCall':
+        return f'{node.proc_name}()'
+    return kind
+
+
+def walk(tree):
+    '''
+    Yields (node, parent) for every node of tree in preorder, where
+    parent is the position of the parent in that order (-1 for the
+    root). A node reached twice, like the Type shared by the variables
+    of one declaration, is yielded each time, so every occurrence gets
+    a position of its own. Iterative, so depth is not limited by the
+    recursion limit.
+    '''
+    stack = [(tree, -1)]
+    index = 0
+    while stack:
+        node, parent = stack.pop()
+        yield node, parent
+        children = []
+        for field in CHILD_FIELDS.get(type(node).__name__, ()):
+            child = getattr(node, field)
+            if isinstance(child, list):
+                children.extend(child)
+            else:
+                children.append(child)
+        for child in reversed(children):
+            stack.append((child, index))
+        index += 1
+
+
+def iter_dot(tree, name='AST'):
+    '''
+    Yields the lines of a Graphviz DOT graph of tree. Nodes are named n0,
+    n1, ... in preorder, so equal labels never merge.
+    '''
+    yield f'digraph {name} {{\n'
+    yield '  node [shape=box, fontname=monospace];\n'
+    for index, (node, parent) in enumerate(walk(tree)):
+        text = label(node).replace('\\', '\\\\').replace('"', '\\"')
+        yield f'  n{index} [label="{text}"];\n'
+        if parent >= 0:
+            yield f'  n{parent} -> n{index};\n'
+    yield '}\n'
+
+
+def write_dot(tree, path):
+    with open(path, 'w') as f:
+        f.writelines(iter_dot(tree))
+
+
+def positions(tree):
+    '''
+    Lays tree out with tidy_layout(). Returns the labels, parents, x
+    positions and depths of the nodes, in preorder.
+    '''
+    labels = []
+    parents = []
+    for node, parent in walk(tree):
+        labels.append(label(node))
+        parents.append(parent)
+    xs, depths = tidy_layout(parents)
+    return labels, parents, xs, depths
+
+
+def iter_svg(tree):
+    '''
+    Yields the pieces of an SVG drawing of tree.
+    '''
+    labels, parents, xs, depths = positions(tree)
+    width = max(xs) * X_STEP + 2 * MARGIN
+    height = max(depths) * Y_STEP + 2 * MARGIN
+    coordinates = [(MARGIN + x * X_STEP, MARGIN + depth * Y_STEP) for x, depth in zip(xs, depths)]
+
+    yield (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+           f'viewBox="0 0 {width:.0f} {height:.0f}">\n')
+    yield f'<style>{SVG_STYLE}</style>\n'
+    edges = []
+    for index, parent in enumerate(parents):
+        if parent < 0:
+            continue
+        px, py = coordinates[parent]
+        x, y = coordinates[index]
+        edges.append(f'M{px:.1f} {py:.1f}L{x:.1f} {y:.1f}')
+        if len(edges) == EDGES_PER_PATH:
+            yield f'<path d="{"".join(edges)}"/>\n'
+            edges = []
+    if edges:
+        yield f'<path d="{"".join(edges)}"/>\n'
+    for text, (x, y) in zip(labels, coordinates):
+        yield f'<text x="{x:.1f}" y="{y:.1f}">{escape(text)}</text>\n'
+    yield '</svg>\n'
+
+
+def write_svg(tree, path):
+    with open(path, 'w') as f:
+        f.writelines(iter_svg(tree))
+
+
+def export(tree, path):
+    '''
+    Writes tree to path as DOT, SVG or a table of node positions, picked
+    by the suffix of path. Needs no display and no Graphviz.
+    '''
+    kind = FORMATS.get(os.path.splitext(path)[1].lower())
+    if kind is None:
+        raise Exception(f'Cannot export an AST to {path}, use one of {", ".join(FORMATS)}')
+    if kind == 'dot':
+        write_dot(tree, path)
+    elif kind == 'svg':
+        write_svg(tree, path)
+    else:
+        labels, parents, xs, depths = positions(tree)
+        write_positions(path, parents, xs, depths, labels)
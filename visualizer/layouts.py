@@ -0,0 +1,165 @@
+'''
+Tidy tree drawing: Walker's algorithm, in the linear-time form of
+Buchheim, Juenger and Leipert, without recursion.
+
+Trees are given as a parents list: node i has parent parents[i], the
+root has -1, and every parent comes before its children. Children are
+drawn left to right in the order they appear. Preorder and breadth-first
+numberings both qualify.
+'''
+
+'''
+Horizontal distance kept between neighbouring nodes on the same level.
+'''
+DISTANCE = 1.0
+
+
+def tidy_layout(parents, distance=DISTANCE):
+    '''
+    Returns (xs, depths): the x position and level of every node of the
+    tree in parents. Nodes on a level are at least distance apart, each
+    parent is centered over its children, subtrees are packed as close
+    as that allows and identical subtrees are drawn identically. The
+    leftmost node is at x = 0.
+
+    Linear in the number of nodes, and any depth works.
+    '''
+    n = len(parents)
+    if n == 0:
+        return [], []
+    if parents[0] != -1:
+        raise ValueError('Node 0 must be the root, with parent -1')
+    first = [-1] * n
+    last = [-1] * n
+    left = [-1] * n
+    right = [-1] * n
+    number = [0] * n
+    depths = [0] * n
+    for v in range(1, n):
+        p = parents[v]
+        if not 0 <= p < v:
+            raise ValueError(f'Node {v} has parent {p}: parents must come before their children')
+        depths[v] = depths[p] + 1
+        if first[p] < 0:
+            first[p] = v
+        else:
+            w = last[p]
+            right[w] = v
+            left[v] = w
+            number[v] = number[w] + 1
+        last[p] = v
+
+    prelim = [0.0] * n
+    mod = [0.0] * n
+    shift = [0.0] * n
+    change = [0.0] * n
+    thread = [-1] * n
+    ancestor = list(range(n))
+    # the default ancestor of apportion(), per parent
+    default = first[:]
+
+    # first walk, in postorder: children left to right, then the parent
+    v = 0
+    while first[v] >= 0:
+        v = first[v]
+    while True:
+        w = left[v]
+        if first[v] < 0:
+            prelim[v] = prelim[w] + distance if w >= 0 else 0.0
+        else:
+            # execute shifts
+            total_shift = total_change = 0.0
+            c = last[v]
+            while c >= 0:
+                prelim[c] += total_shift
+                mod[c] += total_shift
+                total_change += change[c]
+                total_shift += shift[c] + total_change
+                c = left[c]
+            midpoint = (prelim[first[v]] + prelim[last[v]]) / 2
+            if w >= 0:
+                prelim[v] = prelim[w] + distance
+                mod[v] = prelim[v] - midpoint
+            else:
+                prelim[v] = midpoint
+
+        p = parents[v]
+        if p < 0:
+            break
+        if w >= 0:
+            # apportion: push v's subtree right of everything to its left
+            vip = vop = v
+            vim = w
+            vom = first[p]
+            sip = mod[vip]
+            sop = mod[vop]
+            sim = mod[vim]
+            som = mod[vom]
+            while True:
+                # next right of vim, next left of vip
+                nim = last[vim] if last[vim] >= 0 else thread[vim]
+                nip = first[vip] if first[vip] >= 0 else thread[vip]
+                if nim < 0 or nip < 0:
+                    break
+                vim = nim
+                vip = nip
+                vom = first[vom] if first[vom] >= 0 else thread[vom]
+                vop = last[vop] if last[vop] >= 0 else thread[vop]
+                ancestor[vop] = v
+                gap = prelim[vim] + sim - prelim[vip] - sip + distance
+                if gap > 0:
+                    a = ancestor[vim]
+                    if parents[a] != p:
+                        a = default[p]
+                    # move subtree
+                    subtrees = number[v] - number[a]
+                    change[v] -= gap / subtrees
+                    shift[v] += gap
+                    change[a] += gap / subtrees
+                    prelim[v] += gap
+                    mod[v] += gap
+                    sip += gap
+                    sop += gap
+                sim += mod[vim]
+                sip += mod[vip]
+                som += mod[vom]
+                sop += mod[vop]
+            if nim >= 0 and (last[vop] if last[vop] >= 0 else thread[vop]) < 0:
+                thread[vop] = nim
+                mod[vop] += sim - sop
+            if nip >= 0 and (first[vom] if first[vom] >= 0 else thread[vom]) < 0:
+                thread[vom] = nip
+                mod[vom] += sip - som
+                default[p] = v
+
+        # next in postorder
+        if right[v] >= 0:
+            v = right[v]
+            while first[v] >= 0:
+                v = first[v]
+        else:
+            v = p
+
+    # second walk: parents come first, so each sees its final offset
+    xs = prelim
+    offsets = mod
+    for v in range(1, n):
+        p = parents[v]
+        xs[v] += offsets[p]
+        offsets[v] += offsets[p]
+    lowest = min(xs)
+    if lowest:
+        xs = [x - lowest for x in xs]
+    return xs, depths
+
+
+def write_positions(path, parents, xs, depths, labels=None):
+    '''
+    Writes a layout as tab-separated node, parent, x and depth columns,
+    plus label when labels are given, one node per line after a header.
+    '''
+    with open(path, 'w') as f:
+        f.write('node\tparent\tx\tdepth' + ('' if labels is None else '\tlabel') + '\n')
+        for v in range(len(parents)):
+            label = '' if labels is None else f'\t{labels[v]}'
+            f.write(f'{v}\t{parents[v]}\t{xs[v]:.10g}\t{depths[v]}{label}\n')
@@ -3,7 +3,7 @@ import networkx as nx
 import random
 
 from pascal.interpreters import NodeVisitor
-from visualizer.viztools import Num
+from visualizer.layouts import tidy_layout
 
 class ASTVisualizer(NodeVisitor):
     def __init__(self, parser):
@@ -21,7 +21,8 @@ class ASTVisualizer(NodeVisitor):
         self.visit(node.right)
 
         for child_node in (node.left, node.right):
-            if type(child_node) == Num:
+            # by name, so that viztools, pascal.parsers and arena nodes all work
+            if type(child_node).__name__ == 'Num':
                 self.edges.append((node.op.value, child_node.value ))
             else:
                 self.edges.append((node.op.value, child_node.op.value))
@@ -43,7 +44,9 @@ def hierarchy_pos(G, root=None, width=1., vert_gap = 0.2, vert_loc = 0, xcenter
     '''
 
     If the graph is a tree this will return the positions to plot this in a
-    hierarchical layout.
+    hierarchical layout, laid out by visualizer.layouts.tidy_layout: subtrees
+    are packed side by side instead of each getting an equal share of the
+    width, and there is no recursion, so deep trees work.
 
     G: the graph (must be a tree)
 
@@ -55,7 +58,7 @@ def hierarchy_pos(G, root=None, width=1., vert_gap = 0.2, vert_loc = 0, xcenter
     - if the tree is undirected and not given,
       then a random choice will be used.
 
-    width: horizontal space allocated for this branch - avoids overlap with other branches
+    width: horizontal space the whole drawing is scaled to
 
     vert_gap: gap between levels of hierarchy
 
@@ -63,40 +66,37 @@ def hierarchy_pos(G, root=None, width=1., vert_gap = 0.2, vert_loc = 0, xcenter
 
     xcenter: horizontal location of root
     '''
-    if not nx.is_tree(G):
-        raise TypeError('cannot use hierarchy_pos on a graph that is not a tree')
-
+    directed = isinstance(G, nx.DiGraph)
+    whole = root is None or not directed
     if root is None:
-        if isinstance(G, nx.DiGraph):
+        if directed:
             root = next(iter(nx.topological_sort(G)))  #allows back compatibility with nx version 1.11
         else:
             root = random.choice(list(G.nodes))
 
-    def _hierarchy_pos(G, root, width=1., vert_gap = 0.2, vert_loc = 0, xcenter = 0.5, pos = None, parent = None):
-        '''
-        see hierarchy_pos docstring for most arguments
-
-        pos: a dict saying where all nodes go if they have been assigned
-        parent: parent of this branch. - only affects it if non-directed
-
-        '''
+    # number the nodes breadth first, so that parents come before children;
+    # reaching a node twice means a cycle, or a node with two parents
+    nodes = [root]
+    parents = [-1]
+    index = {root: 0}
+    for v, node in enumerate(nodes):
+        parent = nodes[parents[v]] if v else None
+        for child in (G.successors(node) if directed else G.neighbors(node)):
+            if v and not directed and child == parent:
+                continue
+            if child in index:
+                raise TypeError('cannot use hierarchy_pos on a graph that is not a tree')
+            index[child] = len(nodes)
+            nodes.append(child)
+            parents.append(v)
+    if whole and len(nodes) != len(G):
+        raise TypeError('cannot use hierarchy_pos on a graph that is not a tree')
 
-        if pos is None:
-            pos = {root:(xcenter,vert_loc)}
-        else:
-            pos[root] = (xcenter, vert_loc)
-        children = list(G.neighbors(root))
-        if not isinstance(G, nx.DiGraph) and parent is not None:
-            children.remove(parent)
-        if len(children)!=0:
-            dx = width/len(children)
-            nextx = xcenter - width/2 - dx/2
-            for child in children:
-                nextx += dx
-                pos = _hierarchy_pos(G,child, width = dx, vert_gap = vert_gap,
-                                    vert_loc = vert_loc-vert_gap, xcenter=nextx,
-                                    pos=pos, parent = root)
-        return pos
-
-
-    return _hierarchy_pos(G, root, width, vert_gap, vert_loc, xcenter)
+    xs, depths = tidy_layout(parents)
+    spread = max(xs)
+    scale = width / spread if spread else 0
+    left = xcenter - xs[0] * scale
+    return {
+        node: (left + x * scale, vert_loc - depth * vert_gap)
+        for node, x, depth in zip(nodes, xs, depths)
+    }